@@ -14,57 +14,323 @@
 
 from django.conf import settings
 
-from barbicanclient import client as b_client
-
+import base64
 import json
 import logging
+import threading
+import time
+import uuid
+import zlib
+
+from horizon_hpe_storage.api.common import cache
+from horizon_hpe_storage.api import result_store
+from horizon_hpe_storage import profiler
 
 CINDER_NODE_TYPE = 'cinder'
 NOVA_NODE_TYPE = 'nova'
 
+LUN_TOOL_RESULT = 'lun-tool-result'
+LUN_TOOL_HISTORY = 'lun-tool-history'
+LUN_TOOL_DIFFS = 'lun-tool-diffs'
+# maps the key of each cached diff to the two results it compares
+LUN_TOOL_DIFF_INDEX = 'lun-tool-diff-index'
+LUN_TOOL_TIME_FORMAT = result_store.LUN_TOOL_TIME_FORMAT
+
+# secret(s) mapping the container name of each registered node to its
+# container ref, with a version that increases with each update
+NODE_REGISTRY = 'node-registry'
+NODE_NAME_SEPARATOR = '-cinderdiags-'
+# each node's data is a secret named NODE_DATA + '-' + version in the
+# node's container, replaced there when the node is updated
+NODE_DATA = 'node_data'
+# and, with the barbican result store, its last test results are a secret
+# named NODE_STATUS + '-' + version beside it
+NODE_STATUS = 'node_status'
+
+# seconds a removed entry is remembered by a merged map
+TOMBSTONE_AGE = 86400
+# attempts made at reading or updating a merged map that is being changed
+# by another writer
+MERGE_RETRIES = 5
+
 LOG = logging.getLogger(__name__)
 
+# barbican clients kept by each worker, and seconds each one is kept
+CLIENT_POOL_SIZE = getattr(settings, 'HPE_STORAGE_CLIENT_POOL_SIZE', 32)
+CLIENT_POOL_TIMEOUT = getattr(settings, 'HPE_STORAGE_CLIENT_POOL_TIMEOUT',
+                              3600)
+
+# clients keyed by the keystone session they were created with, shared
+# by every BarbicanAPI in the process
+_client_pool = cache.LRUCache(CLIENT_POOL_SIZE, CLIENT_POOL_TIMEOUT)
+
+# node containers whose newest data secret is remembered by each worker
+NODE_CACHE_SIZE = getattr(settings, 'HPE_STORAGE_NODE_CACHE_SIZE', 1024)
+
+# this worker's copy of the node registry, kept under NODE_REGISTRY as
+# (refs of the registry secrets it was read from, version, nodes)
+_node_registry_cache = cache.LRUCache(1)
+# container ref -> refs of the newest node data and status secrets read
+# from it
+_node_data_refs = cache.LRUCache(NODE_CACHE_SIZE)
+
+
+def _merge_entries(entries, other):
+    # each entry is [value or None if removed, time updated], and the most
+    # recently updated entry for a key wins
+    for key, entry in other.items():
+        current = entries.get(key)
+        if current is None or entry[1] > current[1]:
+            entries[key] = entry
+    return entries
+
 
-class BarbicanAPI(object):
-    container_limit = 1000
+def _get_secret_version(secret_name):
+    # secrets stored before they were versioned count as version 0
+    prefix, sep, version = secret_name.rpartition('-')
+    if sep and version.isdigit():
+        return int(version)
+    return 0
+
+
+class BarbicanAPI(result_store.ResultStore):
+    # containers and secrets are listed in pages of this many items
+    container_limit = 100
     secret_limit = 50
+    # volume path query results are compressed in chunks of roughly this
+    # many bytes of node data, and each chunk is split across secrets
+    # no larger than the part size (must stay under the Barbican secret
+    # size limit)
+    lun_tool_chunk_size = 65536
+    lun_tool_part_size = 8000
+    # cached diffs kept against each result
+    lun_tool_max_diffs = 10
 
     def __init__(self):
-        self.client = None
-        self.cur_keystone_session = None
+        # one BarbicanAPI is shared by every request a worker handles,
+        # so the current user's client is kept per thread
+        self.local = threading.local()
         openstack_host = getattr(settings, 'OPENSTACK_HOST')
         self.barbican_api_url = 'http://' + openstack_host + ':9311'
         self.debug = True
+        self.lun_tool_chunk_size = getattr(
+            settings, 'HPE_STORAGE_LUN_TOOL_CHUNK_SIZE',
+            self.lun_tool_chunk_size)
+        # parts must be a multiple of 4 to split on base64 boundaries
+        part_size = getattr(settings, 'HPE_STORAGE_LUN_TOOL_PART_SIZE',
+                            self.lun_tool_part_size)
+        self.lun_tool_part_size = part_size - (part_size % 4)
+        self.lun_tool_max_results = getattr(
+            settings, 'HPE_STORAGE_LUN_TOOL_MAX_RESULTS',
+            self.lun_tool_max_results)
+        self.lun_tool_max_age = getattr(
+            settings, 'HPE_STORAGE_LUN_TOOL_MAX_AGE',
+            self.lun_tool_max_age)
+        self.lun_tool_max_diffs = getattr(
+            settings, 'HPE_STORAGE_LUN_TOOL_MAX_DIFFS',
+            self.lun_tool_max_diffs)
+
+    @property
+    def client(self):
+        return getattr(self.local, 'client', None)
+
+    @property
+    def cur_keystone_session(self):
+        return getattr(self.local, 'keystone_session', None)
 
     # core functions
     def do_setup(self, keystone_session):
         # only init new client if session has been updated - meaning
         # user logged in with new token
         if self.client and self.cur_keystone_session:
-            if self.cur_keystone_session == keystone_session:
+            if self.cur_keystone_session is keystone_session:
                 return
 
-        self.cur_keystone_session = keystone_session
-        self.client = b_client.Client(
-            session=keystone_session,
-            endpoint=self.barbican_api_url)
+        # sessions are pooled per token by KeystoneAPI, so the same
+        # session (and its barbican client) comes back for each user
+        client = _client_pool.get(keystone_session)
+        if client is None:
+            # only imported once needed, as it is slow to import
+            from barbicanclient import client as b_client
+            client = b_client.Client(
+                session=keystone_session,
+                endpoint=self.barbican_api_url)
+            _client_pool.set(keystone_session, client)
+        self.local.keystone_session = keystone_session
+        self.local.client = client
+
+    def _iter_pages(self, list_func, page_size, **kwargs):
+        # fetch a page at a time, so callers that stop early don't pay
+        # for the rest of the list
+        offset = 0
+        while True:
+            page = list_func(limit=page_size, offset=offset, **kwargs)
+            for item in page:
+                yield item
+            if len(page) < page_size:
+                return
+            offset += page_size
+
+    def _iter_containers(self, name=None):
+        return self._iter_pages(self.client.containers.list,
+                                self.container_limit, name=name)
+
+    def _iter_secrets(self, name=None):
+        return self._iter_pages(self.client.secrets.list,
+                                self.secret_limit, name=name)
 
     def _get_container(self, container_name):
-        containers = self.client.containers.list(name=container_name,
-                                                 limit=self.container_limit)
+        containers = self._iter_containers(name=container_name)
         for container in containers:
             if container.name == container_name:
                 return container
         return None
 
+    def _delete_container(self, container):
+        # first delete all contained secrets
+        for name, secret in container.secrets.items():
+            self.client.secrets.delete(secret.secret_ref)
+
+        # now delete container
+        self.client.containers.delete(container.container_ref)
+
     def _get_secret(self, secret_name):
-        secrets = self.client.secrets.list(name=secret_name,
-                                           limit=self.secret_limit)
+        secrets = self._iter_secrets(name=secret_name)
         for secret in secrets:
             if secret.name == secret_name:
                 return secret
         return None
 
+    # a stored generic container can still gain and lose secrets, through
+    # its secrets resource, which barbicanclient has no methods for
+    def _get_container_secrets_path(self, container_ref):
+        return 'containers/%s/secrets' % \
+            container_ref.rstrip('/').rsplit('/', 1)[-1]
+
+    def _add_container_secret(self, container_ref, name, secret_ref):
+        self.client.containers._api.post(
+            self._get_container_secrets_path(container_ref),
+            json={'name': name, 'secret_ref': secret_ref})
+
+    def _remove_container_secret(self, container_ref, name, secret_ref):
+        self.client.containers._api.delete(
+            self._get_container_secrets_path(container_ref),
+            json={'name': name, 'secret_ref': secret_ref})
+
+    def _get_secret_versions(self, container, name):
+        # names of the versions of a secret in a container, newest first
+        names = [key for key in container.secret_refs
+                 if key == name or key.startswith(name + '-')]
+        return sorted(names, key=_get_secret_version, reverse=True)
+
+    def _create_versioned_secret(self, name, payload, old_names=()):
+        version = int(time.time() * 1000)
+        if old_names:
+            version = max(version, _get_secret_version(old_names[0]) + 1)
+        return self.client.secrets.create(name='%s-%d' % (name, version),
+                                          payload=payload)
+
+    def _replace_container_secret(self, container, name, payload):
+        """Stores payload as the newest version of a container's secret.
+
+        The new version is added to the container before the older ones
+        are removed and deleted, so there is always a version to read.
+        """
+        old_names = self._get_secret_versions(container, name)
+        secret = self._create_versioned_secret(name, payload, old_names)
+        secret.store()
+        self._add_container_secret(container.container_ref, secret.name,
+                                   secret.secret_ref)
+        for old_name in old_names:
+            old_ref = container.secret_refs[old_name]
+            try:
+                self._remove_container_secret(container.container_ref,
+                                              old_name, old_ref)
+                self.client.secrets.delete(old_ref)
+            except Exception as ex:
+                # already replaced by a concurrent update
+                LOG.debug("%s already removed: %s" % (old_ref, ex))
+        return secret
+
+    # maps of {key: value} kept as a container of compressed parts, which
+    # concurrent writers can each leave their own copy of
+    def _read_merged_map(self, name):
+        """Returns the entries of a map, and the containers holding it.
+
+        The entries are merged from every copy of the map, keeping the
+        newest entry for each key. Returns None for the entries if the
+        map has never been stored.
+        """
+        for attempt in range(MERGE_RETRIES):
+            containers = [container for container in
+                          self._iter_containers(name=name)
+                          if container.name == name]
+            if not containers:
+                return None, []
+            entries = {}
+            try:
+                for container in containers:
+                    part_names = sorted(
+                        container.secret_refs.keys(),
+                        key=lambda k: int(k.split('-')[-1]))
+                    copy = self._read_compressed_secrets(container,
+                                                         part_names)
+                    _merge_entries(entries, copy)
+            except Exception as ex:
+                # replaced by a writer after it was listed, so the entries
+                # are in a newer copy
+                LOG.debug("%s changed while reading: %s" % (name, ex))
+                continue
+            return entries, containers
+        raise Exception("Unable to read " + name)
+
+    def _write_merged_map(self, name, entries, old_containers=()):
+        # removed entries are remembered for a while, so a copy written
+        # before the removal can't bring them back
+        expired = time.time() - TOMBSTONE_AGE
+        entries = dict((key, entry) for key, entry in entries.items()
+                       if entry[0] is not None or entry[1] > expired)
+
+        # store the new copy before removing the ones it was merged from,
+        # so there is always a copy to read
+        secrets = {}
+        self._create_compressed_secrets('entries', entries, secrets)
+        container = self.client.containers.create(name, secrets=secrets)
+        container.store()
+
+        for old_container in old_containers:
+            try:
+                self._delete_container(old_container)
+            except Exception as ex:
+                # already replaced by a concurrent writer
+                LOG.debug("%s already removed: %s" % (name, ex))
+
+    def _update_merged_map(self, name, updates, create=False):
+        """Applies {key: value, or None to remove} to a map.
+
+        Returns False if the map hasn't been stored (and create is not
+        set), or the updates can't be read back.
+        """
+        for attempt in range(MERGE_RETRIES):
+            entries, containers = self._read_merged_map(name)
+            if entries is None:
+                if not create:
+                    return False
+                entries = {}
+            updated = time.time()
+            for key, value in updates.items():
+                entries[key] = [value, updated]
+            self._write_merged_map(name, entries, containers)
+
+            # check the updates can be read back
+            entries, containers = self._read_merged_map(name)
+            if entries is not None and \
+                    all(entries.get(key, [None])[0] == value
+                        for key, value in updates.items()):
+                return True
+            LOG.info("Update of %s was lost, retrying" % name)
+        return False
+
     # SSMC link functions
     def get_ssmc_credentials(self, cinder_backend):
         uname = None
@@ -106,89 +372,367 @@ class BarbicanAPI(object):
         self.add_ssmc_credentials(cinder_backend, uname, pwd)
 
     # Cinder/Nova node registration and diagnostics functions
-    def get_node(self, name, type):
-        node_data = {}
-        container = self._get_container(type + '-cinderdiags-' + name)
-        if container:
-            srefs = container.secret_refs
-            for key, value in srefs.items():
-                data_str = self.client.secrets.get(value).payload
-                data = json.loads(data_str)
-                # pull out the meta data about the test
-                meta_data = data["meta_data"]
-                for key, value in meta_data.iteritems():
-                    node_data[key] = value
+    def _list_node_registry(self):
+        # the registry secrets, of which there is one unless writers are
+        # updating it at the same time
+        return [secret for secret in self._iter_secrets(name=NODE_REGISTRY)
+                if secret.name == NODE_REGISTRY]
+
+    def _scan_node_registry(self):
+        # build the registry from the stored nodes, keeping the newest
+        # container where a node was replaced but not yet deleted
+        registry = {}
+        created = {}
+        containers = self._iter_containers()
+        for container in containers:
+            if NODE_NAME_SEPARATOR in container.name:
+                container_created = getattr(container, 'created', None)
+                if container.name in registry and \
+                        container_created is not None and \
+                        created[container.name] is not None and \
+                        container_created < created[container.name]:
+                    continue
+                registry[container.name] = container.container_ref
+                created[container.name] = container_created
+        return registry
+
+    def _load_node_registry(self):
+        """Returns the registry secrets, their version and their nodes.
+
+        The secrets are listed each time, but only read when they differ
+        from the ones this worker last read. Copies stored by concurrent
+        writers are merged, the newer copy winning for a node in both.
+        Returns no secrets, and the nodes found by a scan of every
+        container, if the registry has been lost.
+        """
+        for attempt in range(MERGE_RETRIES):
+            secrets = self._list_node_registry()
+            if not secrets:
+                LOG.info("Rebuilding node registry from stored nodes")
+                return [], 0, self._scan_node_registry()
+
+            refs = sorted(secret.secret_ref for secret in secrets)
+            cached = _node_registry_cache.get(NODE_REGISTRY)
+            if cached and cached[0] == refs:
+                return secrets, cached[1], dict(cached[2])
+
+            copies = {}
+            try:
+                for secret in secrets:
+                    part = json.loads(secret.payload)
+                    copies.setdefault(part['copy'], []).append(part)
+            except Exception as ex:
+                # replaced by a writer after it was listed
+                LOG.debug("Node registry changed while reading: %s" % ex)
+                continue
+            version = None
+            nodes = {}
+            for parts in sorted(copies.values(),
+                                key=lambda parts: parts[0]['version']):
+                if len(parts) < parts[0]['parts']:
+                    # not yet fully stored, or partly deleted
+                    continue
+                parts.sort(key=lambda part: part['part'])
+                payload = ''.join(part['nodes'] for part in parts)
+                nodes.update(json.loads(zlib.decompress(
+                    base64.b64decode(payload))))
+                version = parts[0]['version']
+            if version is None:
+                continue
+            _node_registry_cache.set(NODE_REGISTRY, (refs, version, nodes))
+            return secrets, version, dict(nodes)
+        raise Exception("Unable to read " + NODE_REGISTRY)
+
+    def _store_node_registry(self, version, nodes):
+        # the registry is compressed, and only split across more than
+        # one secret once it outgrows the secret size limit
+        copy = uuid.uuid4().hex
+        payload = base64.b64encode(zlib.compress(json.dumps(nodes)))
+        offsets = range(0, len(payload), self.lun_tool_part_size) or [0]
+        secrets = []
+        for idx, offset in enumerate(offsets):
+            part = {'version': version, 'copy': copy, 'part': idx,
+                    'parts': len(offsets),
+                    'nodes': payload[offset:offset +
+                                     self.lun_tool_part_size]}
+            secret = self.client.secrets.create(name=NODE_REGISTRY,
+                                                payload=json.dumps(part))
+            secret.store()
+            secrets.append(secret)
+        return sorted(secret.secret_ref for secret in secrets)
+
+    def _delete_node_registry(self, refs):
+        for secret_ref in refs:
+            try:
+                self.client.secrets.delete(secret_ref)
+            except Exception as ex:
+                # already replaced by a concurrent writer
+                LOG.debug("%s already removed: %s" % (secret_ref, ex))
+
+    def _get_node_registry(self):
+        # node container refs, so finding nodes doesn't require listing
+        # every container in the project
+        secrets, version, nodes = self._load_node_registry()
+        if not secrets:
+            refs = self._store_node_registry(1, nodes)
+            _node_registry_cache.set(NODE_REGISTRY, (refs, 1, nodes))
+        return nodes
+
+    def _update_node_registry(self, node_name, container_ref):
+        """Points node_name at container_ref, or removes it if None.
+
+        The next version of the registry is stored before the one it was
+        read from is deleted. A writer that then finds another copy was
+        stored alongside its own deletes its copy and applies its update
+        to the other one instead.
+        """
+        for attempt in range(MERGE_RETRIES):
+            secrets, version, nodes = self._load_node_registry()
+            if container_ref:
+                nodes[node_name] = container_ref
+            else:
+                nodes.pop(node_name, None)
+            refs = self._store_node_registry(version + 1, nodes)
+            self._delete_node_registry(
+                [secret.secret_ref for secret in secrets])
+
+            if refs == sorted(secret.secret_ref for secret in
+                              self._list_node_registry()):
+                _node_registry_cache.set(NODE_REGISTRY,
+                                         (refs, version + 1, nodes))
+                return
+            LOG.info("Node registry changed while updating %s, retrying" %
+                     node_name)
+            self._delete_node_registry(refs)
+        LOG.warning("Unable to update node registry for %s" % node_name)
+
+    def _find_node_container(self, node_name):
+        # a node the registry doesn't know of, or knows of by a container
+        # that has since been deleted, is found by name. Where a node was
+        # replaced but not yet deleted, the newest container is listed last
+        containers = [container for container in
+                      self._iter_containers(name=node_name)
+                      if container.name == node_name]
+        if containers:
+            return containers[-1]
+        return None
+
+    def _get_registered_container(self, node_name):
+        # the node's container ref in this worker's copy of the registry,
+        # which isn't read again here as the container ref is checked by
+        # fetching it
+        cached = _node_registry_cache.get(NODE_REGISTRY)
+        if cached:
+            return cached[2].get(node_name)
+        return None
 
-                if 'diag_test_status' in data:
-                    node_data['diag_test_status'] = \
-                        data['diag_test_status']
+    def _get_node_container(self, node_name):
+        container_ref = self._get_registered_container(node_name)
+        if container_ref:
+            try:
+                return self.client.containers.get(container_ref)
+            except Exception as ex:
+                # deleted since this worker read the registry
+                LOG.info("Registered node %s not found: %s" %
+                         (node_name, ex))
+        return self._find_node_container(node_name)
+
+    def _read_node_data(self, data_ref, status_ref=None):
+        data = json.loads(self.client.secrets.get(data_ref).payload)
+
+        # pull out the meta data about the test
+        node_data = {}
+        meta_data = data["meta_data"]
+        for key, value in meta_data.iteritems():
+            node_data[key] = value
+
+        # nodes last tested before their status was kept apart from
+        # their data still have it there
+        if 'diag_test_status' in data:
+            node_data['diag_test_status'] = \
+                data['diag_test_status']
+
+        if 'software_test_status' in data:
+            node_data['software_test_status'] = \
+                data['software_test_status']
+
+        if status_ref:
+            for key in result_store.NODE_STATUS_FIELDS:
+                node_data.pop(key, None)
+            node_data.update(json.loads(
+                self.client.secrets.get(status_ref).payload))
+        return node_data
+
+    def _get_node_secret_refs(self, container):
+        # refs of the newest node data and status, or None for either if
+        # the container has none
+        refs = []
+        for name in (NODE_DATA, NODE_STATUS):
+            names = self._get_secret_versions(container, name)
+            refs.append(container.secret_refs[names[0]] if names else None)
+        return tuple(refs)
+
+    def _get_node_data(self, container):
+        # only the newest versions of the node data and status are read
+        refs = self._get_node_secret_refs(container)
+        if not refs[0]:
+            return {}
+        try:
+            node_data = self._read_node_data(*refs)
+        except Exception as ex:
+            # replaced since the container was read
+            LOG.debug("Node data %s replaced: %s" % (refs, ex))
+            container = self.client.containers.get(container.container_ref)
+            refs = self._get_node_secret_refs(container)
+            node_data = self._read_node_data(*refs)
+        _node_data_refs.set(container.container_ref, refs)
+        return node_data
+
+    def _get_registered_node_data(self, container_ref):
+        # returns None if the container has been deleted
+        refs = _node_data_refs.get(container_ref)
+        if refs:
+            try:
+                return self._read_node_data(*refs)
+            except Exception as ex:
+                # replaced since this worker last read it
+                LOG.debug("Node data %s replaced: %s" % (refs, ex))
+        try:
+            container = self.client.containers.get(container_ref)
+        except Exception as ex:
+            LOG.info("Registered node %s not found: %s" %
+                     (container_ref, ex))
+            _node_data_refs.delete(container_ref)
+            return None
+        return self._get_node_data(container)
+
+    def _add_node_statuses(self, type, nodes):
+        # statuses kept by another result store override any left in
+        # barbican from before it was used
+        store = result_store.get_result_store(self)
+        if store is self or not nodes:
+            return nodes
+        if len(nodes) == 1:
+            statuses = {nodes[0]['node_name']: store.get_node_status(
+                type, nodes[0]['node_name'])}
+        else:
+            statuses = store.get_node_statuses(type)
+        for node in nodes:
+            node.update(statuses.get(node['node_name'], {}))
+        return nodes
 
-                if 'software_test_status' in data:
-                    node_data['software_test_status'] = \
-                        data['software_test_status']
+    def _get_node(self, node_name):
+        container_ref = self._get_registered_container(node_name)
+        if container_ref:
+            node_data = self._get_registered_node_data(container_ref)
+            if node_data is not None:
+                return node_data
 
-            return node_data
+        container = self._find_node_container(node_name)
+        if container:
+            return self._get_node_data(container)
         return None
 
+    def get_node(self, name, type):
+        node_data = self._get_node(type + NODE_NAME_SEPARATOR + name)
+        if node_data:
+            self._add_node_statuses(type, [node_data])
+        return node_data
+
     def nodes_exist(self, type):
-        containers = self.client.containers.list(limit=self.container_limit)
-        for container in containers:
-            if container.name.startswith(type + "-cinderdiags-"):
+        prefix = type + NODE_NAME_SEPARATOR
+        for node_name in self._get_node_registry():
+            if node_name.startswith(prefix):
                 return True
 
         return False
 
-    def get_all_nodes(self, type):
+    def _get_all_nodes(self, type):
         nodes = []
-        containers = self.client.containers.list(limit=self.container_limit)
-        for container in containers:
-            if container.name.startswith(type):
-                srefs = container.secret_refs
-                if srefs:
-                    node_data = {}
-                    for key, value in srefs.items():
-                        data_str = self.client.secrets.get(value).payload
-                        data = json.loads(data_str)
-                        # pull out the meta data about the test
-                        meta_data = data["meta_data"]
-                        for key, value in meta_data.iteritems():
-                            node_data[key] = value
-
-                        if 'diag_test_status' in data:
-                            node_data['diag_test_status'] = \
-                                data['diag_test_status']
-
-                        if 'software_test_status' in data:
-                            node_data['software_test_status'] = \
-                                data['software_test_status']
-
-                        nodes.append(node_data)
+        prefix = type + NODE_NAME_SEPARATOR
+        registry = self._get_node_registry()
+        for node_name in sorted(registry):
+            if node_name.startswith(prefix):
+                node_data = self._get_registered_node_data(
+                    registry[node_name])
+                if node_data is None:
+                    # deleted or replaced outside of the registry
+                    container = self._find_node_container(node_name)
+                    self._update_node_registry(
+                        node_name, container and container.container_ref)
+                    if container:
+                        node_data = self._get_node_data(container)
+                if node_data:
+                    nodes.append(node_data)
         return nodes
 
+    def get_all_nodes(self, type):
+        return self._add_node_statuses(type, self._get_all_nodes(type))
+
     def delete_node(self, name, type):
-        container = self._get_container(type + '-cinderdiags-' + name)
+        node_name = type + NODE_NAME_SEPARATOR + name
+        container = self._get_node_container(node_name)
         if container and container.secrets:
             # first delete all contained secrets
-            for name, secret in container.secrets.items():
+            for secret in container.secrets.values():
                 self.client.secrets.delete(secret.secret_ref)
 
             # now delete container
             self.client.containers.delete(container.container_ref)
-
-    def add_node(self, name, type, ip, host_name,
-                 ssh_name, ssh_pwd,
-                 config_path=None, diag_status=None,
-                 software_status=None, diag_run_time=None,
-                 ssh_validation_time=None, os_vars=None):
-        # ensure container doesn't already exist
-        node_name = type + '-cinderdiags-' + name
-        container = self._get_container(node_name)
-        if container:
-            raise Exception(node_name + " already exists")
-
-        # first create secret for each field
-        secrets = {}
-
+            _node_data_refs.delete(container.container_ref)
+
+        self._update_node_registry(node_name, None)
+
+        store = result_store.get_result_store(self)
+        if store is not self:
+            store.delete_node_status(type, name)
+
+    # node status functions, for the barbican result store
+    def get_node_status(self, type, name):
+        node_data = self._get_node(type + NODE_NAME_SEPARATOR + name) or {}
+        return dict((key, node_data[key])
+                    for key in result_store.NODE_STATUS_FIELDS
+                    if key in node_data)
+
+    def get_node_statuses(self, type):
+        statuses = {}
+        for node_data in self._get_all_nodes(type):
+            status = dict((key, node_data[key])
+                          for key in result_store.NODE_STATUS_FIELDS
+                          if key in node_data)
+            if status:
+                statuses[node_data['node_name']] = status
+        return statuses
+
+    def set_node_status(self, type, name, status):
+        container = self._get_node_container(type + NODE_NAME_SEPARATOR +
+                                              name)
+        if container is None:
+            LOG.info("Node %s removed before its status was stored" % name)
+            return
+        secret = self._replace_container_secret(container, NODE_STATUS,
+                                                json.dumps(status))
+        _node_data_refs.set(
+            container.container_ref,
+            (self._get_node_secret_refs(container)[0], secret.secret_ref))
+
+    def delete_node_status(self, type, name):
+        container = self._get_node_container(type + NODE_NAME_SEPARATOR +
+                                              name)
+        if container is None:
+            return
+        for status_name in self._get_secret_versions(container, NODE_STATUS):
+            status_ref = container.secret_refs[status_name]
+            self._remove_container_secret(container.container_ref,
+                                          status_name, status_ref)
+            self.client.secrets.delete(status_ref)
+        _node_data_refs.delete(container.container_ref)
+
+    def _get_node_data_payload(self, name, type, ip, host_name,
+                               ssh_name, ssh_pwd,
+                               config_path=None, os_vars=None):
+        # only the node's credentials and config; its test results are
+        # kept by the result store
         node_data = {}
 
         meta_data = {}
@@ -202,38 +746,62 @@ class BarbicanAPI(object):
         if config_path:
             meta_data['config_path'] = config_path
 
-        if diag_run_time:
-            meta_data['diag_run_time'] = diag_run_time
-
-        if ssh_validation_time:
-            meta_data['validation_time'] = ssh_validation_time
-
         if os_vars:
             meta_data['os_vars'] = os_vars
 
         node_data['meta_data'] = meta_data
 
-        if diag_status:
-            node_data['diag_test_status'] = diag_status
-
-        if software_status:
-            node_data['software_test_status'] = software_status
-
         # store as json string
-        node_data_str = json.dumps(node_data)
-        secret = self.client.secrets.create(
-            name="node_data",
-            payload=node_data_str)
-        secrets['node_data'] = secret
+        return json.dumps(node_data)
+
+    def _create_node_container(self, node_name, payload):
+        secrets = {}
+        secret = self._create_versioned_secret(NODE_DATA, payload)
+        secrets[secret.name] = secret
 
         # create container
         secret_list = {}
         secret_list['secrets'] = secrets
-        node = self.client.containers.create(node_name,
-                                             **secret_list)
+        node = self.client.containers.create(node_name, **secret_list)
         node.store()
+
+        self._update_node_registry(node_name, node.container_ref)
         return node
 
+    def add_node(self, name, type, ip, host_name,
+                 ssh_name, ssh_pwd,
+                 config_path=None, os_vars=None):
+        # ensure container doesn't already exist
+        node_name = type + NODE_NAME_SEPARATOR + name
+        container = self._get_node_container(node_name)
+        if container:
+            raise Exception(node_name + " already exists")
+
+        return self._create_node_container(
+            node_name, self._get_node_data_payload(
+                name, type, ip, host_name, ssh_name, ssh_pwd,
+                config_path=config_path, os_vars=os_vars))
+
+    def upsert_node(self, name, type, ip, host_name,
+                    ssh_name, ssh_pwd,
+                    config_path=None, os_vars=None):
+        """Adds the node, or replaces its data if it already exists.
+
+        An existing node keeps its container, and so its registry entry
+        and status; only the secret holding its data is replaced.
+        """
+        node_name = type + NODE_NAME_SEPARATOR + name
+        payload = self._get_node_data_payload(
+            name, type, ip, host_name, ssh_name, ssh_pwd,
+            config_path=config_path, os_vars=os_vars)
+
+        container = self._get_node_container(node_name)
+        if container is None:
+            return self._create_node_container(node_name, payload)
+
+        self._replace_container_secret(container, NODE_DATA, payload)
+        return container
+
     # Software Tests API
     def _delete_software_test_container(self, type):
         container = self._get_container('diag-software-tests-' + type)
@@ -267,7 +835,7 @@ class BarbicanAPI(object):
         test.store()
         return test
 
-    def get_software_tests(self, type):
+    def get_software_tests(self, type, seed=True):
         test_data = {}
         container = self._get_container('diag-software-tests-' + type)
         if container:
@@ -277,129 +845,265 @@ class BarbicanAPI(object):
                 data = json.loads(data_str)
                 if 'software_tests' in data:
                     return data["software_tests"]
-        else:
+        elif seed:
             # if no container exists, we are creating the first test, so
             # seed with some standard tests
-            tests = []
-            software_pkg = {}
-            software_pkg['package'] = 'sg3-utils || sg3_utils'
-            software_pkg['min_version'] = '1.3'
-            software_pkg['description'] = \
-                'required for attaching FC volumes'
-            tests.append(software_pkg)
-            software_pkg = {}
-            software_pkg['package'] = 'sysfsutils'
-            software_pkg['min_version'] = '2.1'
-            software_pkg['description'] = \
-                'required for attaching FC volumes'
-            tests.append(software_pkg)
-
-            if type == CINDER_NODE_TYPE:
-                software_pkg = {}
-                software_pkg['package'] = 'python-3parclient'
-                software_pkg['min_version'] = '4.2.0'
-                software_pkg['description'] = \
-                    'required for accessing HPE 3PAR array'
-                tests.append(software_pkg)
+            tests = result_store.get_default_software_tests(type)
             self._add_software_tests(type, tests)
             return tests
 
         return None
 
-    def update_software_test(self, type, software_pkg,
-                             min_version, description):
-        # just update the one package
-        new_tests = []
-        curr_tests = self.get_software_tests(type)
-        if curr_tests:
-            for curr_test in curr_tests:
-                if curr_test['package'] == software_pkg:
-                    test = {}
-                    test['package'] = software_pkg
-                    test['min_version'] = min_version
-                    test['description'] = description
-                    new_tests.append(test)
-                else:
-                    new_tests.append(curr_test)
-
-            # delete the old tests
-            self._delete_software_test_container(type)
-
-            self._add_software_tests(type, new_tests)
-
-    def add_software_test(self, type, software_pkg,
-                          min_version, description):
-        tests = []
-
-        curr_tests = self.get_software_tests(type)
-        if curr_tests:
-            tests = curr_tests
-            # delete the old tests
-            self._delete_software_test_container(type)
-
-        new_test = {}
-        new_test['package'] = software_pkg
-        new_test['min_version'] = min_version
-        new_test['description'] = description
-        tests.append(new_test)
-
-        return self._add_software_tests(type, tests)
-
-    def delete_software_test(self, type, software_pkg):
+    def set_software_tests(self, type, tests):
         # can't update, so delete current tests and add back new
-        curr_tests = self.get_software_tests(type)
         self._delete_software_test_container(type)
-
-        new_tests = []
-        for test in curr_tests:
-            if test['package'] != software_pkg:
-                new_tests.append(test)
-
-        self._add_software_tests(type, new_tests)
-
-    def delete_all_software_tests(self, type):
-        # can't update, so delete all old and add back empty list
-        self._delete_software_test_container(type)
-        new_tests = []
-        self._add_software_tests(type, new_tests)
+        return self._add_software_tests(type, tests)
 
     # LUN Tool data functions
-    def add_lun_tool_result(self, timestamp, result):
-        secrets = []
-
-        # store as json string
-        result_data = {}
-        result_data['timestamp'] = timestamp
-        result_data['node_list'] = result
-        result_data_str = json.dumps(result_data)
-        new_secret = self.client.secrets.create(
-            name='lun-tool-result',
-            payload=result_data_str)
-        new_secret.store()
-
-    def get_lun_tool_results(self):
+    def _get_lun_tool_container_name(self, timestamp):
+        return LUN_TOOL_RESULT + '-' + timestamp
+
+    def _create_compressed_secrets(self, name, data, secrets):
+        # compress the data and split it across as many secrets as needed
+        # to stay under the secret size limit
+        payload = base64.b64encode(zlib.compress(json.dumps(data)))
+        part_names = []
+        for idx in range(0, len(payload), self.lun_tool_part_size):
+            part_name = name + '-' + str(len(part_names))
+            secrets[part_name] = self.client.secrets.create(
+                name=part_name,
+                payload=payload[idx:idx + self.lun_tool_part_size])
+            part_names.append(part_name)
+        return part_names
+
+    def _read_compressed_secrets(self, container, part_names):
+        # feed each part through the decompressor as it is retrieved,
+        # rather than joining the whole payload first
+        decompressor = zlib.decompressobj()
+        data = []
+        for part_name in part_names:
+            payload = self.client.secrets.get(
+                container.secret_refs[part_name]).payload
+            data.append(decompressor.decompress(base64.b64decode(payload)))
+        data.append(decompressor.flush())
+        return json.loads(''.join(data))
+
+    def _get_lun_tool_manifest(self, container):
+        data_str = self.client.secrets.get(
+            container.secret_refs['manifest']).payload
+        return json.loads(data_str)
+
+    def _get_legacy_lun_tool_results(self):
+        # results stored as a single uncompressed secret
         results = []
-        secrets = self.client.secrets.list(name='lun-tool-result',
-                                           limit=self.secret_limit)
+        secrets = self._iter_secrets(name=LUN_TOOL_RESULT)
         for secret in secrets:
             data_str = secret.payload
             json_data = json.loads(data_str)
             result = {}
             result['timestamp'] = json_data['timestamp']
             result['node_list'] = json_data['node_list']
+            result['secret_ref'] = secret.secret_ref
             results.append(result)
 
         return results
 
-    def delete_lun_tool_result(self, timestamp):
-        secrets = self.client.secrets.list(name='lun-tool-result',
-                                           limit=self.secret_limit)
-        for secret in secrets:
-            data_str = secret.payload
-            json_data = json.loads(data_str)
-            test_timestamp = json_data['timestamp']
-            if test_timestamp == timestamp:
+    def _update_lun_tool_history(self, summaries=(), removed=()):
+        # only the changed summaries are written, so concurrent changes to
+        # other results are kept
+        updates = dict((summary['timestamp'], summary)
+                       for summary in summaries)
+        for timestamp in removed:
+            updates[timestamp] = None
+        if not self._update_merged_map(LUN_TOOL_HISTORY, updates,
+                                       create=True):
+            LOG.warning("Unable to update lun tool history")
+
+    def get_lun_tool_history(self):
+        # summaries of all stored results, so listing them doesn't require
+        # decoding every result
+        entries, containers = self._read_merged_map(LUN_TOOL_HISTORY)
+        if entries is not None:
+            history = [summary for summary, updated in entries.values()
+                       if summary is not None]
+            return sorted(history, key=lambda k: k['timestamp'])
+
+        # no history yet, so build it from the history kept in a single
+        # secret by earlier versions, or else from the stored results
+        secret = self._get_secret(LUN_TOOL_HISTORY)
+        if secret:
+            history = json.loads(secret.payload)
+        else:
+            history = []
+            for result in self.get_lun_tool_results():
+                history.append(self._get_lun_tool_summary(
+                    result['timestamp'], result['node_list']))
+
+        diff_index = {}
+        for summary in history:
+            for diff_key in summary.pop('diffs', []):
+                diff_index[diff_key] = diff_key.split('::')
+        if diff_index:
+            self._update_merged_map(LUN_TOOL_DIFF_INDEX, diff_index,
+                                    create=True)
+        self._update_lun_tool_history(history)
+        if secret:
+            try:
                 self.client.secrets.delete(secret.secret_ref)
+            except Exception as ex:
+                # already moved over by another worker
+                LOG.debug("Old lun tool history already removed: %s" % ex)
+        return sorted(history, key=lambda k: k['timestamp'])
+
+    def _remove_lun_tool_result(self, timestamp):
+        # delete the result along with any cached diffs against it
+        self._delete_lun_tool_result_data(timestamp)
+        self._remove_lun_tool_diffs(timestamp)
+
+    def add_lun_tool_result(self, timestamp, result, volume_index=None):
+        history = self.get_lun_tool_history()
+        secrets = {}
+
+        # group nodes into chunks that are compressed separately, so
+        # readers only need to decode the chunks holding the nodes they want
+        chunks = []
+        chunk_nodes = []
+        chunk_size = 0
+        for node in result:
+            node_size = len(json.dumps(node))
+            if chunk_nodes and \
+                    chunk_size + node_size > self.lun_tool_chunk_size:
+                chunks.append(chunk_nodes)
+                chunk_nodes = []
+                chunk_size = 0
+            chunk_nodes.append(node)
+            chunk_size += node_size
+        if chunk_nodes:
+            chunks.append(chunk_nodes)
+
+        manifest = self._get_lun_tool_summary(timestamp, result)
+        manifest['chunks'] = []
+        for idx, chunk_nodes in enumerate(chunks):
+            chunk = {}
+            chunk['nodes'] = [node['node_name'] for node in chunk_nodes]
+            chunk['parts'] = self._create_compressed_secrets(
+                'chunk-' + str(idx), chunk_nodes, secrets)
+            manifest['chunks'].append(chunk)
+
+        # stored whole, as lookups need the full volume to path mapping
+        if volume_index is not None:
+            manifest['volume_index'] = self._create_compressed_secrets(
+                'volume-index', volume_index, secrets)
+
+        secrets['manifest'] = self.client.secrets.create(
+            name='manifest',
+            payload=json.dumps(manifest))
+
+        # create container
+        secret_list = {}
+        secret_list['secrets'] = secrets
+        container = self.client.containers.create(
+            self._get_lun_tool_container_name(timestamp),
+            **secret_list)
+        container.store()
+
+        summary = dict(manifest)
+        del summary['chunks']
+        summary.pop('volume_index', None)
+        history.append(summary)
+
+        # evict the oldest results that fall outside the retention
+        # policy, dropping them from the history before deleting them
+        expired = self._get_expired_lun_tool_results(history)
+        self._update_lun_tool_history(
+            [summary] if timestamp not in expired else [], expired)
+        for expired_timestamp in expired:
+            LOG.info("lun tool: evicting result %s" % expired_timestamp)
+            self._remove_lun_tool_result(expired_timestamp)
+        return container
+
+    def iter_lun_tool_result_nodes(self, timestamp, node_names=None):
+        container = self._get_container(
+            self._get_lun_tool_container_name(timestamp))
+        if not container:
+            for result in self._get_legacy_lun_tool_results():
+                if result['timestamp'] == timestamp:
+                    for node in result['node_list']:
+                        if node_names is None or \
+                                node['node_name'] in node_names:
+                            yield node
+                    break
+            return
+
+        for node in self._iter_lun_tool_container_nodes(container,
+                                                        node_names):
+            yield node
+
+    def _iter_lun_tool_container_nodes(self, container, node_names=None):
+        if node_names is not None:
+            node_names = set(node_names)
+        manifest = self._get_lun_tool_manifest(container)
+        for chunk in manifest['chunks']:
+            # skip chunks that hold none of the requested nodes
+            if node_names is not None and \
+                    not node_names.intersection(chunk['nodes']):
+                continue
+            for node in self._read_compressed_secrets(container,
+                                                      chunk['parts']):
+                if node_names is None or node['node_name'] in node_names:
+                    yield node
+
+    def get_lun_tool_volume_index(self, timestamp):
+        # None if the result was stored without a volume index
+        container = self._get_container(
+            self._get_lun_tool_container_name(timestamp))
+        if not container:
+            return None
+        manifest = self._get_lun_tool_manifest(container)
+        if 'volume_index' not in manifest:
+            return None
+        return self._read_compressed_secrets(container,
+                                             manifest['volume_index'])
+
+    def get_lun_tool_results(self):
+        results = []
+        containers = self._iter_containers()
+        for container in containers:
+            if container.name.startswith(LUN_TOOL_RESULT + '-'):
+                result = {}
+                result['timestamp'] = \
+                    container.name[len(LUN_TOOL_RESULT) + 1:]
+                result['node_list'] = \
+                    list(self._iter_lun_tool_container_nodes(container))
+                results.append(result)
+
+        for result in self._get_legacy_lun_tool_results():
+            del result['secret_ref']
+            results.append(result)
+
+        return results
+
+    def delete_lun_tool_result(self, timestamp):
+        history = self.get_lun_tool_history()
+        found = [summary for summary in history
+                 if summary['timestamp'] == timestamp]
+        if not found:
+            return self._delete_lun_tool_result_data(timestamp)
+
+        self._update_lun_tool_history(removed=[timestamp])
+        self._remove_lun_tool_result(timestamp)
+        return True
+
+    def _delete_lun_tool_result_data(self, timestamp):
+        container = self._get_container(
+            self._get_lun_tool_container_name(timestamp))
+        if container:
+            self._delete_container(container)
+            return True
+
+        for result in self._get_legacy_lun_tool_results():
+            if result['timestamp'] == timestamp:
+                self.client.secrets.delete(result['secret_ref'])
                 return True
 
         return False
@@ -421,8 +1125,7 @@ class BarbicanAPI(object):
         new_secret.store()
 
     def get_lun_tool_default_os_vars(self):
-        secrets = self.client.secrets.list(name='lun-tool-default-os-vars',
-                                           limit=self.secret_limit)
+        secrets = self._iter_secrets(name='lun-tool-default-os-vars')
         result = {}
         for secret in secrets:
             data_str = secret.payload
@@ -436,8 +1139,7 @@ class BarbicanAPI(object):
         return result
 
     def delete_lun_tool_default_os_vars(self):
-        secrets = self.client.secrets.list(name='lun-tool-default-os-vars',
-                                           limit=self.secret_limit)
+        secrets = self._iter_secrets(name='lun-tool-default-os-vars')
         for secret in secrets:
             data_str = secret.payload
             json_data = json.loads(data_str)
@@ -446,34 +1148,91 @@ class BarbicanAPI(object):
 
         return False
 
-    def add_lun_tool_diffs(self, diffs):
-        secrets = []
+    def _get_lun_tool_diffs_key(self, base_timestamp, compare_timestamp):
+        return base_timestamp + '::' + compare_timestamp
 
-        # store as json string
-        vars_data_str = json.dumps(diffs)
-        new_secret = self.client.secrets.create(
-            name='lun-tool-diffs',
-            payload=vars_data_str)
-        new_secret.store()
+    def _get_lun_tool_diff_index(self):
+        # {diff key: [base timestamp, compare timestamp]}, removed diffs
+        # included as None
+        entries, containers = self._read_merged_map(LUN_TOOL_DIFF_INDEX)
+        return entries or {}
 
-    def get_lun_tool_diffs(self):
-        secrets = self.client.secrets.list(name='lun-tool-diffs',
-                                           limit=self.secret_limit)
-        result = []
-        for secret in secrets:
-            data_str = secret.payload
-            result = json.loads(data_str)
-            break
-
-        return result
-
-    def delete_lun_tool_diffs(self):
-        secrets = self.client.secrets.list(name='lun-tool-diffs',
-                                           limit=self.secret_limit)
-        for secret in secrets:
-            data_str = secret.payload
-            json_data = json.loads(data_str)
-            self.client.secrets.delete(secret.secret_ref)
-            return True
+    def _delete_lun_tool_diff_container(self, diff_key):
+        container = self._get_container(LUN_TOOL_DIFFS + '-' + diff_key)
+        if container:
+            self._delete_container(container)
+
+    def add_lun_tool_diffs(self, base_timestamp, compare_timestamp, diffs):
+        # only cache diffs between results that are still stored
+        history = self.get_lun_tool_history()
+        summaries = [summary for summary in history
+                     if summary['timestamp'] in (base_timestamp,
+                                                 compare_timestamp)]
+        if len(summaries) != 2:
+            return None
+
+        diff_key = self._get_lun_tool_diffs_key(base_timestamp,
+                                                compare_timestamp)
+        secrets = {}
+        self._create_compressed_secrets('diff', diffs, secrets)
 
-        return False
+        # create container
+        secret_list = {}
+        secret_list['secrets'] = secrets
+        container = self.client.containers.create(
+            LUN_TOOL_DIFFS + '-' + diff_key,
+            **secret_list)
+        container.store()
+
+        # remember the cached diffs, so they can be removed along with
+        # either result, and keep only the most recently cached ones for
+        # each result
+        updates = {diff_key: [base_timestamp, compare_timestamp]}
+        diff_index = self._get_lun_tool_diff_index()
+        for timestamp in (base_timestamp, compare_timestamp):
+            cached = sorted((updated, key)
+                            for key, (timestamps, updated)
+                            in diff_index.items()
+                            if timestamps and timestamp in timestamps and
+                            key != diff_key and key not in updates)
+            while cached and len(cached) >= self.lun_tool_max_diffs:
+                updated, key = cached.pop(0)
+                updates[key] = None
+        self._update_merged_map(LUN_TOOL_DIFF_INDEX, updates, create=True)
+
+        for key, timestamps in updates.items():
+            if timestamps is None:
+                self._delete_lun_tool_diff_container(key)
+        return container
+
+    def get_lun_tool_diffs(self, base_timestamp, compare_timestamp):
+        diff_key = self._get_lun_tool_diffs_key(base_timestamp,
+                                                compare_timestamp)
+        container = self._get_container(LUN_TOOL_DIFFS + '-' + diff_key)
+        if not container:
+            return None
+
+        part_names = sorted(container.secret_refs.keys(),
+                            key=lambda k: int(k.split('-')[-1]))
+        return self._read_compressed_secrets(container, part_names)
+
+    def _remove_lun_tool_diffs(self, timestamp):
+        # delete all cached diffs against this result
+        diff_keys = [key for key, (timestamps, updated)
+                     in self._get_lun_tool_diff_index().items()
+                     if timestamps and timestamp in timestamps]
+        if not diff_keys:
+            return False
+
+        self._update_merged_map(LUN_TOOL_DIFF_INDEX,
+                                dict((key, None) for key in diff_keys))
+        for diff_key in diff_keys:
+            self._delete_lun_tool_diff_container(diff_key)
+        return True
+
+    def delete_lun_tool_diffs(self, timestamp):
+        return self._remove_lun_tool_diffs(timestamp)
+
+
+# time each call when the request is being profiled
+profiler.profile_methods(BarbicanAPI, 'barbican')
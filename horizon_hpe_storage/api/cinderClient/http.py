@@ -25,6 +25,7 @@ class HTTPJSONRESTClient(http.HTTPJSONRESTClient):
     """
     HTTP/REST client to access cinder service
     """
+    SERVICE_NAME = 'cinder'
 
     def getHostCapabilities(self, token, tenant_id, host):
         try:
@@ -16,8 +16,6 @@ import uuid
 
 from django.conf import settings
 
-from cinderClient import client
-
 import logging
 
 LOG = logging.getLogger(__name__)
@@ -35,6 +33,8 @@ class CinderAPI(object):
         self.showUrl = '/virtual-volumes/show/overview/r'
 
     def _create_client(self):
+        # only imported once needed, as it pulls in httplib2
+        from cinderClient import client
         cl = client.CinderClient(self.cinder_api_url)
         return cl
 
@@ -23,6 +23,7 @@ except ImportError:
     import simplejson as json
 
 from horizon_hpe_storage.api.common import exceptions
+from horizon_hpe_storage import profiler
 
 
 class HTTPJSONRESTClient(httplib2.Http):
@@ -38,6 +39,8 @@ class HTTPJSONRESTClient(httplib2.Http):
      """
 
     SESSION_COOKIE_NAME = 'Authorization'
+    # name of the service, as shown when requests are profiled
+    SERVICE_NAME = 'http'
 
     def __init__(self, api_url, insecure=False, http_log_debug=True):
         super(HTTPJSONRESTClient, self).__init__(
@@ -132,7 +135,10 @@ class HTTPJSONRESTClient(httplib2.Http):
             kwargs['body'] = json.dumps(kwargs['body'])
 
         self._http_log_req(args, kwargs)
-        resp, body = super(HTTPJSONRESTClient, self).request(*args, **kwargs)
+        with profiler.Timer(self.SERVICE_NAME,
+                            profiler.get_rest_op(args[1], args[0])):
+            resp, body = super(HTTPJSONRESTClient, self).request(*args,
+                                                                 **kwargs)
         self._http_log_resp(resp, body)
 
         # Try and conver the body response to an object
@@ -0,0 +1,36 @@
+# (c) Copyright [2015] Hewlett Packard Enterprise Development LP
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+from threading import Lock
+
+
+class LazyAPI(object):
+    """Class attribute that builds its API object on first use.
+
+    Forms, views and tables share one API object per class. Building it
+    when the class is defined would do it while Horizon imports the
+    panel, so it is built the first time the attribute is read instead.
+    """
+
+    def __init__(self, api_class):
+        self.api_class = api_class
+        self.api = None
+        self.lock = Lock()
+
+    def __get__(self, instance, owner):
+        if self.api is None:
+            with self.lock:
+                if self.api is None:
+                    self.api = self.api_class()
+        return self.api
@@ -29,6 +29,7 @@ class HTTPJSONRESTClient(http.HTTPJSONRESTClient):
     """
     HTTP/REST client to access SSMC backend service
     """
+    SERVICE_NAME = 'ssmc'
 
     def authenticateSSMC(self, user, password, token, optional=None):
         """
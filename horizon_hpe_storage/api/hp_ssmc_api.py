@@ -15,8 +15,6 @@
 import base64
 import uuid
 
-from hpSSMCclient import client
-
 import logging
 
 LOG = logging.getLogger(__name__)
@@ -36,6 +34,8 @@ class HPSSMC(object):
         self.showUrl = "/virtual-volumes/show/overview/r"
 
     def _create_client(self):
+        # only imported once needed, as it pulls in httplib2
+        from hpSSMCclient import client
         cl = client.HPSSMCClient(self.ssmc_api_url)
         return cl
 
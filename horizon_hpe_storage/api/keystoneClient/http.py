@@ -25,6 +25,7 @@ class HTTPJSONRESTClient(http.HTTPJSONRESTClient):
     """
     HTTP/REST client to access keystone service
     """
+    SERVICE_NAME = 'keystone'
 
     def initClient(self, token, tenant_id):
         # use the unscoped token from the Horizon session to get a
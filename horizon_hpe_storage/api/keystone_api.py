@@ -12,54 +12,100 @@
 #    See the License for the specific language governing permissions and
 #    limitations under the License.
 
+import datetime
+import threading
 import uuid
 
 from django.conf import settings
 
-from keystoneClient import client
-from keystoneclient.v2_0 import client as k_client
-from keystoneclient.v3 import client as k3_client
-from keystoneauth1 import session as k_session
-
-from openstack_dashboard.api import keystone as horizon_keystone
-
+from horizon_hpe_storage.api.common import cache
 
 import logging
 
 LOG = logging.getLogger(__name__)
 
+# number of users whose keystone clients are kept by each worker, and
+# seconds a client is kept when its token has no expiry time
+CLIENT_POOL_SIZE = getattr(settings, 'HPE_STORAGE_CLIENT_POOL_SIZE', 32)
+CLIENT_POOL_TIMEOUT = getattr(settings, 'HPE_STORAGE_CLIENT_POOL_TIMEOUT',
+                              3600)
+
+# (client, session) pairs keyed by unscoped token, shared by every
+# KeystoneAPI in the process
+_client_pool = cache.LRUCache(CLIENT_POOL_SIZE, CLIENT_POOL_TIMEOUT)
+
+
+def _get_token_lifetime(token):
+    # seconds until the token expires, or None if unknown
+    expires = getattr(token, 'expires', None)
+    if not isinstance(expires, datetime.datetime):
+        return None
+    if expires.tzinfo is None:
+        now = datetime.datetime.utcnow()
+    else:
+        now = datetime.datetime.now(expires.tzinfo)
+    delta = expires - now
+    return max(delta.days * 86400 + delta.seconds, 0)
+
 
 class KeystoneAPI(object):
 
     def __init__(self):
         openstack_host = getattr(settings, 'OPENSTACK_HOST')
-        self.client = None
         self.uuid = uuid.uuid4()
         self.keystone_api_url = 'http://' + openstack_host + ':5000'
         self.debug = True
         self.launch_page = self.keystone_api_url + '/#/launch-page/'
         self.showUrl = '/virtual-volumes/show/overview/r'
-        self.token = None
-        self.session = None
+        # one KeystoneAPI is shared by every request a worker handles,
+        # so the current user's client is kept per thread
+        self.local = threading.local()
+
+    @property
+    def client(self):
+        return getattr(self.local, 'client', None)
+
+    @property
+    def token(self):
+        return getattr(self.local, 'token', None)
+
+    @property
+    def session(self):
+        return getattr(self.local, 'session', None)
+
+    def _create_client(self, token, tenant_id):
+        # the clients are only imported once needed, so they don't slow
+        # down the start of every Horizon worker
+        from keystoneClient import client
+        from keystoneclient.v2_0 import client as k_client
+        from keystoneauth1 import session as k_session
+
+        keystone_client = client.KeystoneClient(self.keystone_api_url)
+        keystone_client.initClient(token, tenant_id)
+        if self.debug:
+            keystone_client.debug_rest(True)
+
+        admin_client = k_client.Client(
+            token=keystone_client.getTokenId(),
+            endpoint=self.keystone_api_url + "/v2.0",
+            tenant_name='admin')
+        return keystone_client, k_session.Session(auth=admin_client)
 
     def do_setup(self, request):
         try:
             cur_token = request.session['unscoped_token']
-            # only init new cliet with admin token if token has expired and
-            # been re-issued (i.e. user had to log back in)
+            # reuse the client already created for this token, so users
+            # taking turns on a worker don't rebuild it on every request
             if self.token != cur_token:
-                self.token = cur_token
-                tenant_id = request.session._session['token'].project['id']
-                self.client = client.KeystoneClient(self.keystone_api_url)
-                self.client.initClient(self.token, tenant_id)
-                if self.debug:
-                    self.client.debug_rest(True)
-
-                keystone_client = k_client.Client(
-                    token=self.get_token_id(),
-                    endpoint=self.keystone_api_url + "/v2.0",
-                    tenant_name='admin')
-                self.session = k_session.Session(auth=keystone_client)
+                auth_token = request.session._session['token']
+                entry = _client_pool.get(cur_token)
+                if entry is None:
+                    entry = self._create_client(cur_token,
+                                                auth_token.project['id'])
+                    _client_pool.set(cur_token, entry,
+                                     _get_token_lifetime(auth_token))
+                self.local.client, self.local.session = entry
+                self.local.token = cur_token
 
         except Exception as ex:
             return
@@ -0,0 +1,455 @@
+# (c) Copyright [2015] Hewlett Packard Enterprise Development LP
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+from django.conf import settings
+
+import datetime
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import zlib
+
+LOG = logging.getLogger(__name__)
+
+# where diagnostic results are kept - 'barbican' stores them as secrets
+# alongside the credentials, 'sqlite' in a local database file
+BACKEND = getattr(settings, 'HPE_STORAGE_RESULT_BACKEND', 'barbican')
+DB_PATH = getattr(settings, 'HPE_STORAGE_RESULT_DB_PATH',
+                  os.path.join(getattr(settings, 'LOCAL_PATH',
+                                       tempfile.gettempdir()),
+                               'hpe_storage_results.sqlite3'))
+
+LUN_TOOL_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# software tests each node type starts with: (package, minimum version,
+# description, node types or None for all)
+DEFAULT_SOFTWARE_TESTS = [
+    ('sg3-utils || sg3_utils', '1.3',
+     'required for attaching FC volumes', None),
+    ('sysfsutils', '2.1',
+     'required for attaching FC volumes', None),
+    ('python-3parclient', '4.2.0',
+     'required for accessing HPE 3PAR array', ('cinder',)),
+]
+
+# the test results kept for each node, apart from its credentials and
+# config
+NODE_STATUS_FIELDS = ('diag_test_status', 'software_test_status',
+                      'diag_run_time', 'validation_time',
+                      'config_fingerprint')
+
+
+def get_default_software_tests(type):
+    tests = []
+    for package, min_version, description, types in DEFAULT_SOFTWARE_TESTS:
+        if types is None or type in types:
+            software_pkg = {}
+            software_pkg['package'] = package
+            software_pkg['min_version'] = min_version
+            software_pkg['description'] = description
+            tests.append(software_pkg)
+    return tests
+
+
+class ResultStore(object):
+    """Storage for diagnostic results, node test status and software test
+    definitions.
+
+    None of this data is secret, so it doesn't have to be kept in
+    Barbican along with the node and SSMC credentials. BarbicanAPI is the
+    'barbican' backend; SQLiteResultStore is the 'sqlite' backend.
+    """
+
+    # volume path query results to keep - the newest max results, and
+    # none older than max age (in days), if set
+    lun_tool_max_results = 50
+    lun_tool_max_age = None
+
+    def get_lun_tool_history(self):
+        """Returns summaries of the stored results, oldest first."""
+        raise NotImplementedError()
+
+    def add_lun_tool_result(self, timestamp, result, volume_index=None):
+        raise NotImplementedError()
+
+    def iter_lun_tool_result_nodes(self, timestamp, node_names=None):
+        raise NotImplementedError()
+
+    def get_lun_tool_result(self, timestamp):
+        node_list = list(self.iter_lun_tool_result_nodes(timestamp))
+        result = {}
+        result['timestamp'] = timestamp
+        result['node_list'] = node_list
+        return result
+
+    def get_lun_tool_volume_index(self, timestamp):
+        """Returns None if the result was stored without an index."""
+        raise NotImplementedError()
+
+    def delete_lun_tool_result(self, timestamp):
+        raise NotImplementedError()
+
+    def add_lun_tool_diffs(self, base_timestamp, compare_timestamp, diffs):
+        raise NotImplementedError()
+
+    def get_lun_tool_diffs(self, base_timestamp, compare_timestamp):
+        raise NotImplementedError()
+
+    def delete_lun_tool_diffs(self, timestamp):
+        raise NotImplementedError()
+
+    def get_node_status(self, type, name):
+        """Returns the node's status, or {} if it has never been tested.
+
+        A status holds some of NODE_STATUS_FIELDS.
+        """
+        raise NotImplementedError()
+
+    def get_node_statuses(self, type):
+        """Returns {node name: status} for each tested node of a type."""
+        raise NotImplementedError()
+
+    def set_node_status(self, type, name, status):
+        """Replaces the node's status."""
+        raise NotImplementedError()
+
+    def delete_node_status(self, type, name):
+        raise NotImplementedError()
+
+    def get_software_tests(self, type, seed=True):
+        """Returns the node type's software tests.
+
+        If none have been stored yet, the defaults are stored and returned
+        when seed is set, otherwise None is returned.
+        """
+        raise NotImplementedError()
+
+    def set_software_tests(self, type, tests):
+        raise NotImplementedError()
+
+    def update_software_test(self, type, software_pkg,
+                             min_version, description):
+        # just update the one package
+        new_tests = []
+        curr_tests = self.get_software_tests(type)
+        if curr_tests:
+            for curr_test in curr_tests:
+                if curr_test['package'] == software_pkg:
+                    test = {}
+                    test['package'] = software_pkg
+                    test['min_version'] = min_version
+                    test['description'] = description
+                    new_tests.append(test)
+                else:
+                    new_tests.append(curr_test)
+
+            self.set_software_tests(type, new_tests)
+
+    def add_software_test(self, type, software_pkg,
+                          min_version, description):
+        tests = self.get_software_tests(type) or []
+        new_test = {}
+        new_test['package'] = software_pkg
+        new_test['min_version'] = min_version
+        new_test['description'] = description
+        tests.append(new_test)
+        return self.set_software_tests(type, tests)
+
+    def delete_software_test(self, type, software_pkg):
+        curr_tests = self.get_software_tests(type) or []
+        new_tests = []
+        for test in curr_tests:
+            if test['package'] != software_pkg:
+                new_tests.append(test)
+        self.set_software_tests(type, new_tests)
+
+    def delete_all_software_tests(self, type):
+        self.set_software_tests(type, [])
+
+    def _get_lun_tool_summary(self, timestamp, node_list):
+        summary = {}
+        summary['timestamp'] = timestamp
+        summary['num_nodes'] = len(node_list)
+        summary['num_paths'] = 0
+        summary['num_attached'] = 0
+        for node in node_list:
+            summary['num_paths'] += len(node['paths'])
+            for path in node['paths']:
+                if path['vol_id']:
+                    summary['num_attached'] += 1
+        return summary
+
+    def _get_expired_lun_tool_results(self, history):
+        # the oldest results that fall outside the retention policy
+        history = sorted(history, key=lambda k: k['timestamp'])
+        evict_cnt = 0
+        if self.lun_tool_max_results and \
+                len(history) > self.lun_tool_max_results:
+            evict_cnt = len(history) - self.lun_tool_max_results
+
+        if self.lun_tool_max_age:
+            oldest = datetime.datetime.now() - \
+                datetime.timedelta(days=self.lun_tool_max_age)
+            oldest = oldest.strftime(LUN_TOOL_TIME_FORMAT)
+            while evict_cnt < len(history) - 1 and \
+                    history[evict_cnt]['timestamp'] < oldest:
+                evict_cnt += 1
+
+        return [summary['timestamp'] for summary in history[:evict_cnt]]
+
+
+def _pack(data):
+    return sqlite3.Binary(zlib.compress(json.dumps(data)))
+
+
+def _unpack(data):
+    return json.loads(zlib.decompress(str(data)))
+
+
+class SQLiteResultStore(ResultStore):
+    """Keeps results in a local SQLite database.
+
+    Each node of a volume path query result is its own row, so reading
+    some nodes only decodes those nodes. The database is local to the
+    host, so a dashboard run on several hosts should keep using the
+    barbican backend.
+    """
+
+    schema = [
+        'CREATE TABLE IF NOT EXISTS lun_tool_results ('
+        ' timestamp TEXT PRIMARY KEY,'
+        ' summary TEXT NOT NULL,'
+        ' volume_index BLOB)',
+        'CREATE TABLE IF NOT EXISTS lun_tool_nodes ('
+        ' timestamp TEXT NOT NULL,'
+        ' node_name TEXT NOT NULL,'
+        ' position INTEGER NOT NULL,'
+        ' data BLOB NOT NULL,'
+        ' PRIMARY KEY (timestamp, node_name))',
+        'CREATE TABLE IF NOT EXISTS lun_tool_diffs ('
+        ' base_timestamp TEXT NOT NULL,'
+        ' compare_timestamp TEXT NOT NULL,'
+        ' data BLOB NOT NULL,'
+        ' PRIMARY KEY (base_timestamp, compare_timestamp))',
+        'CREATE INDEX IF NOT EXISTS lun_tool_diffs_compare'
+        ' ON lun_tool_diffs (compare_timestamp)',
+        'CREATE TABLE IF NOT EXISTS software_tests ('
+        ' node_type TEXT PRIMARY KEY,'
+        ' tests TEXT NOT NULL)',
+        'CREATE TABLE IF NOT EXISTS node_status ('
+        ' node_type TEXT NOT NULL,'
+        ' node_name TEXT NOT NULL,'
+        ' status TEXT NOT NULL,'
+        ' PRIMARY KEY (node_type, node_name))',
+    ]
+
+    def __init__(self, path=None):
+        self.path = path or DB_PATH
+        self.lun_tool_max_results = getattr(
+            settings, 'HPE_STORAGE_LUN_TOOL_MAX_RESULTS',
+            self.lun_tool_max_results)
+        self.lun_tool_max_age = getattr(
+            settings, 'HPE_STORAGE_LUN_TOOL_MAX_AGE',
+            self.lun_tool_max_age)
+        # sqlite connections can't be shared between threads
+        self.local = threading.local()
+
+    def _connect(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            # lets requests read while a result is being written
+            conn.execute('PRAGMA journal_mode=WAL')
+            with conn:
+                for statement in self.schema:
+                    conn.execute(statement)
+            self.local.conn = conn
+        return conn
+
+    def get_lun_tool_history(self):
+        rows = self._connect().execute(
+            'SELECT summary FROM lun_tool_results ORDER BY timestamp')
+        return [json.loads(summary) for summary, in rows]
+
+    def add_lun_tool_result(self, timestamp, result, volume_index=None):
+        summary = self._get_lun_tool_summary(timestamp, result)
+        conn = self._connect()
+        with conn:
+            self._delete_lun_tool_result(conn, timestamp)
+            conn.execute(
+                'INSERT INTO lun_tool_results VALUES (?, ?, ?)',
+                (timestamp, json.dumps(summary),
+                 None if volume_index is None else _pack(volume_index)))
+            conn.executemany(
+                'INSERT OR REPLACE INTO lun_tool_nodes VALUES (?, ?, ?, ?)',
+                ((timestamp, node['node_name'], position, _pack(node))
+                 for position, node in enumerate(result)))
+
+            history = self.get_lun_tool_history()
+            for expired in self._get_expired_lun_tool_results(history):
+                LOG.info("lun tool: evicting result %s" % expired)
+                self._delete_lun_tool_result(conn, expired)
+
+    def iter_lun_tool_result_nodes(self, timestamp, node_names=None):
+        query = 'SELECT data FROM lun_tool_nodes WHERE timestamp = ?'
+        args = [timestamp]
+        if node_names is not None:
+            node_names = list(node_names)
+            if not node_names:
+                return
+            query += ' AND node_name IN (%s)' % \
+                ', '.join('?' * len(node_names))
+            args.extend(node_names)
+        rows = self._connect().execute(query + ' ORDER BY position', args)
+        for data, in rows:
+            yield _unpack(data)
+
+    def get_lun_tool_volume_index(self, timestamp):
+        row = self._connect().execute(
+            'SELECT volume_index FROM lun_tool_results WHERE timestamp = ?',
+            (timestamp,)).fetchone()
+        if row is None or row[0] is None:
+            return None
+        return _unpack(row[0])
+
+    def _delete_lun_tool_result(self, conn, timestamp):
+        # the result along with any cached diffs against it
+        deleted = conn.execute(
+            'DELETE FROM lun_tool_results WHERE timestamp = ?',
+            (timestamp,)).rowcount
+        conn.execute('DELETE FROM lun_tool_nodes WHERE timestamp = ?',
+                     (timestamp,))
+        self._delete_lun_tool_diffs(conn, timestamp)
+        return deleted > 0
+
+    def delete_lun_tool_result(self, timestamp):
+        conn = self._connect()
+        with conn:
+            return self._delete_lun_tool_result(conn, timestamp)
+
+    def add_lun_tool_diffs(self, base_timestamp, compare_timestamp, diffs):
+        # only cache diffs between results that are still stored
+        conn = self._connect()
+        with conn:
+            found = conn.execute(
+                'SELECT COUNT(*) FROM lun_tool_results'
+                ' WHERE timestamp IN (?, ?)',
+                (base_timestamp, compare_timestamp)).fetchone()[0]
+            if found != 2:
+                return None
+            conn.execute(
+                'INSERT OR REPLACE INTO lun_tool_diffs VALUES (?, ?, ?)',
+                (base_timestamp, compare_timestamp, _pack(diffs)))
+        return True
+
+    def get_lun_tool_diffs(self, base_timestamp, compare_timestamp):
+        row = self._connect().execute(
+            'SELECT data FROM lun_tool_diffs'
+            ' WHERE base_timestamp = ? AND compare_timestamp = ?',
+            (base_timestamp, compare_timestamp)).fetchone()
+        if row is None:
+            return None
+        return _unpack(row[0])
+
+    def _delete_lun_tool_diffs(self, conn, timestamp):
+        return conn.execute(
+            'DELETE FROM lun_tool_diffs'
+            ' WHERE base_timestamp = ? OR compare_timestamp = ?',
+            (timestamp, timestamp)).rowcount > 0
+
+    def delete_lun_tool_diffs(self, timestamp):
+        conn = self._connect()
+        with conn:
+            return self._delete_lun_tool_diffs(conn, timestamp)
+
+    def get_node_status(self, type, name):
+        row = self._connect().execute(
+            'SELECT status FROM node_status'
+            ' WHERE node_type = ? AND node_name = ?',
+            (type, name)).fetchone()
+        if row is None:
+            return {}
+        return json.loads(row[0])
+
+    def get_node_statuses(self, type):
+        rows = self._connect().execute(
+            'SELECT node_name, status FROM node_status WHERE node_type = ?',
+            (type,))
+        return dict((name, json.loads(status)) for name, status in rows)
+
+    def set_node_status(self, type, name, status):
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO node_status VALUES (?, ?, ?)',
+                (type, name, json.dumps(status)))
+
+    def delete_node_status(self, type, name):
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                'DELETE FROM node_status'
+                ' WHERE node_type = ? AND node_name = ?', (type, name))
+
+    def get_software_tests(self, type, seed=True):
+        row = self._connect().execute(
+            'SELECT tests FROM software_tests WHERE node_type = ?',
+            (type,)).fetchone()
+        if row is not None:
+            return json.loads(row[0])
+        if not seed:
+            return None
+
+        # if no tests exist, we are creating the first test, so seed
+        # with some standard tests
+        tests = get_default_software_tests(type)
+        self.set_software_tests(type, tests)
+        return tests
+
+    def set_software_tests(self, type, tests):
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO software_tests VALUES (?, ?)',
+                (type, json.dumps(tests)))
+        return tests
+
+
+_sqlite_store = None
+_sqlite_store_lock = threading.Lock()
+
+
+def get_sqlite_store(path=None):
+    global _sqlite_store
+    if path is not None:
+        return SQLiteResultStore(path)
+    with _sqlite_store_lock:
+        if _sqlite_store is None:
+            _sqlite_store = SQLiteResultStore()
+        return _sqlite_store
+
+
+def get_result_store(barbican_api, backend=None):
+    """Returns the configured ResultStore.
+
+    barbican_api must already be set up, as it is the store for the
+    'barbican' backend.
+    """
+    backend = backend or BACKEND
+    if backend == 'sqlite':
+        return get_sqlite_store()
+    return barbican_api
@@ -14,18 +14,13 @@
 
 from django.utils.translation import ugettext_lazy as _
 from horizon import tables
-from openstack_dashboard.dashboards.admin.volumes.volumes import tables \
-    as volumes_tables
-from openstack_dashboard.dashboards.admin.volumes.snapshots import tables \
-    as snapshots_tables
-from openstack_dashboard.dashboards.admin.volumes import tabs
 
+from django.core import signals
 from django.core.urlresolvers import reverse
 
 import logging
 import re
-
-import horizon_hpe_storage.api.keystone_api as keystone
+import threading
 
 LOG = logging.getLogger(__name__)
 
@@ -33,6 +28,11 @@ LOG = logging.getLogger(__name__)
 # every volume in the volume table
 keystone_api = None
 
+# the extended volume tables, built by install_tables()
+VolumesTableWithLaunch = None
+SnapshotsTableWithLaunch = None
+_install_lock = threading.Lock()
+
 
 class VolumeBaseElementManager(tables.LinkAction):
     # launch in new window
@@ -45,6 +45,7 @@ class VolumeBaseElementManager(tables.LinkAction):
 
     def get_deep_link_endpoints(self, request):
         global keystone_api
+        import horizon_hpe_storage.api.keystone_api as keystone
         endpoints = []
         for i in range(0, 2):
             try:
@@ -116,18 +117,6 @@ class VolumeLaunchElementManagerCGroup(VolumeBaseElementManager):
         return False
 
 
-class VolumesTableWithLaunch(volumes_tables.VolumesTable):
-    """ Extend the VolumesTable by adding the new row action
-    """
-    class Meta(volumes_tables.VolumesTable.Meta):
-        # Add the extra action to the end of the row actions
-        row_actions = volumes_tables.VolumesTable.Meta.row_actions + \
-            (VolumeLaunchElementManagerVolume,
-             VolumeLaunchElementManagerCPG,
-             VolumeLaunchElementManagerDomain,
-             VolumeLaunchElementManagerCGroup)
-
-
 class SnapshotBaseElementManager(tables.LinkAction):
     # launch in new window
     attrs = {"target": "_blank"}
@@ -139,6 +128,7 @@ class SnapshotBaseElementManager(tables.LinkAction):
 
     def get_deep_link_endpoints(self, request):
         global keystone_api
+        import horizon_hpe_storage.api.keystone_api as keystone
         endpoints = []
         for i in range(0, 2):
             try:
@@ -194,17 +184,49 @@ class SnapshotLaunchElementManagerVolume(SnapshotBaseElementManager):
     url = "horizon:admin:hpe_storage:config:link_to_snapshot"
 
 
-class SnapshotsTableWithLaunch(snapshots_tables.VolumeSnapshotsTable):
-    """ Extend the VolumeSnapshotsTable by adding the new row action
-    """
-    class Meta(snapshots_tables.VolumeSnapshotsTable.Meta):
-        # Add the extra action to the end of the row actions
-        row_actions = \
-            snapshots_tables.VolumeSnapshotsTable.Meta.row_actions + \
-            (SnapshotLaunchElementManagerVolume,)
-
+def install_tables(**kwargs):
+    """Replace the admin volume and snapshot tables with extended ones.
 
-# Replace the standard Volumes table with this extended version
-tabs.VolumeTab.table_classes = (VolumesTableWithLaunch,)
-# Replace the standard Volumes table with this extended version
-tabs.SnapshotTab.table_classes = (SnapshotsTableWithLaunch,)
+    Horizon loads this module while a worker starts, so the admin volume
+    tables are only imported, and extended, when the first request comes
+    in.
+    """
+    global VolumesTableWithLaunch, SnapshotsTableWithLaunch
+    with _install_lock:
+        if VolumesTableWithLaunch is not None:
+            return
+        from openstack_dashboard.dashboards.admin.volumes.volumes \
+            import tables as volumes_tables
+        from openstack_dashboard.dashboards.admin.volumes.snapshots \
+            import tables as snapshots_tables
+        from openstack_dashboard.dashboards.admin.volumes import tabs
+
+        class VolumesTableWithLaunch(volumes_tables.VolumesTable):
+            """ Extend the VolumesTable by adding the new row action
+            """
+            class Meta(volumes_tables.VolumesTable.Meta):
+                # Add the extra action to the end of the row actions
+                row_actions = volumes_tables.VolumesTable.Meta.row_actions + \
+                    (VolumeLaunchElementManagerVolume,
+                     VolumeLaunchElementManagerCPG,
+                     VolumeLaunchElementManagerDomain,
+                     VolumeLaunchElementManagerCGroup)
+
+        class SnapshotsTableWithLaunch(snapshots_tables.VolumeSnapshotsTable):
+            """ Extend the VolumeSnapshotsTable by adding the new row action
+            """
+            class Meta(snapshots_tables.VolumeSnapshotsTable.Meta):
+                # Add the extra action to the end of the row actions
+                row_actions = \
+                    snapshots_tables.VolumeSnapshotsTable.Meta.row_actions + \
+                    (SnapshotLaunchElementManagerVolume,)
+
+        # Replace the standard Volumes table with this extended version
+        tabs.VolumeTab.table_classes = (VolumesTableWithLaunch,)
+        # Replace the standard Volumes table with this extended version
+        tabs.SnapshotTab.table_classes = (SnapshotsTableWithLaunch,)
+    signals.request_started.disconnect(install_tables,
+                                       dispatch_uid=__name__)
+
+
+signals.request_started.connect(install_tables, dispatch_uid=__name__)
@@ -0,0 +1,243 @@
+# (c) Copyright [2015] Hewlett Packard Enterprise Development LP
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+"""Counts and times the backend calls made by each storage panel request.
+
+Profiling is off unless HPE_STORAGE_PROFILE is set, and needs the
+middleware added to the Horizon settings:
+
+    HPE_STORAGE_PROFILE = True
+    MIDDLEWARE_CLASSES += (
+        'horizon_hpe_storage.profiler.ProfilerMiddleware',)
+
+Each request to a storage panel view then gets a Server-Timing header
+with the time spent in Barbican, Keystone, Cinder, Nova, SSMC and
+cinderdiags and the number of calls made to each, and a debug log line
+listing every kind of call made, how many times it was made and how
+long it took in total. Calls made inside another call to the same
+service are counted, so a call repeated for every item of a list shows
+up, but their time is only added to the service total once.
+"""
+
+from collections import OrderedDict
+from django.conf import settings
+from urlparse import urlsplit
+
+try:
+    from django.utils.deprecation import MiddlewareMixin
+except ImportError:
+    MiddlewareMixin = object
+
+import functools
+import inspect
+import logging
+import re
+import threading
+import time
+
+LOG = logging.getLogger(__name__)
+
+PROFILE = getattr(settings, 'HPE_STORAGE_PROFILE', False)
+
+# ids in REST paths, collapsed so calls for different objects group
+ID_PATTERN = re.compile(r'/[0-9a-fA-F-]{16,}')
+
+_local = threading.local()
+
+# set once the Horizon API functions have been wrapped
+_dashboard_apis_profiled = False
+
+
+class Profile(object):
+    """The backend calls made while handling one request."""
+
+    def __init__(self):
+        self.start = time.time()
+        # (category, op) -> [count, seconds], where the seconds include
+        # any calls the op made in turn
+        self.calls = OrderedDict()
+        # category -> [count, seconds], where the count includes nested
+        # calls but the seconds only the outermost ones
+        self.totals = OrderedDict()
+        # category -> number of calls of that category in progress
+        self.active = {}
+
+    def enter(self, category):
+        """Marks a call as started, and returns whether it is nested."""
+        depth = self.active.get(category, 0)
+        self.active[category] = depth + 1
+        return depth > 0
+
+    def leave(self, category):
+        self.active[category] -= 1
+
+    def add(self, category, op, seconds, nested=False):
+        entry = self.calls.setdefault((category, op), [0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+        total = self.totals.setdefault(category, [0, 0.0])
+        total[0] += 1
+        if not nested:
+            total[1] += seconds
+
+    def get_totals(self):
+        """Returns {category: [count, seconds]}."""
+        return self.totals
+
+    def get_server_timing(self):
+        timings = []
+        for category, (count, seconds) in self.get_totals().items():
+            timings.append('%s;dur=%.1f;desc="%d calls"' %
+                           (category, seconds * 1000, count))
+        timings.append('total;dur=%.1f' %
+                       ((time.time() - self.start) * 1000))
+        return ', '.join(timings)
+
+    def get_summary(self):
+        # slowest first
+        calls = sorted(self.calls.items(), key=lambda item: -item[1][1])
+        return ', '.join(['%s %s x%d %.1fms' %
+                          (category, op, count, seconds * 1000)
+                          for (category, op), (count, seconds) in calls])
+
+
+def start():
+    """Starts collecting the calls made on this thread."""
+    _local.profile = Profile()
+    return _local.profile
+
+
+def stop():
+    """Stops collecting, and returns what was collected, if anything."""
+    profile = getattr(_local, 'profile', None)
+    _local.profile = None
+    return profile
+
+
+def get_profile():
+    return getattr(_local, 'profile', None)
+
+
+class Timer(object):
+    """Records one call, if calls are being collected on this thread.
+
+    Used either as a context manager, or with start and stop where the
+    call doesn't fit in one block.
+    """
+
+    def __init__(self, category, op):
+        self.category = category
+        self.op = op
+        self.profile = None
+
+    def start(self):
+        self.profile = get_profile()
+        if self.profile is not None:
+            self.nested = self.profile.enter(self.category)
+            self.started = time.time()
+        return self
+
+    def stop(self):
+        if self.profile is not None:
+            self.profile.leave(self.category)
+            self.profile.add(self.category, self.op,
+                             time.time() - self.started, self.nested)
+            self.profile = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+def get_rest_op(method, uri):
+    # e.g. GET /v3/endpoints, without the host, query or object ids
+    path = ID_PATTERN.sub('/{id}', urlsplit(uri).path)
+    return '%s %s' % (method, path)
+
+
+def _profiled(category, name, func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        profile = get_profile()
+        if profile is None:
+            return func(*args, **kwargs)
+        nested = profile.enter(category)
+        started = time.time()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.leave(category)
+            profile.add(category, name, time.time() - started, nested)
+    return wrapper
+
+
+def profile_methods(cls, category):
+    """Records calls to the public methods of cls, including inherited ones.
+
+    Every call is counted when one method calls another, but only the
+    outermost call's time is added to the category total.
+    """
+    for name, method in inspect.getmembers(cls, inspect.ismethod):
+        if not name.startswith('_'):
+            setattr(cls, name, _profiled(category, name, method.__func__))
+
+
+def profile_functions(module, category):
+    """Records calls to the public functions defined in module."""
+    for name, func in inspect.getmembers(module, inspect.isfunction):
+        if (not name.startswith('_') and
+                func.__module__ == module.__name__):
+            setattr(module, name, _profiled(category, name, func))
+
+
+def profile_dashboard_apis():
+    """Records the panel's calls to the Horizon Cinder and Nova APIs."""
+    global _dashboard_apis_profiled
+    if _dashboard_apis_profiled:
+        return
+    _dashboard_apis_profiled = True
+    from openstack_dashboard.api import cinder
+    from openstack_dashboard.api import nova
+    profile_functions(cinder, 'cinder')
+    profile_functions(nova, 'nova')
+
+
+class ProfilerMiddleware(MiddlewareMixin):
+    """Profiles the requests handled by the storage panel views."""
+
+    def __init__(self, *args, **kwargs):
+        super(ProfilerMiddleware, self).__init__(*args, **kwargs)
+        if PROFILE:
+            profile_dashboard_apis()
+
+    def process_request(self, request):
+        # drop anything left on this thread by an earlier request
+        stop()
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        module = getattr(view_func, '__module__', None) or ''
+        if PROFILE and module.startswith('horizon_hpe_storage.'):
+            start()
+
+    def process_response(self, request, response):
+        profile = stop()
+        if profile is not None:
+            response['Server-Timing'] = profile.get_server_timing()
+            LOG.debug("profile %s %s %.1fms: %s" %
+                      (request.method, request.path,
+                       (time.time() - profile.start) * 1000,
+                       profile.get_summary()))
+        return response
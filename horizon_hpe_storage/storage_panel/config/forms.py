@@ -32,6 +32,8 @@ from urlparse import urlparse
 
 import horizon_hpe_storage.api.keystone_api as keystone
 import horizon_hpe_storage.api.barbican_api as barbican
+from horizon_hpe_storage.api.common import lazy
+import horizon_hpe_storage.api.result_store as result_store
 import horizon_hpe_storage.test_engine.node_test as tester
 
 from openstack_dashboard.api import cinder as horizon_cinder
@@ -55,8 +57,8 @@ class CreateEndpoint(forms.SelfHandlingForm):
         label=_("Confirm Password"),
         widget=forms.PasswordInput(render_value=False))
 
-    keystone_api = keystone.KeystoneAPI()
-    barbican_api = barbican.BarbicanAPI()
+    keystone_api = lazy.LazyAPI(keystone.KeystoneAPI)
+    barbican_api = lazy.LazyAPI(barbican.BarbicanAPI)
 
     def __init__(self, request, *args, **kwargs):
         super(forms.SelfHandlingForm, self).__init__(request, *args, **kwargs)
@@ -145,8 +147,8 @@ class EditEndpoint(forms.SelfHandlingForm):
         required=False,
         widget=forms.PasswordInput(render_value=False))
 
-    keystone_api = keystone.KeystoneAPI()
-    barbican_api = barbican.BarbicanAPI()
+    keystone_api = lazy.LazyAPI(keystone.KeystoneAPI)
+    barbican_api = lazy.LazyAPI(barbican.BarbicanAPI)
 
     def __init__(self, request, *args, **kwargs):
         super(EditEndpoint, self).__init__(request, *args, **kwargs)
@@ -294,37 +296,26 @@ def run_ssh_validation_test(node, node_type, barbican_api):
     json_test_data = json.dumps(all_data)
 
     # run ssh validation check on cinder node
-    validator = tester.NodeTest()
-    validator.run_credentials_check_test(json_test_data)
-
-    if "fail" in validator.test_result_text:
-        error_text = 'SSH credential validation failed'
-        LOG.info(("%s") % validator.error_text)
+    validator = tester.get_node_test()
+    try:
+        validator.run_credentials_check_test(json_test_data)
+        if "fail" in validator.test_result_text:
+            error_text = 'SSH credential validation failed'
+            LOG.info(("%s") % validator.error_text)
+            errors_occurred = True
+    except tester.NodeTestTimeout as ex:
+        LOG.info(("%s") % ex)
         errors_occurred = True
 
     # update test data
-    barbican_api.delete_node(
-        node['node_name'],
-        node_type)
-
     if errors_occurred:
         result = "Failed"
     else:
         result = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 
-    config_path = None
-    if node_type == barbican.CINDER_NODE_TYPE:
-        config_path = node['config_path']
-
-    barbican_api.add_node(
-        node['node_name'],
-        node_type,
-        node['node_ip'],
-        node['host_name'],
-        node['ssh_name'],
-        node['ssh_pwd'],
-        config_path=config_path,
-        ssh_validation_time=result)
+    store = result_store.get_result_store(barbican_api)
+    store.set_node_status(node_type, node['node_name'],
+                          {'validation_time': result})
 
 
 class RegisterCinderNode(forms.SelfHandlingForm):
@@ -356,8 +347,8 @@ class RegisterCinderNode(forms.SelfHandlingForm):
         label=_("Cinder config file path"),
         help_text=_("Path to cinder.conf file on the Cinder node."))
 
-    keystone_api = keystone.KeystoneAPI()
-    barbican_api = barbican.BarbicanAPI()
+    keystone_api = lazy.LazyAPI(keystone.KeystoneAPI)
+    barbican_api = lazy.LazyAPI(barbican.BarbicanAPI)
 
     def __init__(self, request, *args, **kwargs):
         super(forms.SelfHandlingForm, self).__init__(request, *args, **kwargs)
@@ -431,8 +422,8 @@ class EditCinderNode(forms.SelfHandlingForm):
         label=_("Cinder config file path"),
         help_text=_("Path to cinder.conf file on the Cinder node."))
 
-    keystone_api = keystone.KeystoneAPI()
-    barbican_api = barbican.BarbicanAPI()
+    keystone_api = lazy.LazyAPI(keystone.KeystoneAPI)
+    barbican_api = lazy.LazyAPI(barbican.BarbicanAPI)
 
     def __init__(self, request, *args, **kwargs):
         super(EditCinderNode, self).__init__(request, *args, **kwargs)
@@ -527,14 +518,15 @@ class EditCinderNode(forms.SelfHandlingForm):
 
     def handle(self, request, data):
         try:
-            # no barbican api for update, so delete and add
             self.keystone_api.do_setup(request)
             self.barbican_api.do_setup(self.keystone_api.get_session())
-            self.barbican_api.delete_node(
-                self.fields['node_name'].initial,
-                barbican.CINDER_NODE_TYPE)
+            # replace the node in place, unless it was renamed
+            old_name = self.fields['node_name'].initial
+            if old_name != data['node_name']:
+                self.barbican_api.delete_node(old_name,
+                                              barbican.CINDER_NODE_TYPE)
 
-            self.barbican_api.add_node(
+            self.barbican_api.upsert_node(
                 data['node_name'],
                 barbican.CINDER_NODE_TYPE,
                 data['node_ip'],
@@ -562,8 +554,8 @@ class ValidateCinderNode(forms.SelfHandlingForm):
         required=False,
         widget=forms.TextInput(attrs={'readonly': 'readonly'}))
 
-    keystone_api = keystone.KeystoneAPI()
-    barbican_api = barbican.BarbicanAPI()
+    keystone_api = lazy.LazyAPI(keystone.KeystoneAPI)
+    barbican_api = lazy.LazyAPI(barbican.BarbicanAPI)
 
     def __init__(self, request, *args, **kwargs):
         super(forms.SelfHandlingForm, self).__init__(request, *args, **kwargs)
@@ -605,8 +597,8 @@ class ValidateAllCinderNodes(forms.SelfHandlingForm):
         widget=forms.Textarea(
             attrs={'rows': 6, 'readonly': 'readonly'}))
 
-    keystone_api = keystone.KeystoneAPI()
-    barbican_api = barbican.BarbicanAPI()
+    keystone_api = lazy.LazyAPI(keystone.KeystoneAPI)
+    barbican_api = lazy.LazyAPI(barbican.BarbicanAPI)
     nodes = None
 
     def __init__(self, request, *args, **kwargs):
@@ -677,8 +669,8 @@ class RegisterNovaNode(forms.SelfHandlingForm):
         label=_("Confirm Password"),
         widget=forms.PasswordInput(render_value=False))
 
-    keystone_api = keystone.KeystoneAPI()
-    barbican_api = barbican.BarbicanAPI()
+    keystone_api = lazy.LazyAPI(keystone.KeystoneAPI)
+    barbican_api = lazy.LazyAPI(barbican.BarbicanAPI)
 
     def __init__(self, request, *args, **kwargs):
         super(forms.SelfHandlingForm, self).__init__(request, *args, **kwargs)
@@ -743,8 +735,8 @@ class EditNovaNode(forms.SelfHandlingForm):
         required=False,
         widget=forms.PasswordInput(render_value=False))
 
-    keystone_api = keystone.KeystoneAPI()
-    barbican_api = barbican.BarbicanAPI()
+    keystone_api = lazy.LazyAPI(keystone.KeystoneAPI)
+    barbican_api = lazy.LazyAPI(barbican.BarbicanAPI)
 
     def __init__(self, request, *args, **kwargs):
         super(EditNovaNode, self).__init__(request, *args, **kwargs)
@@ -817,14 +809,15 @@ class EditNovaNode(forms.SelfHandlingForm):
 
     def handle(self, request, data):
         try:
-            # no barbican api for update, so delete and add
             self.keystone_api.do_setup(request)
             self.barbican_api.do_setup(self.keystone_api.get_session())
-            self.barbican_api.delete_node(
-                self.fields['node_name'].initial,
-                barbican.NOVA_NODE_TYPE)
+            # replace the node in place, unless it was renamed
+            old_name = self.fields['node_name'].initial
+            if old_name != data['node_name']:
+                self.barbican_api.delete_node(old_name,
+                                              barbican.NOVA_NODE_TYPE)
 
-            self.barbican_api.add_node(
+            self.barbican_api.upsert_node(
                 data['node_name'],
                 barbican.NOVA_NODE_TYPE,
                 data['node_ip'],
@@ -850,8 +843,8 @@ class ValidateNovaNode(forms.SelfHandlingForm):
         required=False,
         widget=forms.TextInput(attrs={'readonly': 'readonly'}))
 
-    keystone_api = keystone.KeystoneAPI()
-    barbican_api = barbican.BarbicanAPI()
+    keystone_api = lazy.LazyAPI(keystone.KeystoneAPI)
+    barbican_api = lazy.LazyAPI(barbican.BarbicanAPI)
     node = None
 
     def __init__(self, request, *args, **kwargs):
@@ -894,8 +887,8 @@ class ValidateAllNovaNodes(forms.SelfHandlingForm):
         widget=forms.Textarea(
             attrs={'rows': 6, 'readonly': 'readonly'}))
 
-    keystone_api = keystone.KeystoneAPI()
-    barbican_api = barbican.BarbicanAPI()
+    keystone_api = lazy.LazyAPI(keystone.KeystoneAPI)
+    barbican_api = lazy.LazyAPI(barbican.BarbicanAPI)
     nodes = None
 
     def __init__(self, request, *args, **kwargs):
@@ -961,8 +954,8 @@ class ManageOSVars(forms.SelfHandlingForm):
     os_auth = forms.CharField(
         label=_("OS_AUTH_URL"))
 
-    keystone_api = keystone.KeystoneAPI()
-    barbican_api = barbican.BarbicanAPI()
+    keystone_api = lazy.LazyAPI(keystone.KeystoneAPI)
+    barbican_api = lazy.LazyAPI(barbican.BarbicanAPI)
 
     def __init__(self, request, *args, **kwargs):
         super(ManageOSVars, self).__init__(request, *args, **kwargs)
@@ -1023,42 +1016,18 @@ class ManageOSVars(forms.SelfHandlingForm):
                 node_name,
                 barbican.NOVA_NODE_TYPE)
 
-            self.barbican_api.delete_node(
-                self.fields['node_name'].initial,
-                barbican.NOVA_NODE_TYPE)
-
-            diag_run_time = None
-            if 'diag_run_time' in node:
-                diag_run_time = node['diag_run_time']
-
-            diag_test_status = None
-            if 'diag_test_status' in node:
-                diag_test_status = node['diag_test_status']
-
-            ssh_validation_time = None
-            if 'validation_time' in node:
-                ssh_validation_time = node['validation_time']
-
-            software_status = None
-            if 'software_test_status' in node:
-                software_status = node['software_test_status']
-
             os_vars = {'os_username': data['os_username'],
                        'os_password': data['os_password'],
                        'os_tenant': data['os_tenant'],
                        'os_auth': data['os_auth']}
 
-            self.barbican_api.add_node(
+            self.barbican_api.upsert_node(
                 node_name,
                 barbican.NOVA_NODE_TYPE,
                 node['node_ip'],
                 node['host_name'],
                 node['ssh_name'],
                 node['ssh_pwd'],
-                diag_status=diag_test_status,
-                software_status=software_status,
-                diag_run_time=diag_run_time,
-                ssh_validation_time=ssh_validation_time,
                 os_vars=os_vars)
 
             messages.success(request, _('Successfully updated OpenStack '
@@ -15,6 +15,8 @@ from django.utils.translation import ugettext_lazy as _
 
 import horizon_hpe_storage.api.keystone_api as keystone
 import horizon_hpe_storage.api.barbican_api as barbican
+from horizon_hpe_storage.api.common import lazy
+import horizon_hpe_storage.api.result_store as result_store
 
 from horizon import exceptions
 from horizon import forms
@@ -27,17 +29,18 @@ class AddSoftwareTest(forms.SelfHandlingForm):
     description = forms.CharField(max_length=255,
                                   required=False,
                                   label=_("Description"))
-    keystone_api = keystone.KeystoneAPI()
-    barbican_api = barbican.BarbicanAPI()
+    keystone_api = lazy.LazyAPI(keystone.KeystoneAPI)
+    barbican_api = lazy.LazyAPI(barbican.BarbicanAPI)
 
     def handle(self, request, data):
         node_type = self.initial['node_type']
         try:
             self.keystone_api.do_setup(self.request)
             self.barbican_api.do_setup(self.keystone_api.get_session())
-            self.barbican_api.add_software_test(node_type, data['sw_package'],
-                                                data['min_version'],
-                                                data['description'])
+            store = result_store.get_result_store(self.barbican_api)
+            store.add_software_test(node_type, data['sw_package'],
+                                    data['min_version'],
+                                    data['description'])
             msg = _('Added softare package "%s".') % data['sw_package']
             messages.success(request, msg)
             return True
@@ -53,8 +56,8 @@ class EditSoftwareTest(forms.SelfHandlingForm):
     description = forms.CharField(max_length=255,
                                   required=False,
                                   label=_("Description"))
-    keystone_api = keystone.KeystoneAPI()
-    barbican_api = barbican.BarbicanAPI()
+    keystone_api = lazy.LazyAPI(keystone.KeystoneAPI)
+    barbican_api = lazy.LazyAPI(barbican.BarbicanAPI)
 
     def handle(self, request, data):
         sw_package = self.initial['sw_package']
@@ -62,9 +65,10 @@ class EditSoftwareTest(forms.SelfHandlingForm):
         try:
             self.keystone_api.do_setup(self.request)
             self.barbican_api.do_setup(self.keystone_api.get_session())
-            self.barbican_api.update_software_test(node_type, sw_package,
-                                                   data['min_version'],
-                                                   data['description'])
+            store = result_store.get_result_store(self.barbican_api)
+            store.update_software_test(node_type, sw_package,
+                                       data['min_version'],
+                                       data['description'])
             msg = _('Saved softare package "%s".') % sw_package
             messages.success(request, msg)
             return True
@@ -19,11 +19,13 @@ from horizon import forms
 
 import horizon_hpe_storage.api.keystone_api as keystone
 import horizon_hpe_storage.api.barbican_api as barbican
+from horizon_hpe_storage.api.common import lazy
+import horizon_hpe_storage.api.result_store as result_store
 
 
 class SoftwareTestDelete(tables.DeleteAction):
-    keystone_api = keystone.KeystoneAPI()
-    barbican_api = barbican.BarbicanAPI()
+    keystone_api = lazy.LazyAPI(keystone.KeystoneAPI)
+    barbican_api = lazy.LazyAPI(barbican.BarbicanAPI)
 
     @staticmethod
     def action_present(count):
@@ -45,7 +47,8 @@ class SoftwareTestDelete(tables.DeleteAction):
         self.keystone_api.do_setup(request)
         self.barbican_api.do_setup(self.keystone_api.get_session())
         node_type = self.table.kwargs['node_type']
-        self.barbican_api.delete_software_test(node_type, obj_id)
+        store = result_store.get_result_store(self.barbican_api)
+        store.delete_software_test(node_type, obj_id)
 
 
 class SoftwareTestCreate(tables.LinkAction):
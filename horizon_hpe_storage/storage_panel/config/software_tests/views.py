@@ -20,6 +20,8 @@ from horizon import tables
 
 import horizon_hpe_storage.api.keystone_api as keystone
 import horizon_hpe_storage.api.barbican_api as barbican
+from horizon_hpe_storage.api.common import lazy
+import horizon_hpe_storage.api.result_store as result_store
 
 from horizon_hpe_storage.storage_panel.config.software_tests \
     import forms as sw_forms
@@ -39,8 +41,8 @@ class SoftwareTestMixin(object):
 class IndexView(SoftwareTestMixin, forms.ModalFormMixin, tables.DataTableView):
     table_class = sw_tables.SoftwareTestsTable
     template_name = 'config/software_tests/index.html'
-    keystone_api = keystone.KeystoneAPI()
-    barbican_api = barbican.BarbicanAPI()
+    keystone_api = lazy.LazyAPI(keystone.KeystoneAPI)
+    barbican_api = lazy.LazyAPI(barbican.BarbicanAPI)
 
     def get_data(self):
         try:
@@ -48,7 +50,8 @@ class IndexView(SoftwareTestMixin, forms.ModalFormMixin, tables.DataTableView):
             software_list = []
             self.keystone_api.do_setup(self.request)
             self.barbican_api.do_setup(self.keystone_api.get_session())
-            software_list = self.barbican_api.get_software_tests(node_type)
+            store = result_store.get_result_store(self.barbican_api)
+            software_list = store.get_software_tests(node_type)
         except Exception:
             exceptions.handle(self.request,
                               _('Unable to retrieve softare list.'))
@@ -89,8 +92,8 @@ class EditView(SoftwareTestMixin, forms.ModalFormView):
     submit_url = "horizon:admin:hpe_storage:config:software_tests:edit"
     template_name = 'config/software_tests/edit.html'
     success_url = 'horizon:admin:hpe_storage:config:software_tests:index'
-    keystone_api = keystone.KeystoneAPI()
-    barbican_api = barbican.BarbicanAPI()
+    keystone_api = lazy.LazyAPI(keystone.KeystoneAPI)
+    barbican_api = lazy.LazyAPI(barbican.BarbicanAPI)
 
     def get_success_url(self):
         return reverse(self.success_url,
@@ -104,7 +107,8 @@ class EditView(SoftwareTestMixin, forms.ModalFormView):
         try:
             self.keystone_api.do_setup(self.request)
             self.barbican_api.do_setup(self.keystone_api.get_session())
-            tests = self.barbican_api.get_software_tests(node_type)
+            store = result_store.get_result_store(self.barbican_api)
+            tests = store.get_software_tests(node_type)
             for test in tests:
                 if test['package'] == package:
                     min_version = test['min_version']
@@ -24,6 +24,7 @@ from horizon import tables
 
 import horizon_hpe_storage.api.keystone_api as keystone
 import horizon_hpe_storage.api.barbican_api as barbican
+from horizon_hpe_storage.api.common import lazy
 
 
 class CreateEndpointAction(tables.LinkAction):
@@ -47,8 +48,8 @@ class EditEndpointAction(tables.LinkAction):
 class DeleteEndpointAction(tables.DeleteAction):
     name = "delete_endpoint"
     policy_rules = (("volume", "volume:deep_link"),)
-    keystone_api = keystone.KeystoneAPI()
-    barbican_api = barbican.BarbicanAPI()
+    keystone_api = lazy.LazyAPI(keystone.KeystoneAPI)
+    barbican_api = lazy.LazyAPI(barbican.BarbicanAPI)
 
     @staticmethod
     def action_present(count):
@@ -122,8 +123,8 @@ class RegisterCinderAction(tables.LinkAction):
 
 class DeleteCinderAction(tables.DeleteAction):
     name = "cinder_delete"
-    keystone_api = keystone.KeystoneAPI()
-    barbican_api = barbican.BarbicanAPI()
+    keystone_api = lazy.LazyAPI(keystone.KeystoneAPI)
+    barbican_api = lazy.LazyAPI(barbican.BarbicanAPI)
 
     @staticmethod
     def action_present(count):
@@ -159,8 +160,8 @@ class ValidateAllCinderAction(tables.LinkAction):
     verbose_name = _("Validate SSH Credentials on All Cinder Nodes")
     url = "horizon:admin:hpe_storage:config:validate_all_cinder_nodes"
     classes = ("ajax-modal",)
-    keystone_api = keystone.KeystoneAPI()
-    barbican_api = barbican.BarbicanAPI()
+    keystone_api = lazy.LazyAPI(keystone.KeystoneAPI)
+    barbican_api = lazy.LazyAPI(barbican.BarbicanAPI)
 
     def allowed(self, request, node=None):
         self.keystone_api.do_setup(request)
@@ -262,8 +263,8 @@ class RegisterNovaAction(tables.LinkAction):
 
 class DeleteNovaAction(tables.DeleteAction):
     name = "nova_delete"
-    keystone_api = keystone.KeystoneAPI()
-    barbican_api = barbican.BarbicanAPI()
+    keystone_api = lazy.LazyAPI(keystone.KeystoneAPI)
+    barbican_api = lazy.LazyAPI(barbican.BarbicanAPI)
 
     @staticmethod
     def action_present(count):
@@ -303,8 +304,8 @@ class ValidateAllNovaAction(tables.LinkAction):
     verbose_name = _("Validate SSH Credentials on All Nova Nodes")
     url = "horizon:admin:hpe_storage:config:validate_all_nova_nodes"
     classes = ("ajax-modal",)
-    keystone_api = keystone.KeystoneAPI()
-    barbican_api = barbican.BarbicanAPI()
+    keystone_api = lazy.LazyAPI(keystone.KeystoneAPI)
+    barbican_api = lazy.LazyAPI(barbican.BarbicanAPI)
 
     def allowed(self, request, node=None):
         self.keystone_api.do_setup(request)
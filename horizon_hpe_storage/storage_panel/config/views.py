@@ -37,6 +37,7 @@ from urlparse import urlparse
 import horizon_hpe_storage.api.hp_ssmc_api as hpssmc
 import horizon_hpe_storage.api.keystone_api as keystone
 import horizon_hpe_storage.api.barbican_api as barbican
+from horizon_hpe_storage.api.common import lazy
 
 
 import logging
@@ -92,8 +93,8 @@ class BaseLinkView(forms.ModalFormView):
     success_url = 'horizon:admin:volumes:volumes_tab'
     page_title = _("Linking to SSMC...")
     host = None
-    keystone_api = keystone.KeystoneAPI()
-    barbican_api = barbican.BarbicanAPI()
+    keystone_api = lazy.LazyAPI(keystone.KeystoneAPI)
+    barbican_api = lazy.LazyAPI(barbican.BarbicanAPI)
     ssmc_api = None
 
     tokens = {}
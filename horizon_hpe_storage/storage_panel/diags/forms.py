@@ -28,12 +28,82 @@ import json
 
 import horizon_hpe_storage.api.keystone_api as keystone
 import horizon_hpe_storage.api.barbican_api as barbican
+from horizon_hpe_storage.api.common import lazy
+import horizon_hpe_storage.api.result_store as result_store
+import horizon_hpe_storage.test_engine.fingerprint as fingerprinter
 import horizon_hpe_storage.test_engine.node_test as tester
 
 from openstack_dashboard.api import cinder
 
 
-def run_cinder_node_test(node, software_tests, barbican_api):
+def get_config_fingerprint(node, software_tests, node_test):
+    # a timeout or cancel stops the node's test, like any other check
+    try:
+        return fingerprinter.get_config_fingerprint(node, software_tests,
+                                                    node_test)
+    except (tester.NodeTestTimeout, tester.NodeTestCancelled):
+        raise
+    except Exception as ex:
+        LOG.info("Unable to get config fingerprint for %s - %s" %
+                 (node['node_name'], ex))
+        return None
+
+
+def set_node_status(node, node_type, barbican_api, status):
+    # test results go to the result store, leaving the node's credentials
+    # and config as they are
+    store = result_store.get_result_store(barbican_api)
+    store.set_node_status(node_type, node['node_name'], status)
+
+
+def reuse_cinder_node_test(node, fingerprint, barbican_api):
+    # if the config fingerprint matches the one from the last run, the
+    # previous test results still hold, so keep them
+    if not fingerprint or \
+            fingerprint != node.get('config_fingerprint') or \
+            'diag_test_status' not in node:
+        return False
+
+    LOG.info("Config unchanged for %s, keeping previous test results" %
+             node['node_name'])
+    cur_time = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    set_node_status(node, barbican.CINDER_NODE_TYPE, barbican_api, {
+        'diag_test_status': node['diag_test_status'],
+        'software_test_status': node.get('software_test_status'),
+        'diag_run_time': cur_time,
+        'validation_time': cur_time,
+        'config_fingerprint': fingerprint})
+    return True
+
+
+def record_failed_node_test(node, node_type, barbican_api):
+    # node could not be tested (cinderdiags timed out), so mark it failed
+    cur_time = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    set_node_status(node, node_type, barbican_api, {
+        'diag_run_time': cur_time,
+        'validation_time': "Failed"})
+
+
+def run_cinder_node_test(node, software_tests, barbican_api, force=False,
+                         node_test=None):
+    # a timeout fails just this node, so callers can carry on with the
+    # rest; pass in node_test to be able to cancel the run
+    try:
+        _run_cinder_node_test(node, software_tests, barbican_api, force,
+                              node_test or tester.get_node_test())
+    except tester.NodeTestTimeout as ex:
+        LOG.info("%s: %s" % (node['node_name'], ex))
+        record_failed_node_test(node, barbican.CINDER_NODE_TYPE,
+                                barbican_api)
+
+
+def _run_cinder_node_test(node, software_tests, barbican_api, force,
+                          node_test):
+    fingerprint = get_config_fingerprint(node, software_tests, node_test)
+    if not force and \
+            reuse_cinder_node_test(node, fingerprint, barbican_api):
+        return
+
     credentials_data = {}
     all_data = []
 
@@ -51,7 +121,6 @@ def run_cinder_node_test(node, software_tests, barbican_api):
     json_conf_data = json.dumps(all_data)
 
     # run ssh validation check on cinder node
-    node_test = tester.NodeTest()
     node_test.run_credentials_check_test(json_conf_data)
 
     cur_time = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
@@ -60,51 +129,34 @@ def run_cinder_node_test(node, software_tests, barbican_api):
         LOG.info(("%s") % node_test.error_text)
 
         # update test data
-        barbican_api.delete_node(
-            node['node_name'],
-            barbican.CINDER_NODE_TYPE)
-
         result = "Failed"
-        barbican_api.add_node(
-            node['node_name'],
-            barbican.CINDER_NODE_TYPE,
-            node['node_ip'],
-            node['host_name'],
-            node['ssh_name'],
-            node['ssh_pwd'],
-            # node['test_replication'],
-            config_path=node['config_path'],
-            diag_run_time=cur_time,
-            ssh_validation_time="Failed")
+        set_node_status(node, barbican.CINDER_NODE_TYPE, barbican_api, {
+            'diag_run_time': cur_time,
+            'validation_time': result})
 
         # no need to continue
         return
 
-    # run diag test on cinder node
-    node_test.run_options_check_test(json_conf_data)
-
+    # run diag test on cinder node, handling each backend section as
+    # soon as cinderdiags reports it
     config_status = ''
     LOG.info("Process test results - start options results")
-    if node_test.test_result_text:
-        json_string = node_test.test_result_text
-        LOG.info("options:json results - %s" % json_string)
-        parsed_json = json.loads(json_string)
-        LOG.info("options:parsed_json results - %s" % parsed_json)
-        for section in parsed_json:
-            config_status += \
-                "Backend Section:" + section['Backend Section'] + "::" + \
-                "cpg:" + section['CPG'] + "::" + \
-                "credentials: " + section['Credentials'] + "::" + \
-                "driver:" + section['Driver'] + "::" + \
-                "wsapi:" + section['WS API'] + "::" + \
-                "iscsi:" + section['iSCSI IP(s)'] + "::"
-            if 'Replication Device' in section:
-                config_status += \
-                    "replication:" + section['Replication Device'] + "::"
+    for section in node_test.iter_options_check_test(json_conf_data):
+        LOG.info("options:parsed_json section - %s" % section)
+        config_status += \
+            "Backend Section:" + section['Backend Section'] + "::" + \
+            "cpg:" + section['CPG'] + "::" + \
+            "credentials: " + section['Credentials'] + "::" + \
+            "driver:" + section['Driver'] + "::" + \
+            "wsapi:" + section['WS API'] + "::" + \
+            "iscsi:" + section['iSCSI IP(s)'] + "::"
+        if 'Replication Device' in section:
             config_status += \
-                "system_info:" + section['System Info'] + "::" + \
-                "config_items:" + section['Conf Items']
-            LOG.info("options:config_status - %s" % config_status)
+                "replication:" + section['Replication Device'] + "::"
+        config_status += \
+            "system_info:" + section['System Info'] + "::" + \
+            "config_items:" + section['Conf Items']
+        LOG.info("options:config_status - %s" % config_status)
 
     # build list of software to test against
     all_data = []
@@ -115,45 +167,40 @@ def run_cinder_node_test(node, software_tests, barbican_api):
     json_sw_test_data = json.dumps(all_data)
 
     # run software test on cinder node
-    node_test.run_software_check_test(json_conf_data, json_sw_test_data)
-
     software_status = ''
     LOG.info("Process test results - start software results")
-    if node_test.test_result_text:
-        json_string = node_test.test_result_text
-        LOG.info("software:json results - %s" % json_string)
-        parsed_json = json.loads(json_string)
-        LOG.info("software:parsed_json results - %s" % parsed_json)
-        for section in parsed_json:
-            software_pkg = "Software Test:package:"
-            software_pkg += section['Software']
-            software_status += \
-                software_pkg + "::" + \
-                "installed:" + section['Installed'] + "::" + \
-                "version:" + section['Version'] + "::"
-            LOG.info("software:software_status - %s" % software_status)
+    for section in node_test.iter_software_check_test(json_conf_data,
+                                                      json_sw_test_data):
+        LOG.info("software:parsed_json section - %s" % section)
+        software_pkg = "Software Test:package:"
+        software_pkg += section['Software']
+        software_status += \
+            software_pkg + "::" + \
+            "installed:" + section['Installed'] + "::" + \
+            "version:" + section['Version'] + "::"
+        LOG.info("software:software_status - %s" % software_status)
 
     # update test data
-    barbican_api.delete_node(
-        node['node_name'],
-        barbican.CINDER_NODE_TYPE)
-
-    barbican_api.add_node(
-        node['node_name'],
-        barbican.CINDER_NODE_TYPE,
-        node['node_ip'],
-        node['host_name'],
-        node['ssh_name'],
-        node['ssh_pwd'],
-        # node['test_replication'],
-        config_path=node['config_path'],
-        diag_status=config_status,
-        software_status=software_status,
-        diag_run_time=cur_time,
-        ssh_validation_time=cur_time)
-
-
-def run_nova_node_test(node, software_tests, barbican_api):
+    set_node_status(node, barbican.CINDER_NODE_TYPE, barbican_api, {
+        'diag_test_status': config_status,
+        'software_test_status': software_status,
+        'diag_run_time': cur_time,
+        'validation_time': cur_time,
+        'config_fingerprint': fingerprint})
+
+
+def run_nova_node_test(node, software_tests, barbican_api,
+                       node_test=None):
+    try:
+        _run_nova_node_test(node, software_tests, barbican_api,
+                            node_test or tester.get_node_test())
+    except tester.NodeTestTimeout as ex:
+        LOG.info("%s: %s" % (node['node_name'], ex))
+        record_failed_node_test(node, barbican.NOVA_NODE_TYPE,
+                                barbican_api)
+
+
+def _run_nova_node_test(node, software_tests, barbican_api, node_test):
     credentials_data = {}
     all_data = []
 
@@ -170,7 +217,6 @@ def run_nova_node_test(node, software_tests, barbican_api):
     json_conf_data = json.dumps(all_data)
 
     # run ssh validation check on cinder node
-    node_test = tester.NodeTest()
     node_test.run_credentials_check_test(json_conf_data)
 
     cur_time = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
@@ -179,20 +225,10 @@ def run_nova_node_test(node, software_tests, barbican_api):
         LOG.info(("%s") % node_test.error_text)
 
         # update test data
-        barbican_api.delete_node(
-            node['node_name'],
-            barbican.NOVA_NODE_TYPE)
-
         result = "Failed"
-        barbican_api.add_node(
-            node['node_name'],
-            barbican.NOVA_NODE_TYPE,
-            node['node_ip'],
-            node['host_name'],
-            node['ssh_name'],
-            node['ssh_pwd'],
-            diag_run_time=cur_time,
-            ssh_validation_time="Failed")
+        set_node_status(node, barbican.NOVA_NODE_TYPE, barbican_api, {
+            'diag_run_time': cur_time,
+            'validation_time': result})
 
         # no need to continue
         return
@@ -206,39 +242,24 @@ def run_nova_node_test(node, software_tests, barbican_api):
     json_sw_test_data = json.dumps(all_data)
 
     # run software test on nova node
-    node_test.run_software_check_test(json_conf_data, json_sw_test_data)
-
     software_status = ''
     LOG.info("Process test results - start software results")
-    if node_test.test_result_text:
-        json_string = node_test.test_result_text
-        LOG.info("software:json results - %s" % json_string)
-        parsed_json = json.loads(json_string)
-        LOG.info("software:parsed_json results - %s" % parsed_json)
-        for section in parsed_json:
-            software_pkg = "Software Test:package:"
-            software_pkg += section['Software']
-            software_status += \
-                software_pkg + "::" + \
-                "installed:" + section['Installed'] + "::" + \
-                "version:" + section['Version'] + "::"
-            LOG.info("software:software_status - %s" % software_status)
+    for section in node_test.iter_software_check_test(json_conf_data,
+                                                      json_sw_test_data):
+        LOG.info("software:parsed_json section - %s" % section)
+        software_pkg = "Software Test:package:"
+        software_pkg += section['Software']
+        software_status += \
+            software_pkg + "::" + \
+            "installed:" + section['Installed'] + "::" + \
+            "version:" + section['Version'] + "::"
+        LOG.info("software:software_status - %s" % software_status)
 
     # update test data
-    barbican_api.delete_node(
-        node['node_name'],
-        barbican.NOVA_NODE_TYPE)
-
-    barbican_api.add_node(
-        node['node_name'],
-        barbican.NOVA_NODE_TYPE,
-        node['node_ip'],
-        node['host_name'],
-        node['ssh_name'],
-        node['ssh_pwd'],
-        software_status=software_status,
-        diag_run_time=cur_time,
-        ssh_validation_time=cur_time)
+    set_node_status(node, barbican.NOVA_NODE_TYPE, barbican_api, {
+        'software_test_status': software_status,
+        'diag_run_time': cur_time,
+        'validation_time': cur_time})
 
 
 class DumpCinder(forms.SelfHandlingForm):
@@ -249,8 +270,8 @@ class DumpCinder(forms.SelfHandlingForm):
         widget=forms.Textarea(
             attrs={'rows': 10, 'readonly': 'readonly'}))
 
-    keystone_api = keystone.KeystoneAPI()
-    barbican_api = barbican.BarbicanAPI()
+    keystone_api = lazy.LazyAPI(keystone.KeystoneAPI)
+    barbican_api = lazy.LazyAPI(barbican.BarbicanAPI)
 
     def __init__(self, request, *args, **kwargs):
         super(DumpCinder, self).__init__(request, *args, **kwargs)
@@ -379,9 +400,16 @@ class TestCinder(forms.SelfHandlingForm):
         label=_("Cinder Node"),
         required=False,
         widget=forms.TextInput(attrs={'readonly': 'readonly'}))
+    force = forms.BooleanField(
+        label=_("Rerun all tests"),
+        help_text=_("Run the full diagnostic tests even if the cinder "
+                    "configuration and installed software have not "
+                    "changed since the last run."),
+        required=False,
+        initial=False)
 
-    keystone_api = keystone.KeystoneAPI()
-    barbican_api = barbican.BarbicanAPI()
+    keystone_api = lazy.LazyAPI(keystone.KeystoneAPI)
+    barbican_api = lazy.LazyAPI(barbican.BarbicanAPI)
     node = None
 
     def __init__(self, request, *args, **kwargs):
@@ -406,10 +434,12 @@ class TestCinder(forms.SelfHandlingForm):
             self.barbican_api.do_setup(self.keystone_api.get_session())
 
             # pass along the current set of software tests
-            sw_tests = self.barbican_api.get_software_tests(
+            store = result_store.get_result_store(self.barbican_api)
+            sw_tests = store.get_software_tests(
                 barbican.CINDER_NODE_TYPE)
 
-            run_cinder_node_test(self.node, sw_tests, self.barbican_api)
+            run_cinder_node_test(self.node, sw_tests, self.barbican_api,
+                                 force=data.get('force'))
             messages.success(request, _('Successfully ran diagnostic test'))
             return True
         except Exception as ex:
@@ -427,9 +457,16 @@ class TestAllCinder(forms.SelfHandlingForm):
         required=False,
         widget=forms.Textarea(
             attrs={'rows': 6, 'readonly': 'readonly'}))
+    force = forms.BooleanField(
+        label=_("Rerun all tests"),
+        help_text=_("Run the full diagnostic tests even if the cinder "
+                    "configuration and installed software have not "
+                    "changed since the last run."),
+        required=False,
+        initial=False)
 
-    keystone_api = keystone.KeystoneAPI()
-    barbican_api = barbican.BarbicanAPI()
+    keystone_api = lazy.LazyAPI(keystone.KeystoneAPI)
+    barbican_api = lazy.LazyAPI(barbican.BarbicanAPI)
     nodes = None
 
     def __init__(self, request, *args, **kwargs):
@@ -461,11 +498,13 @@ class TestAllCinder(forms.SelfHandlingForm):
             self.barbican_api.do_setup(self.keystone_api.get_session())
 
             # pass along the current set of software tests
-            sw_tests = self.barbican_api.get_software_tests(
+            store = result_store.get_result_store(self.barbican_api)
+            sw_tests = store.get_software_tests(
                 barbican.CINDER_NODE_TYPE)
 
             for node in self.nodes:
-                run_cinder_node_test(node, sw_tests, self.barbican_api)
+                run_cinder_node_test(node, sw_tests, self.barbican_api,
+                                     force=data.get('force'))
 
             messages.success(
                 request,
@@ -486,8 +525,8 @@ class TestNova(forms.SelfHandlingForm):
         required=False,
         widget=forms.TextInput(attrs={'readonly': 'readonly'}))
 
-    keystone_api = keystone.KeystoneAPI()
-    barbican_api = barbican.BarbicanAPI()
+    keystone_api = lazy.LazyAPI(keystone.KeystoneAPI)
+    barbican_api = lazy.LazyAPI(barbican.BarbicanAPI)
     node = None
 
     def __init__(self, request, *args, **kwargs):
@@ -512,7 +551,8 @@ class TestNova(forms.SelfHandlingForm):
             self.barbican_api.do_setup(self.keystone_api.get_session())
 
             # pass along the current set of software tests
-            sw_tests = self.barbican_api.get_software_tests(
+            store = result_store.get_result_store(self.barbican_api)
+            sw_tests = store.get_software_tests(
                 barbican.NOVA_NODE_TYPE)
 
             run_nova_node_test(self.node, sw_tests, self.barbican_api)
@@ -534,8 +574,8 @@ class TestAllNova(forms.SelfHandlingForm):
         widget=forms.Textarea(
             attrs={'rows': 6, 'readonly': 'readonly'}))
 
-    keystone_api = keystone.KeystoneAPI()
-    barbican_api = barbican.BarbicanAPI()
+    keystone_api = lazy.LazyAPI(keystone.KeystoneAPI)
+    barbican_api = lazy.LazyAPI(barbican.BarbicanAPI)
     nodes = None
 
     def __init__(self, request, *args, **kwargs):
@@ -567,7 +607,8 @@ class TestAllNova(forms.SelfHandlingForm):
             self.barbican_api.do_setup(self.keystone_api.get_session())
 
             # pass along the current set of software tests
-            sw_tests = self.barbican_api.get_software_tests(
+            store = result_store.get_result_store(self.barbican_api)
+            sw_tests = store.get_software_tests(
                 barbican.NOVA_NODE_TYPE)
 
             for node in self.nodes:
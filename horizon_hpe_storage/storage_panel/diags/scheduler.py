@@ -0,0 +1,201 @@
+
+# (c) Copyright [2015] Hewlett Packard Enterprise Development LP
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+from django.conf import settings
+from django.core.cache import cache
+
+import datetime
+import logging
+import random
+import threading
+import time
+import uuid
+
+import horizon_hpe_storage.api.barbican_api as barbican
+import horizon_hpe_storage.api.result_store as result_store
+import horizon_hpe_storage.test_engine.node_test as tester
+from horizon_hpe_storage.storage_panel.diags import forms as diag_forms
+
+LOG = logging.getLogger(__name__)
+
+# default seconds between diagnostic sweeps of all registered nodes, for
+# the run_hpe_storage_diag_schedule command
+INTERVAL = getattr(settings, 'HPE_STORAGE_DIAG_SCHEDULE_INTERVAL', None)
+# seconds over which the node tests of one sweep are spread out
+WINDOW = getattr(settings, 'HPE_STORAGE_DIAG_SCHEDULE_WINDOW', 1800)
+# random delay added to each node's start, as a fraction of its time slot
+JITTER = getattr(settings, 'HPE_STORAGE_DIAG_SCHEDULE_JITTER', 0.5)
+# how often each scheduler checks whether a sweep is due, and extends the
+# lock while its sweep runs
+POLL_INTERVAL = 60
+
+# the lock only elects a single leader across schedulers, and the stats
+# only reach the panel, when the Django cache is shared between them and
+# Horizon (e.g. memcached)
+LOCK_KEY = 'hpe_storage:diag_schedule:lock'
+STATS_KEY = 'hpe_storage:diag_schedule:stats'
+
+
+class DiagScheduler(threading.Thread):
+    """Periodically runs the diagnostic tests on every node.
+
+    Runs in the run_hpe_storage_diag_schedule command, with a keystone
+    session for the service credentials it was given. More than one can
+    be run, but a sweep is only started by the scheduler that takes the
+    shared cache lock for the current interval. If the sweep runs into
+    the next intervals, it takes their locks too until it ends. The node
+    tests in a sweep are staggered across the window so that nodes are
+    not all connected to at once.
+    """
+
+    def __init__(self, interval, keystone_session, window=WINDOW,
+                 jitter=JITTER):
+        super(DiagScheduler, self).__init__(name='hpe-storage-diag-schedule')
+        self.daemon = True
+        self.interval = interval
+        self.window = min(window, interval)
+        self.jitter = jitter
+        self.worker_id = uuid.uuid4().hex
+        self.keystone_session = keystone_session
+        self.barbican_api = barbican.BarbicanAPI()
+        self.node_test = None
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+        # also stop the node test that is running, if any
+        node_test = self.node_test
+        if node_test:
+            node_test.cancel()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            lock_key = self.get_lock_key(
+                self.get_interval_number(time.time()))
+            if cache.add(lock_key, self.worker_id, self.lock_timeout):
+                sweep_done = threading.Event()
+                renewer = threading.Thread(
+                    target=self.hold_lock, args=(lock_key, sweep_done),
+                    name='hpe-storage-diag-schedule-lock')
+                renewer.daemon = True
+                renewer.start()
+                try:
+                    self.sweep()
+                except Exception as ex:
+                    LOG.exception("diag schedule: sweep failed - %s" % ex)
+                finally:
+                    sweep_done.set()
+            self._stop_event.wait(min(POLL_INTERVAL, self.interval))
+
+    @property
+    def lock_timeout(self):
+        # long enough that a lock outlives the interval it is for
+        return int(2 * self.interval + POLL_INTERVAL)
+
+    def get_interval_number(self, when):
+        return int(when // self.interval)
+
+    def get_lock_key(self, number):
+        # each interval has its own lock, so locks are only ever taken
+        # with cache.add, which is atomic, and never overwritten
+        return '%s:%d' % (LOCK_KEY, number)
+
+    def hold_lock(self, lock_key, sweep_done):
+        # a sweep can outlast the interval its lock was taken for, so take
+        # the locks of the intervals it runs into before they start
+        lock_keys = [lock_key]
+        try:
+            while not sweep_done.wait(POLL_INTERVAL):
+                now = time.time()
+                for number in range(
+                        self.get_interval_number(now),
+                        self.get_interval_number(now + 2 * POLL_INTERVAL) +
+                        1):
+                    key = self.get_lock_key(number)
+                    if key in lock_keys:
+                        continue
+                    if not cache.add(key, self.worker_id,
+                                     self.lock_timeout):
+                        LOG.warning("diag schedule: lost the sweep lock")
+                        return
+                    lock_keys.append(key)
+        finally:
+            # the next sweep can start as soon as this one ends
+            for key in lock_keys[1:]:
+                cache.delete(key)
+
+    def get_node_tests(self):
+        self.barbican_api.do_setup(self.keystone_session)
+        node_tests = []
+        for node_type, test in (
+                (barbican.CINDER_NODE_TYPE, diag_forms.run_cinder_node_test),
+                (barbican.NOVA_NODE_TYPE, diag_forms.run_nova_node_test)):
+            store = result_store.get_result_store(self.barbican_api)
+            sw_tests = store.get_software_tests(node_type)
+            for node in self.barbican_api.get_all_nodes(node_type):
+                node_tests.append((test, node, sw_tests))
+        return node_tests
+
+    def sweep(self):
+        sweep_start = time.time()
+        node_tests = self.get_node_tests()
+        LOG.info("diag schedule: starting sweep of %d nodes" %
+                 len(node_tests))
+
+        durations = []
+        failures = 0
+        slot = float(self.window) / max(len(node_tests), 1)
+        for idx, (test, node, sw_tests) in enumerate(node_tests):
+            start_at = sweep_start + idx * slot + \
+                random.uniform(0, slot * self.jitter)
+            if self._stop_event.wait(max(start_at - time.time(), 0)):
+                return
+
+            node_start = time.time()
+            self.node_test = tester.get_node_test()
+            try:
+                test(node, sw_tests, self.barbican_api,
+                     node_test=self.node_test)
+            except tester.NodeTestCancelled:
+                return
+            except Exception as ex:
+                failures += 1
+                LOG.info("diag schedule: test of %s failed - %s" %
+                         (node['node_name'], ex))
+            finally:
+                self.node_test = None
+            durations.append(time.time() - node_start)
+
+        self.record_stats(sweep_start, durations, failures)
+
+    def record_stats(self, sweep_start, durations, failures):
+        stats = get_stats() or {}
+        stats['sweeps'] = stats.get('sweeps', 0) + 1
+        stats['last_sweep'] = datetime.datetime.fromtimestamp(
+            sweep_start).strftime('%Y-%m-%d %H:%M:%S')
+        stats['last_duration'] = time.time() - sweep_start
+        stats['num_nodes'] = len(durations)
+        stats['num_failed'] = failures
+        if durations:
+            stats['node_min'] = min(durations)
+            stats['node_max'] = max(durations)
+            stats['node_mean'] = sum(durations) / len(durations)
+        stats['worker'] = self.worker_id
+        cache.set(STATS_KEY, stats, None)
+        LOG.info("diag schedule: sweep of %d nodes took %.1f seconds" %
+                 (stats['num_nodes'], stats['last_duration']))
+
+
+def get_stats():
+    return cache.get(STATS_KEY)
@@ -23,6 +23,7 @@ from horizon import tables
 
 import horizon_hpe_storage.api.keystone_api as keystone
 import horizon_hpe_storage.api.barbican_api as barbican
+from horizon_hpe_storage.api.common import lazy
 
 
 class RunTimeColumn(tables.Column):
@@ -79,8 +80,8 @@ class RunAllCinderDiagsAction(tables.LinkAction):
     verbose_name = _("Run Diagnostics Test on All Cinder Nodes")
     url = "horizon:admin:hpe_storage:diags:test_all_cinder_nodes"
     classes = ("ajax-modal",)
-    keystone_api = keystone.KeystoneAPI()
-    barbican_api = barbican.BarbicanAPI()
+    keystone_api = lazy.LazyAPI(keystone.KeystoneAPI)
+    barbican_api = lazy.LazyAPI(barbican.BarbicanAPI)
 
     def allowed(self, request, node=None):
         self.keystone_api.do_setup(request)
@@ -131,8 +132,8 @@ class RunAllNovaDiagsAction(tables.LinkAction):
     verbose_name = _("Run Diagnostics Test on All Nova Nodes")
     url = "horizon:admin:hpe_storage:diags:test_all_nova_nodes"
     classes = ("ajax-modal",)
-    keystone_api = keystone.KeystoneAPI()
-    barbican_api = barbican.BarbicanAPI()
+    keystone_api = lazy.LazyAPI(keystone.KeystoneAPI)
+    barbican_api = lazy.LazyAPI(barbican.BarbicanAPI)
 
     def allowed(self, request, node=None):
         self.keystone_api.do_setup(request)
@@ -30,6 +30,8 @@ from horizon_hpe_storage.storage_panel.diags import tabs as diags_tabs
 
 import horizon_hpe_storage.api.keystone_api as keystone
 import horizon_hpe_storage.api.barbican_api as barbican
+from horizon_hpe_storage.api.common import lazy
+import horizon_hpe_storage.api.result_store as result_store
 
 from openstack_dashboard.api import cinder
 
@@ -95,8 +97,8 @@ class CinderTestDetailView(tabs.TabView):
     tab_group_class = diags_tabs.CinderTestDetailTabs
     template_name = 'horizon/common/_detail.html'
     page_title = "{{ test.test_name }}"
-    keystone_api = keystone.KeystoneAPI()
-    barbican_api = barbican.BarbicanAPI()
+    keystone_api = lazy.LazyAPI(keystone.KeystoneAPI)
+    barbican_api = lazy.LazyAPI(barbican.BarbicanAPI)
 
     def get_context_data(self, **kwargs):
         context = super(CinderTestDetailView, self).get_context_data(**kwargs)
@@ -491,8 +493,9 @@ class CinderTestDetailView(tabs.TabView):
     def format_sw_data(self, sw_tests):
         self.keystone_api.do_setup(self.request)
         self.barbican_api.do_setup(self.keystone_api.get_session())
+        store = result_store.get_result_store(self.barbican_api)
         software_list = \
-            self.barbican_api.get_software_tests(barbican.CINDER_NODE_TYPE)
+            store.get_software_tests(barbican.CINDER_NODE_TYPE)
         software_results = []
         for sw_test in sw_tests:
             entry = {}
@@ -527,8 +530,8 @@ class NovaTestDetailView(tabs.TabView):
     tab_group_class = diags_tabs.NovaTestDetailTabs
     template_name = 'horizon/common/_detail.html'
     page_title = "{{ test.test_name }}"
-    keystone_api = keystone.KeystoneAPI()
-    barbican_api = barbican.BarbicanAPI()
+    keystone_api = lazy.LazyAPI(keystone.KeystoneAPI)
+    barbican_api = lazy.LazyAPI(barbican.BarbicanAPI)
 
     def get_context_data(self, **kwargs):
         context = super(NovaTestDetailView, self).get_context_data(**kwargs)
@@ -623,8 +626,9 @@ class NovaTestDetailView(tabs.TabView):
     def format_sw_data(self, sw_tests):
         self.keystone_api.do_setup(self.request)
         self.barbican_api.do_setup(self.keystone_api.get_session())
+        store = result_store.get_result_store(self.barbican_api)
         software_list = \
-            self.barbican_api.get_software_tests(barbican.NOVA_NODE_TYPE)
+            store.get_software_tests(barbican.NOVA_NODE_TYPE)
         software_results = []
         for sw_test in sw_tests:
             entry = {}
@@ -19,6 +19,9 @@ from horizon import forms
 from horizon import tables
 from difflib import Differ
 
+from horizon_hpe_storage.storage_panel.lun_tool \
+    import volume_path_tables as v_tables
+
 
 class AddedNodesTable(tables.DataTable):
     node = tables.Column(
@@ -139,7 +142,7 @@ class NewPathColumn(tables.Column):
         return safestring.mark_safe(tt)
 
 
-class DiffTable(tables.DataTable):
+class DiffTable(v_tables.RowIndexPaginationMixin, tables.DataTable):
     diff = tables.Column(
         'diff',
         verbose_name=_('Change'),
@@ -155,6 +158,7 @@ class DiffTable(tables.DataTable):
         name = "diff_paths"
         verbose_name = _("Volume Path Changes")
         hidden_title = False
+        table_actions = (v_tables.PathsFilterAction,)
 
     def get_object_id(self, datum):
         return datum.get('id', id(datum))
@@ -0,0 +1,228 @@
+# (c) Copyright [2015] Hewlett Packard Enterprise Development LP
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+from django.utils import safestring
+
+import horizon_hpe_storage.api.result_store as result_store
+
+
+def _index_nodes(node_list):
+    nodes = {}
+    for node in node_list:
+        nodes.setdefault(node['node_name'], node)
+    return nodes
+
+
+def _index_paths(path_list):
+    paths = {}
+    for path in path_list:
+        paths.setdefault(path['path'], path)
+    return paths
+
+
+def find_new_nodes(old_node_list, new_node_list):
+    old_nodes = _index_nodes(old_node_list)
+    return [node for node in new_node_list
+            if node['node_name'] not in old_nodes]
+
+
+def find_new_paths(old_path_list, new_path_list):
+    old_paths = _index_paths(old_path_list)
+    return [path for path in new_path_list
+            if path['path'] not in old_paths]
+
+
+def find_changed_paths(node_name, old_path_list, new_path_list):
+    changed_paths = []
+    old_paths = _index_paths(old_path_list)
+    for path in new_path_list:
+        found_path_entry = old_paths.get(path['path'])
+        if found_path_entry:
+            if found_path_entry['vol_name'] != path['vol_name'] or \
+                    found_path_entry['vol_id'] != path['vol_id']:
+                changed_path = {}
+                changed_path['node_name'] = node_name
+                changed_path['new_path'] = path
+                changed_path['old_path'] = found_path_entry
+                changed_paths.append(changed_path)
+
+    return changed_paths
+
+
+def compute_diff(base_node_list, compare_node_list):
+    # fist check if any nova nodes have been added or removed
+    removed_nodes = find_new_nodes(compare_node_list, base_node_list)
+    added_nodes = find_new_nodes(base_node_list, compare_node_list)
+
+    # now check for added/removed/modified paths within each nova node
+    modified_paths = []
+    changed_paths = []
+    compare_nodes = _index_nodes(compare_node_list)
+    for base_node in base_node_list:
+        found_node = compare_nodes.get(base_node['node_name'])
+        if not found_node:
+            continue
+
+        added_paths = find_new_paths(base_node['paths'],
+                                     found_node['paths'])
+        removed_paths = find_new_paths(found_node['paths'],
+                                       base_node['paths'])
+        for removed_path in removed_paths:
+            entry = {}
+            entry['node_name'] = base_node['node_name']
+            entry['old_path'] = removed_path
+            entry['new_path'] = None
+            modified_paths.append(entry)
+        for added_path in added_paths:
+            entry = {}
+            entry['node_name'] = base_node['node_name']
+            entry['old_path'] = None
+            entry['new_path'] = added_path
+            modified_paths.append(entry)
+
+        changed_paths.extend(find_changed_paths(base_node['node_name'],
+                                                base_node['paths'],
+                                                found_node['paths']))
+
+    diff_data = {}
+    diff_data['removed_nodes'] = removed_nodes
+    diff_data['added_nodes'] = added_nodes
+    diff_data['modified_paths'] = modified_paths + changed_paths
+    return diff_data
+
+
+def get_diff(barbican_api, base_timestamp, compare_timestamp):
+    # use the cached diffs for these results if we have them
+    store = result_store.get_result_store(barbican_api)
+    diff_data = store.get_lun_tool_diffs(base_timestamp,
+                                         compare_timestamp)
+    if diff_data is None:
+        base_result = store.get_lun_tool_result(base_timestamp)
+        compare_result = store.get_lun_tool_result(compare_timestamp)
+        diff_data = compute_diff(base_result['node_list'],
+                                 compare_result['node_list'])
+        store.add_lun_tool_diffs(base_timestamp, compare_timestamp,
+                                 diff_data)
+    return diff_data
+
+
+def build_field(node_name, path, vol_name, vol_id):
+    path_str = \
+        "<b>Node:  </b>" + \
+        node_name + "  " + \
+        "<br>" + \
+        "<b>Vol Path:  </b>" + \
+        path + "  " + \
+        "<br>" + \
+        "<b>Vol Name:  </b>" + \
+        vol_name + "  " + \
+        "<br>" + \
+        "<b>Vol ID:  </b>" + \
+        vol_id + "  "
+    return safestring.mark_safe(path_str)
+
+
+def _add_raw_fields(path_entry, path):
+    # keep the plain values too, for sorting and filtering
+    path_entry['path'] = path['path']
+    path_entry['vol_name'] = path['vol_name']
+    path_entry['vol_id'] = path['vol_id']
+
+
+def get_diff_rows(diff):
+    path_list = []
+    added_list = []
+    removed_list = []
+    changed_list = []
+    id = 0
+
+    if diff and 'added_nodes' in diff:
+        added_nodes = diff['added_nodes']
+        for node in added_nodes:
+            for path in node['paths']:
+                path_entry = {}
+                path_entry['diff'] = "Node Added"
+                path_entry['node_name'] = node['node_name']
+                path_entry['old_path'] = "-"
+                path_entry['new_path'] = \
+                    build_field(node['node_name'],
+                                path['path'],
+                                path['vol_name'],
+                                path['vol_id'])
+                _add_raw_fields(path_entry, path)
+                path_entry['id'] = id
+                id += 1
+                added_list.append(path_entry)
+
+    if diff and 'removed_nodes' in diff:
+        removed_nodes = diff['removed_nodes']
+        for node in removed_nodes:
+            for path in node['paths']:
+                path_entry = {}
+                path_entry['diff'] = "Node Removed"
+                path_entry['node_name'] = node['node_name']
+                path_entry['old_path'] = \
+                    build_field(node['node_name'],
+                                path['path'],
+                                path['vol_name'],
+                                path['vol_id'])
+                path_entry['new_path'] = "-"
+                _add_raw_fields(path_entry, path)
+                path_entry['id'] = id
+                id += 1
+                removed_list.append(path_entry)
+
+    if diff and 'modified_paths' in diff:
+        modified_paths = diff['modified_paths']
+        for modified_path in modified_paths:
+            path_entry = {}
+            path_entry['diff'] = "Path Modified"
+            old_path = modified_path['old_path']
+            if old_path:
+                path_entry['old_path'] = \
+                    build_field(modified_path['node_name'],
+                                old_path['path'],
+                                old_path['vol_name'],
+                                old_path['vol_id'])
+                _add_raw_fields(path_entry, old_path)
+            else:
+                path_entry['diff'] = "Path Added"
+                path_entry['old_path'] = "-"
+
+            new_path = modified_path['new_path']
+            if new_path:
+                path_entry['new_path'] = \
+                    build_field(modified_path['node_name'],
+                                new_path['path'],
+                                new_path['vol_name'],
+                                new_path['vol_id'])
+                _add_raw_fields(path_entry, new_path)
+            else:
+                path_entry['diff'] = "Path Removed"
+                path_entry['new_path'] = "-"
+
+            path_entry['node_name'] = modified_path['node_name']
+            path_entry['id'] = id
+            id += 1
+            if path_entry['diff'] == "Path Added":
+                added_list.append(path_entry)
+            elif path_entry['diff'] == "Path Removed":
+                removed_list.append(path_entry)
+            else:
+                changed_list.append(path_entry)
+
+    path_list.extend(sorted(added_list, key=lambda k: k['node_name']))
+    path_list.extend(sorted(removed_list, key=lambda k: k['node_name']))
+    path_list.extend(sorted(changed_list, key=lambda k: k['node_name']))
+    return path_list
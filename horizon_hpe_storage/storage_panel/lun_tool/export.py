@@ -0,0 +1,108 @@
+# (c) Copyright [2015] Hewlett Packard Enterprise Development LP
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+import csv
+import json
+
+PATH_COLUMNS = ('node_name', 'path', 'vol_name', 'vol_id')
+DIFF_COLUMNS = ('change', 'node_name',
+                'old_path', 'old_vol_name', 'old_vol_id',
+                'new_path', 'new_vol_name', 'new_vol_id')
+
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+class _Echo(object):
+    # file-like object that hands back what the csv writer writes, so
+    # each row can be yielded as soon as it is formatted
+    def write(self, value):
+        return value
+
+
+def _encode(value):
+    if value is None:
+        return ''
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return str(value)
+
+
+def iter_csv(rows, columns):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow([_encode(row.get(column))
+                               for column in columns])
+
+
+def iter_ndjson(rows, columns):
+    for row in rows:
+        record = {}
+        for column in columns:
+            record[column] = row.get(column)
+        yield json.dumps(record) + '\n'
+
+
+FORMATTERS = {
+    'csv': iter_csv,
+    'ndjson': iter_ndjson,
+}
+
+
+def iter_path_rows(node_list):
+    for node in node_list:
+        for path in node['paths']:
+            row = {}
+            row['node_name'] = node['node_name']
+            row['path'] = path['path']
+            row['vol_name'] = path['vol_name']
+            row['vol_id'] = path['vol_id']
+            yield row
+
+
+def _diff_row(change, node_name, old_path, new_path):
+    row = {}
+    row['change'] = change
+    row['node_name'] = node_name
+    for prefix, path in (('old_', old_path), ('new_', new_path)):
+        if path:
+            row[prefix + 'path'] = path['path']
+            row[prefix + 'vol_name'] = path['vol_name']
+            row[prefix + 'vol_id'] = path['vol_id']
+    return row
+
+
+def iter_diff_rows(diff_data):
+    for node in diff_data.get('added_nodes', []):
+        for path in node['paths']:
+            yield _diff_row('Node Added', node['node_name'], None, path)
+
+    for node in diff_data.get('removed_nodes', []):
+        for path in node['paths']:
+            yield _diff_row('Node Removed', node['node_name'], path, None)
+
+    for modified_path in diff_data.get('modified_paths', []):
+        old_path = modified_path['old_path']
+        new_path = modified_path['new_path']
+        if not old_path:
+            change = 'Path Added'
+        elif not new_path:
+            change = 'Path Removed'
+        else:
+            change = 'Path Modified'
+        yield _diff_row(change, modified_path['node_name'],
+                        old_path, new_path)
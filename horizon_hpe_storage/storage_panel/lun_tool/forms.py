@@ -29,10 +29,81 @@ LOG = logging.getLogger(__name__)
 
 import horizon_hpe_storage.api.keystone_api as keystone
 import horizon_hpe_storage.api.barbican_api as barbican
+from horizon_hpe_storage.api.common import lazy
+import horizon_hpe_storage.api.result_store as result_store
 import horizon_hpe_storage.test_engine.node_test as tester
+from horizon_hpe_storage.storage_panel.lun_tool import diffs as lun_tool_diffs
+from horizon_hpe_storage.storage_panel.lun_tool import path_index
 from horizon.utils import validators
 
 from openstack_dashboard.api import cinder
+from openstack_dashboard.api import nova
+
+
+def get_short_host_name(host):
+    return host.split('.')[0].lower()
+
+
+def get_compute_hosts(request, servers):
+    # the compute hosts nova knows of, so a node whose host has nothing
+    # attached can be told apart from one whose host name doesn't match
+    hosts = set()
+    try:
+        for hypervisor in nova.hypervisor_list(request):
+            hosts.add(get_short_host_name(hypervisor.hypervisor_hostname))
+            service_host = getattr(hypervisor, 'service', {}).get('host')
+            if service_host:
+                hosts.add(get_short_host_name(service_host))
+    except Exception as ex:
+        LOG.info("lun tool: unable to list hypervisors - %s" % ex)
+    for server in servers:
+        host = getattr(server, 'OS-EXT-SRV-ATTR:host', None)
+        if host:
+            hosts.add(get_short_host_name(host))
+    return hosts
+
+
+def get_attached_volumes_by_host(request, volumes):
+    """Maps each attached volume to the compute host(s) it is attached to.
+
+    Uses the host recorded in the attachment, or the host of the server
+    it is attached to. Returns the volumes of each host, the volumes
+    whose host is unknown, and every compute host nova knows of.
+    """
+    servers, has_more = nova.server_list(request,
+                                         search_opts={'all_tenants': True})
+    server_hosts = {}
+    for server in servers:
+        server_hosts[server.id] = \
+            getattr(server, 'OS-EXT-SRV-ATTR:host', None)
+
+    host_vols = {}
+    unknown_host_vols = []
+    for volume in volumes:
+        # only process volumes that are attached
+        if not volume.attachments:
+            continue
+
+        vol_entry = (volume.name, volume.id)
+        hosts = set()
+        for attachment in volume.attachments:
+            host = attachment.get('host_name')
+            if not host:
+                host = server_hosts.get(attachment.get('server_id'))
+            if not host:
+                hosts = None
+                break
+            hosts.add(get_short_host_name(host))
+
+        if hosts:
+            for host in hosts:
+                host_vols.setdefault(host, []).append(vol_entry)
+        else:
+            # can't tell where this volume is attached, so every node
+            # will be asked about it
+            unknown_host_vols.append(vol_entry)
+
+    return host_vols, unknown_host_vols, get_compute_hosts(request, servers)
 
 
 class RunLunTool(forms.SelfHandlingForm):
@@ -42,9 +113,17 @@ class RunLunTool(forms.SelfHandlingForm):
         required=False,
         widget=forms.Textarea(
             attrs={'rows': 6, 'readonly': 'readonly'}))
+    incremental = forms.BooleanField(
+        label=_("Only query nodes with changed attachments"),
+        help_text=_("Each nova node is only asked about the volumes "
+                    "attached to it, and nodes whose set of attached "
+                    "volumes has not changed since the last query keep "
+                    "their previous volume paths."),
+        required=False,
+        initial=True)
 
-    keystone_api = keystone.KeystoneAPI()
-    barbican_api = barbican.BarbicanAPI()
+    keystone_api = lazy.LazyAPI(keystone.KeystoneAPI)
+    barbican_api = lazy.LazyAPI(barbican.BarbicanAPI)
     nodes = None
 
     def __init__(self, request, *args, **kwargs):
@@ -70,6 +149,15 @@ class RunLunTool(forms.SelfHandlingForm):
                               _('Unable to run volume path query.'),
                               redirect=redirect)
 
+    def get_previous_result(self):
+        # the most recent query result, if any
+        store = result_store.get_result_store(self.barbican_api)
+        history = store.get_lun_tool_history()
+        if history:
+            latest = max(history, key=lambda k: k['timestamp'])
+            return store.get_lun_tool_result(latest['timestamp'])
+        return None
+
     def handle(self, request, data):
         try:
             self.keystone_api.do_setup(request)
@@ -77,24 +165,62 @@ class RunLunTool(forms.SelfHandlingForm):
             self.nodes = self.barbican_api.get_all_nodes(
                 barbican.NOVA_NODE_TYPE)
 
-            # need list of all attached volumes
+            # need list of all attached volumes, and where they are attached
             volumes = cinder.volume_list(
                 request,
                 search_opts={'all_tenants': True})
-            attached_vols = []
-            vol_names = []
+            all_vols = []
             for volume in volumes:
-                # only process volumes that are attached
                 if volume.attachments:
-                    attached_vol_entry = {}
-                    attached_vol_entry['vol_name'] = volume.name
-                    attached_vol_entry['vol_id'] = volume.id
-                    attached_vols.append(attached_vol_entry)
-                    vol_names.append(volume.name)
-            json_volume_names = json.dumps(vol_names)
+                    all_vols.append((volume.name, volume.id))
+            incremental = data.get('incremental')
+            if incremental:
+                host_vols, unknown_host_vols, compute_hosts = \
+                    get_attached_volumes_by_host(request, volumes)
+
+            prev_result = self.get_previous_result()
+            prev_nodes = {}
+            if prev_result and incremental:
+                for node in prev_result['node_list']:
+                    prev_nodes[node['node_name']] = node
 
             all_paths = []
             for node in self.nodes:
+                host = get_short_host_name(node['host_name'])
+                if incremental and \
+                        (host in host_vols or host in compute_hosts):
+                    # only ask this node about the volumes attached to it,
+                    # which a known host may have none of
+                    node_vols = host_vols.get(host, []) + unknown_host_vols
+                else:
+                    # a full query, or the nova host doesn't match this
+                    # node's host name, so ask about every volume
+                    node_vols = all_vols
+                node_vols = sorted([list(vol) for vol in node_vols])
+
+                # volume names can repeat, so the names this node reports
+                # are matched to the volumes it was asked about
+                node_vol_ids = {}
+                for vol_name, vol_id in node_vols:
+                    node_vol_ids.setdefault(vol_name, []).append(vol_id)
+
+                # skip nodes whose attachments have not changed since the
+                # last query, and carry their paths forward
+                prev_node = prev_nodes.get(node['node_name'])
+                if prev_node and \
+                        prev_node.get('attached_volumes') == node_vols:
+                    LOG.info("lun tool: attachments unchanged for %s, "
+                             "reusing previous paths" % node['node_name'])
+                    all_paths.append(prev_node)
+                    continue
+
+                if not node_vols:
+                    # nothing attached, so nothing to ask the node about
+                    all_paths.append({'node_name': node['node_name'],
+                                      'paths': [],
+                                      'attached_volumes': node_vols})
+                    continue
+
                 # note 'section' must be lower case for diag tool
                 credentials_data = {}
                 credentials_data['section'] = \
@@ -110,8 +236,12 @@ class RunLunTool(forms.SelfHandlingForm):
                 json_conf_data = json.dumps(all_data)
 
                 # first run ssh validation check on nova node
-                node_test = tester.NodeTest()
-                node_test.run_credentials_check_test(json_conf_data)
+                node_test = tester.get_node_test()
+                try:
+                    node_test.run_credentials_check_test(json_conf_data)
+                except tester.NodeTestTimeout as ex:
+                    LOG.info(("%s: %s") % (node['node_name'], ex))
+                    continue
 
                 if "fail" in node_test.test_result_text:
                     error_text = 'SSH credential validation failed'
@@ -126,39 +256,53 @@ class RunLunTool(forms.SelfHandlingForm):
                     os_vars = self.barbican_api.get_lun_tool_default_os_vars()
 
                 json_os_vars = json.dumps(os_vars)
-                node_test.run_volume_paths_test(json_conf_data, json_os_vars,
-                                                json_volume_names)
-
+                json_volume_names = json.dumps([vol[0] for vol in node_vols])
+                # paths are recorded as cinderdiags reports them
                 LOG.info("Process lun tool results - start results")
-                if node_test.test_result_text:
-                    json_string = node_test.test_result_text
-                    LOG.info("lun tool:json results - %s" % json_string)
-                    parsed_json = json.loads(json_string)
-                    LOG.info("lun tool:parsed_json results - %s" % parsed_json)
-
                 path_data_for_node = []
-                for entry in parsed_json:
-                    path_entry = {}
-                    path_entry['path'] = entry['Path']
-
-                    vol_name = entry['Attached Volume']
-                    item = [d for d in attached_vols
-                            if d['vol_name'] == vol_name]
-                    vol_id = None
-                    if item:
-                        vol_id = item[0]['vol_id']
-                    path_entry['vol_name'] = vol_name
-                    path_entry['vol_id'] = vol_id
-                    path_data_for_node.append(path_entry)
-
-                # store all the paths found for this nova node
+                try:
+                    for entry in node_test.iter_volume_paths_test(
+                            json_conf_data, json_os_vars, json_volume_names):
+                        path_entry = {}
+                        path_entry['path'] = entry['Path']
+
+                        vol_name = entry['Attached Volume']
+                        vol_ids = node_vol_ids.get(vol_name, [])
+                        if len(vol_ids) > 1:
+                            LOG.warning("lun tool: %d volumes named %s on "
+                                        "%s, path %s not matched" %
+                                        (len(vol_ids), vol_name,
+                                         node['node_name'], entry['Path']))
+                        path_entry['vol_name'] = vol_name
+                        path_entry['vol_id'] = \
+                            vol_ids[0] if len(vol_ids) == 1 else None
+                        path_data_for_node.append(path_entry)
+                except tester.NodeTestTimeout as ex:
+                    LOG.info(("%s: %s") % (node['node_name'], ex))
+                    continue
+                LOG.info("lun tool: %d paths found on %s" %
+                         (len(path_data_for_node), node['node_name']))
+
+                # store all the paths found for this nova node, along with
+                # the volumes it was asked about
                 all_paths_entry = {}
                 all_paths_entry['node_name'] = node['node_name']
                 all_paths_entry['paths'] = path_data_for_node
+                all_paths_entry['attached_volumes'] = node_vols
                 all_paths.append(all_paths_entry)
 
             cur_time = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            self.barbican_api.add_lun_tool_result(cur_time, all_paths)
+            store = result_store.get_result_store(self.barbican_api)
+            store.add_lun_tool_result(
+                cur_time, all_paths,
+                volume_index=path_index.build_volume_index(all_paths))
+
+            # cache what changed since the previous query
+            if prev_result:
+                diff_data = lun_tool_diffs.compute_diff(
+                    prev_result['node_list'], all_paths)
+                store.add_lun_tool_diffs(
+                    prev_result['timestamp'], cur_time, diff_data)
 
             messages.success(
                 request,
@@ -189,8 +333,8 @@ class ManageOSVars(forms.SelfHandlingForm):
     os_auth = forms.CharField(
         label=_("OS_AUTH_URL"))
 
-    keystone_api = keystone.KeystoneAPI()
-    barbican_api = barbican.BarbicanAPI()
+    keystone_api = lazy.LazyAPI(keystone.KeystoneAPI)
+    barbican_api = lazy.LazyAPI(barbican.BarbicanAPI)
 
     def __init__(self, request, *args, **kwargs):
         super(ManageOSVars, self).__init__(request, *args, **kwargs)
@@ -265,9 +409,8 @@ class ShowDiff(forms.SelfHandlingForm):
     other_results = forms.ChoiceField(label=_("Compare against Query"),
                                       required=False)
 
-    keystone_api = keystone.KeystoneAPI()
-    barbican_api = barbican.BarbicanAPI()
-    orig_result = None
+    keystone_api = lazy.LazyAPI(keystone.KeystoneAPI)
+    barbican_api = lazy.LazyAPI(barbican.BarbicanAPI)
     stored_results = None
 
     def __init__(self, request, *args, **kwargs):
@@ -280,12 +423,11 @@ class ShowDiff(forms.SelfHandlingForm):
             self.keystone_api.do_setup(request)
             self.barbican_api.do_setup(self.keystone_api.get_session())
 
-            self.stored_results = self.barbican_api.get_lun_tool_results()
+            store = result_store.get_result_store(self.barbican_api)
+            self.stored_results = store.get_lun_tool_history()
             choices = []
             for result in self.stored_results:
-                if result['timestamp'] == current_result_timestamp:
-                    self.orig_result = result
-                else:
+                if result['timestamp'] != current_result_timestamp:
                     choice = forms.ChoiceField = (result['timestamp'],
                                                   result['timestamp'])
                     choices.append(choice)
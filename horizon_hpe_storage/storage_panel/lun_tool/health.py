@@ -0,0 +1,91 @@
+# (c) Copyright [2015] Hewlett Packard Enterprise Development LP
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+from django.conf import settings
+
+# number of paths each nova node should see for an attached volume
+EXPECTED_PATHS = getattr(settings,
+                         'HPE_STORAGE_LUN_TOOL_EXPECTED_PATHS', 2)
+
+FEWER_PATHS = 'Fewer Paths Than Expected'
+ORPHANED_PATH = 'Orphaned Path'
+MULTIPLE_NODES = 'Seen On Multiple Nodes'
+NO_PATHS = 'No Paths Found'
+
+
+def _issue(issue, node_name, vol_name, vol_id, detail):
+    row = {}
+    row['issue'] = issue
+    row['node_name'] = node_name
+    row['vol_name'] = vol_name
+    row['vol_id'] = vol_id
+    row['detail'] = detail
+    return row
+
+
+def analyze(rows, attached_volumes=None, expected_paths=EXPECTED_PATHS):
+    """Returns the multipath problems found in a list of volume path rows.
+
+    Rows are read once, counting paths per volume on each node and the
+    nodes each volume is seen on, then each count is checked. Volumes in
+    attached_volumes, which maps each nova node to the (name, ID) of the
+    volumes it was asked about, are also checked for having no paths on
+    any node.
+    """
+    issues = []
+    node_paths = {}
+    vol_nodes = {}
+    vol_names = {}
+    for row in rows:
+        vol_id = row['vol_id']
+        if not vol_id:
+            issues.append(_issue(ORPHANED_PATH, row['node_name'],
+                                 row['vol_name'], None,
+                                 row['path']))
+            continue
+
+        key = (vol_id, row['node_name'])
+        node_paths[key] = node_paths.get(key, 0) + 1
+        vol_nodes.setdefault(vol_id, set()).add(row['node_name'])
+        vol_names[vol_id] = row['vol_name']
+
+    for (vol_id, node_name), num_paths in node_paths.iteritems():
+        if num_paths < expected_paths:
+            issues.append(_issue(FEWER_PATHS, node_name,
+                                 vol_names[vol_id], vol_id,
+                                 '%d of %d paths' % (num_paths,
+                                                     expected_paths)))
+
+    for vol_id, node_names in vol_nodes.iteritems():
+        if len(node_names) > 1:
+            issues.append(_issue(MULTIPLE_NODES, ', '.join(
+                sorted(node_names)), vol_names[vol_id], vol_id,
+                '%d nodes' % len(node_names)))
+
+    # attached volumes no node reported any paths for
+    missing_nodes = {}
+    missing_names = {}
+    for node_name, volumes in (attached_volumes or {}).iteritems():
+        for vol_name, vol_id in volumes:
+            if vol_id not in vol_nodes:
+                missing_nodes.setdefault(vol_id, set()).add(node_name)
+                missing_names[vol_id] = vol_name
+
+    for vol_id, node_names in missing_nodes.iteritems():
+        issues.append(_issue(NO_PATHS, ', '.join(sorted(node_names)),
+                             missing_names[vol_id], vol_id,
+                             '0 of %d paths' % expected_paths))
+
+    return sorted(issues, key=lambda k: (k['issue'], k['node_name'],
+                                         k['vol_name']))
@@ -0,0 +1,46 @@
+# (c) Copyright [2015] Hewlett Packard Enterprise Development LP
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+from django.utils.translation import ugettext_lazy as _
+
+from horizon import tables
+
+from horizon_hpe_storage.storage_panel.lun_tool \
+    import volume_path_tables as v_tables
+
+
+class HealthTable(tables.DataTable):
+    issue = tables.Column(
+        'issue',
+        verbose_name=_('Issue'))
+    node = tables.Column(
+        'node_name',
+        verbose_name=_('Nova Node'))
+    vol_name = tables.Column(
+        'vol_name',
+        verbose_name=_('Volume Name'))
+    vol_id = v_tables.VolumeIDColumn(
+        'vol_id',
+        verbose_name=_('Volume ID'))
+    detail = tables.Column(
+        'detail',
+        verbose_name=_('Detail'))
+
+    class Meta(object):
+        name = "health"
+        verbose_name = _("Multipath Health")
+
+    def get_object_id(self, datum):
+        return ':'.join([datum['issue'], datum['node_name'],
+                         datum['vol_id'] or datum['detail']])
@@ -0,0 +1,255 @@
+# (c) Copyright [2015] Hewlett Packard Enterprise Development LP
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+from django.conf import settings
+from django.core.cache import cache
+
+import bisect
+import hashlib
+
+from horizon_hpe_storage.api.common.cache import LRUCache
+import horizon_hpe_storage.api.result_store as result_store
+
+# fields that volume path rows can be sorted and filtered on
+PATH_FIELDS = ('node_name', 'vol_name', 'vol_id', 'path')
+
+CACHE_TIMEOUT = getattr(settings, 'HPE_STORAGE_LUN_TOOL_CACHE_TIMEOUT', 3600)
+# indexes kept by each worker
+CACHE_SIZE = getattr(settings, 'HPE_STORAGE_LUN_TOOL_CACHE_SIZE', 8)
+
+# indexes are too large to copy in and out of the shared cache on every
+# page view, so each worker keeps its own, and the shared cache only
+# records which ones have been deleted
+_indexes = LRUCache(CACHE_SIZE, CACHE_TIMEOUT)
+
+
+class RowIndex(object):
+    """Sorted and indexed rows of a volume path query result or diff.
+
+    Every sort order is built up front, so a page of rows can be
+    returned without scanning the full list. Filters match the start of
+    a field's value, found by bisecting the field's sort order, except
+    for exact_fields, which get an exact match lookup.
+    """
+
+    def __init__(self, rows, fields=PATH_FIELDS, exact_fields=()):
+        self.rows = rows
+        self.fields = fields
+        self.orders = {}
+        self.ranks = {}
+        # field -> sort keys in the field's sort order
+        self.keys = {}
+        self.lookups = {}
+        for field in fields:
+            row_keys = [self._get_key(row, field) for row in rows]
+            order = sorted(range(len(rows)), key=row_keys.__getitem__)
+            ranks = [0] * len(rows)
+            for rank, idx in enumerate(order):
+                ranks[idx] = rank
+            self.orders[field] = order
+            self.ranks[field] = ranks
+
+            if field in exact_fields:
+                lookup = {}
+                for idx, key in enumerate(row_keys):
+                    lookup.setdefault(key, []).append(idx)
+                self.lookups[field] = lookup
+            else:
+                self.keys[field] = [row_keys[idx] for idx in order]
+
+    def _get_key(self, row, field):
+        value = row.get(field)
+        if value is None:
+            return ''
+        return unicode(value).lower()
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _get_matches(self, field, key):
+        # rows whose value for field matches key, in the field's order
+        if field in self.lookups:
+            return self.lookups[field].get(key, [])
+        keys = self.keys[field]
+        start = bisect.bisect_left(keys, key)
+        end = start
+        while end < len(keys) and keys[end].startswith(key):
+            end += 1
+        return self.orders[field][start:end]
+
+    def get_page(self, limit, marker=None, prev_marker=None,
+                 sort_key=None, sort_dir='asc',
+                 filter_field=None, filter_string=None):
+        """Returns (rows, has_prev, has_more) for one page.
+
+        Markers are positions in the sorted, filtered list of rows.
+        """
+        if sort_key not in self.fields:
+            sort_key = self.fields[0]
+
+        if filter_field in self.fields and filter_string:
+            order = self._get_matches(filter_field,
+                                      filter_string.strip().lower())
+            if filter_field != sort_key:
+                # only the matching rows need to be put in order
+                ranks = self.ranks[sort_key]
+                order = sorted(order, key=lambda idx: ranks[idx])
+        else:
+            order = self.orders[sort_key]
+
+        count = len(order)
+        if prev_marker is not None:
+            end = min(int(prev_marker), count)
+            start = max(end - limit, 0)
+        else:
+            start = min(int(marker or 0), count)
+            end = min(start + limit, count)
+
+        if sort_dir == 'desc':
+            positions = order[count - end:count - start][::-1]
+        else:
+            positions = order[start:end]
+
+        rows = []
+        for offset, idx in enumerate(positions):
+            row = dict(self.rows[idx])
+            row['row_index'] = start + offset
+            rows.append(row)
+
+        return rows, start > 0, end < count
+
+
+def _get_cache_key(kind, name):
+    # cache keys can't contain the spaces found in timestamps
+    name_hash = hashlib.md5(name.encode('utf-8')).hexdigest()
+    return 'hpe_storage:lun_tool:%s:%s' % (kind, name_hash)
+
+
+def get_cached_index(kind, name):
+    key = _get_cache_key(kind, name)
+    index = _indexes.get(key)
+    if index is not None and cache.get(key + ':deleted'):
+        # deleted through another worker
+        _indexes.delete(key)
+        return None
+    return index
+
+
+def set_cached_index(kind, name, index):
+    key = _get_cache_key(kind, name)
+    _indexes.set(key, index)
+    cache.delete(key + ':deleted')
+
+
+def delete_cached_index(kind, name):
+    key = _get_cache_key(kind, name)
+    _indexes.delete(key)
+    cache.set(key + ':deleted', True, CACHE_TIMEOUT)
+
+
+def clear_cached_indexes():
+    # only this worker's indexes
+    _indexes.clear()
+
+
+def get_path_rows(node_list):
+    rows = []
+    for node in node_list:
+        for path in node['paths']:
+            row = dict(path)
+            row['node_name'] = node['node_name']
+            rows.append(row)
+    return rows
+
+
+def _get_node_attached_volumes(node):
+    # results stored before attached volumes were kept have none
+    return [tuple(vol) for vol in node.get('attached_volumes', [])]
+
+
+def _load_path_index(barbican_api, timestamp):
+    # the path rows and attached volumes come from one read of the result
+    rows = []
+    attached_volumes = {}
+    store = result_store.get_result_store(barbican_api)
+    for node in store.iter_lun_tool_result_nodes(timestamp):
+        rows.extend(get_path_rows([node]))
+        attached_volumes[node['node_name']] = \
+            _get_node_attached_volumes(node)
+    index = RowIndex(rows)
+    set_cached_index('paths', timestamp, index)
+    set_cached_index('attached', timestamp, attached_volumes)
+    return index, attached_volumes
+
+
+def get_path_index(barbican_api, timestamp):
+    index = get_cached_index('paths', timestamp)
+    if index is None:
+        index = _load_path_index(barbican_api, timestamp)[0]
+    return index
+
+
+def get_attached_volumes(barbican_api, timestamp):
+    """Maps each nova node to the (name, ID) of the volumes it was asked
+    about.
+    """
+    attached_volumes = get_cached_index('attached', timestamp)
+    if attached_volumes is None:
+        attached_volumes = _load_path_index(barbican_api, timestamp)[1]
+    return attached_volumes
+
+
+def build_volume_index(node_list):
+    """Maps each volume ID to the nova nodes and paths it was seen on."""
+    volume_index = {}
+    for node in node_list:
+        for path in node['paths']:
+            if path['vol_id']:
+                entry = [node['node_name'], path['path'], path['vol_name']]
+                volume_index.setdefault(path['vol_id'], []).append(entry)
+    return volume_index
+
+
+def get_volume_index(barbican_api, timestamp):
+    volume_index = get_cached_index('volumes', timestamp)
+    if volume_index is None:
+        store = result_store.get_result_store(barbican_api)
+        volume_index = store.get_lun_tool_volume_index(timestamp)
+        if volume_index is None:
+            # result was stored before volume indexes were kept
+            volume_index = build_volume_index(
+                store.iter_lun_tool_result_nodes(timestamp))
+        set_cached_index('volumes', timestamp, volume_index)
+    return volume_index
+
+
+def get_volume_path_rows(volume_index, vol_id):
+    rows = []
+    for node_name, path, vol_name in volume_index.get(vol_id, []):
+        row = {}
+        row['node_name'] = node_name
+        row['path'] = path
+        row['vol_name'] = vol_name
+        row['vol_id'] = vol_id
+        rows.append(row)
+    return rows
+
+
+def get_stale_path_rows(volume_index, current_vol_ids):
+    # paths still present for volumes that no longer exist in cinder
+    rows = []
+    for vol_id in volume_index:
+        if vol_id not in current_vol_ids:
+            rows.extend(get_volume_path_rows(volume_index, vol_id))
+    return sorted(rows, key=lambda k: (k['node_name'], k['path']))
@@ -21,6 +21,9 @@ from horizon import tables
 
 import horizon_hpe_storage.api.keystone_api as keystone
 import horizon_hpe_storage.api.barbican_api as barbican
+from horizon_hpe_storage.api.common import lazy
+import horizon_hpe_storage.api.result_store as result_store
+from horizon_hpe_storage.storage_panel.lun_tool import path_index
 
 import datetime
 
@@ -43,8 +46,8 @@ class ManageOSVariables(tables.LinkAction):
 class DeleteResultAction(tables.DeleteAction):
     name = "delete_result"
     policy_rules = (("volume", "volume:deep_link"),)
-    keystone_api = keystone.KeystoneAPI()
-    barbican_api = barbican.BarbicanAPI()
+    keystone_api = lazy.LazyAPI(keystone.KeystoneAPI)
+    barbican_api = lazy.LazyAPI(barbican.BarbicanAPI)
 
     @staticmethod
     def action_present(count):
@@ -66,7 +69,12 @@ class DeleteResultAction(tables.DeleteAction):
         self.keystone_api.do_setup(request)
         self.barbican_api.do_setup(self.keystone_api.get_session())
 
-        return self.barbican_api.delete_lun_tool_result(timestamp)
+        path_index.delete_cached_index('paths', timestamp)
+        path_index.delete_cached_index('volumes', timestamp)
+        path_index.delete_cached_index('attached', timestamp)
+        path_index.delete_cached_index('health', timestamp)
+        store = result_store.get_result_store(self.barbican_api)
+        return store.delete_lun_tool_result(timestamp)
 
 
 class ShowDiffAction(tables.LinkAction):
@@ -79,6 +87,19 @@ class ShowDiffAction(tables.LinkAction):
         return True
 
 
+class ShowPrevDiffAction(tables.LinkAction):
+    name = "prev_diff_results"
+    verbose_name = _("Show Changes Since Previous Query")
+    url = "horizon:admin:hpe_storage:lun_tool:diff_details"
+
+    def allowed(self, request, result=None):
+        return result is not None and 'prev_timestamp' in result
+
+    def get_link_url(self, datum):
+        return reverse(self.url, args=(datum['prev_timestamp'] + "::" +
+                                       datum['timestamp'],))
+
+
 class DisplayPathsAction(tables.LinkAction):
     name = "paths"
     verbose_name = _("View Volume Paths")
@@ -90,6 +111,23 @@ class DisplayPathsAction(tables.LinkAction):
         return link_url
 
 
+class ExportPathsAction(tables.LinkAction):
+    name = "export_csv"
+    verbose_name = _("Export Volume Paths (CSV)")
+    url = "horizon:admin:hpe_storage:lun_tool:export_paths"
+    export_format = "csv"
+
+    def get_link_url(self, datum):
+        return reverse(self.url, args=(datum['timestamp'],
+                                       self.export_format))
+
+
+class ExportPathsNDJSONAction(ExportPathsAction):
+    name = "export_ndjson"
+    verbose_name = _("Export Volume Paths (NDJSON)")
+    export_format = "ndjson"
+
+
 class TimeStampColumn(tables.Column):
     def get_raw_data(self, data):
         str = data['timestamp'].split('-')
@@ -105,48 +143,18 @@ class TimeStampColumn(tables.Column):
         return timestr
 
 
-class NumNodesColumn(tables.Column):
-    # Customized column class.
-    def get_raw_data(self, results):
-        node_list = results['node_list']
-        return len(node_list)
-
-
-class NumPathsColumn(tables.Column):
-    # Customized column class.
-    def get_raw_data(self, results):
-        cnt = 0
-        node_list = results['node_list']
-        for node in node_list:
-            cnt += len(node['paths'])
-        return cnt
-
-
-class NumAttachedColumn(tables.Column):
-    # Customized column class.
-    def get_raw_data(self, results):
-        cnt = 0
-        node_list = results['node_list']
-        for node in node_list:
-            paths = node['paths']
-            for path in paths:
-                if path['vol_id']:
-                    cnt += 1
-        return cnt
-
-
 class LunToolTable(tables.DataTable):
     timestamp = tables.Column(
         'timestamp',
         verbose_name=_('Run Time'),
         form_field=forms.CharField(max_length=64))
-    num_nodes = NumNodesColumn(
+    num_nodes = tables.Column(
         'num_nodes',
         verbose_name=_('Number of Nova Nodes Queried'))
-    num_paths = NumPathsColumn(
+    num_paths = tables.Column(
         'num_paths',
         verbose_name=_('Total Number of Discovered Volume Paths'))
-    num_attached = NumAttachedColumn(
+    num_attached = tables.Column(
         'num_attached',
         verbose_name=_('Total Number of Attached Volumes'))
 
@@ -162,4 +170,6 @@ class LunToolTable(tables.DataTable):
         hidden_title = False
         table_actions = (RunLunToolAction, ManageOSVariables,
                          DeleteResultAction)
-        row_actions = (DisplayPathsAction, ShowDiffAction, DeleteResultAction)
+        row_actions = (DisplayPathsAction, ShowPrevDiffAction,
+                       ShowDiffAction, ExportPathsAction,
+                       ExportPathsNDJSONAction, DeleteResultAction)
@@ -13,140 +13,195 @@
 #    limitations under the License.
 
 from django.utils.translation import ugettext_lazy as _
-from django.utils import safestring
 
+from horizon import exceptions
 from horizon import tabs
+from horizon.utils import functions as utils
 
+import horizon_hpe_storage.api.keystone_api as keystone
+import horizon_hpe_storage.api.barbican_api as barbican
+from horizon_hpe_storage.api.common import lazy
+from horizon_hpe_storage.storage_panel.lun_tool import path_index
 from horizon_hpe_storage.storage_panel.lun_tool \
     import volume_path_tables as v_tables
 from horizon_hpe_storage.storage_panel.lun_tool \
     import diff_tables as d_tables
-
-
-class PathDetailTab(tabs.TableTab):
+from horizon_hpe_storage.storage_panel.lun_tool import health
+from horizon_hpe_storage.storage_panel.lun_tool \
+    import health_tables as h_tables
+
+from openstack_dashboard.api import cinder
+
+
+class IndexedTableTab(tabs.TableTab):
+    """Serves table data one page at a time from a RowIndex.
+
+    Filtering uses the table's server side filter action, and the sort
+    order is taken from the '<table>_sort' and '<table>_sort_dir' query
+    parameters. Both are kept in the session so they survive paging,
+    until a different result is shown.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(IndexedTableTab, self).__init__(*args, **kwargs)
+        self._has_prev = {}
+        self._has_more = {}
+
+    def _get_session_param(self, table_name, param_name, values):
+        # kept along with the result they were set on, so they aren't
+        # applied to other results
+        timestamp = self.tab_group.kwargs['timestamp']
+        session_key = 'hpe_storage:lun_tool:' + table_name
+        params = self.request.session.get(session_key)
+        if not params or params.get('timestamp') != timestamp:
+            params = {'timestamp': timestamp}
+        value = values.get(param_name)
+        if value is not None:
+            params[param_name] = value
+            self.request.session[session_key] = params
+            return value
+        return params.get(param_name)
+
+    def get_index_page(self, table, index):
+        table_name = table._meta.name
+        filter_field = None
+        filter_string = None
+        filter_action = table._meta._filter_action
+        if filter_action and filter_action.filter_type == 'server':
+            param_name = filter_action.get_param_name()
+            filter_string = self._get_session_param(
+                table_name, param_name, self.request.POST)
+            filter_field = self._get_session_param(
+                table_name, param_name + '_field', self.request.POST)
+
+        sort_key = self._get_session_param(
+            table_name, table_name + '_sort', self.request.GET)
+        sort_dir = self._get_session_param(
+            table_name, table_name + '_sort_dir', self.request.GET)
+
+        rows, has_prev, has_more = index.get_page(
+            utils.get_page_size(self.request),
+            marker=self.request.GET.get(table._meta.pagination_param),
+            prev_marker=self.request.GET.get(
+                table._meta.prev_pagination_param),
+            sort_key=sort_key,
+            sort_dir=sort_dir,
+            filter_field=filter_field,
+            filter_string=filter_string)
+
+        self._has_prev[table_name] = has_prev
+        self._has_more[table_name] = has_more
+        return rows
+
+    def has_prev_data(self, table):
+        return self._has_prev.get(table._meta.name, False)
+
+    def has_more_data(self, table):
+        return self._has_more.get(table._meta.name, False)
+
+    def get_context_data(self, request, **kwargs):
+        context = super(IndexedTableTab, self).get_context_data(request,
+                                                                **kwargs)
+        context['sort_fields'] = v_tables.SORT_FIELDS
+        return context
+
+
+class PathDetailTab(IndexedTableTab):
     name = _("Volume Paths")
     slug = "paths"
     table_classes = (v_tables.VolumePathsTable,)
     template_name = "lun_tool/_detail_paths.html"
 
     def get_paths_data(self):
-        volume_paths = self.tab_group.kwargs['volume_paths']
-        return volume_paths
+        index = self.tab_group.kwargs['path_index']
+        return self.get_index_page(self._tables['paths'], index)
+
+    def get_context_data(self, request, **kwargs):
+        context = super(PathDetailTab, self).get_context_data(request,
+                                                              **kwargs)
+        context['export_url'] = 'horizon:admin:hpe_storage:lun_tool:' \
+                                'export_paths'
+        context['timestamp'] = self.tab_group.kwargs['timestamp']
+        return context
+
+
+class HealthTab(tabs.TableTab):
+    name = _("Multipath Health")
+    slug = "health"
+    table_classes = (h_tables.HealthTable,)
+    template_name = "horizon/common/_detail_table.html"
+    keystone_api = lazy.LazyAPI(keystone.KeystoneAPI)
+    barbican_api = lazy.LazyAPI(barbican.BarbicanAPI)
+
+    def get_health_data(self):
+        timestamp = self.tab_group.kwargs['timestamp']
+        issues = path_index.get_cached_index('health', timestamp)
+        if issues is None:
+            issues = []
+            try:
+                self.keystone_api.do_setup(self.request)
+                self.barbican_api.do_setup(self.keystone_api.get_session())
+                attached_volumes = path_index.get_attached_volumes(
+                    self.barbican_api, timestamp)
+                index = self.tab_group.kwargs['path_index']
+                issues = health.analyze(index.rows, attached_volumes)
+                path_index.set_cached_index('health', timestamp, issues)
+            except Exception:
+                exceptions.handle(self.request,
+                                  _('Unable to check multipath health.'))
+        return issues
+
+
+class StalePathsTab(tabs.TableTab):
+    name = _("Stale Paths")
+    slug = "stale_paths"
+    table_classes = (v_tables.StalePathsTable,)
+    template_name = "horizon/common/_detail_table.html"
+    # needs the current cinder volume list, so only load when shown
+    preload = False
+    keystone_api = lazy.LazyAPI(keystone.KeystoneAPI)
+    barbican_api = lazy.LazyAPI(barbican.BarbicanAPI)
+
+    def get_stale_paths_data(self):
+        rows = []
+        try:
+            self.keystone_api.do_setup(self.request)
+            self.barbican_api.do_setup(self.keystone_api.get_session())
+            volume_index = path_index.get_volume_index(
+                self.barbican_api, self.tab_group.kwargs['timestamp'])
+            volumes = cinder.volume_list(
+                self.request,
+                search_opts={'all_tenants': True})
+            rows = path_index.get_stale_path_rows(
+                volume_index, set([volume.id for volume in volumes]))
+        except Exception:
+            exceptions.handle(self.request,
+                              _('Unable to retrieve stale volume paths.'))
+        return rows
 
 
 class PathDetailTabs(tabs.TabGroup):
     slug = "path_details"
-    tabs = (PathDetailTab,)
+    tabs = (PathDetailTab, HealthTab, StalePathsTab)
 
 
-class DiffDetailTab(tabs.TableTab):
+class DiffDetailTab(IndexedTableTab):
     name = _("Diffs")
     slug = "diffs"
     table_classes = (d_tables.DiffTable,)
     template_name = "lun_tool/detail_diffs.html"
 
-    def get_diffs_data(self):
-        diffs = self.tab_group.kwargs['diffs']
-        return diffs
-
     def get_diff_paths_data(self):
-        path_list = []
-        added_list = []
-        removed_list = []
-        changed_list = []
-        id = 0
-
-        diff = self.tab_group.kwargs['diff_data']
-        if diff and 'added_nodes' in diff:
-            added_nodes = diff['added_nodes']
-            for node in added_nodes:
-                for path in node['paths']:
-                    path_entry = {}
-                    path_entry['diff'] = "Node Added"
-                    path_entry['node_name'] = node['node_name']
-                    path_entry['old_path'] = "-"
-                    path_entry['new_path'] = \
-                        self.build_field(node['node_name'],
-                                         path['path'],
-                                         path['vol_name'],
-                                         path['vol_id'])
-                    path_entry['id'] = id
-                    id += 1
-                    added_list.append(path_entry)
-
-        if diff and 'removed_nodes' in diff:
-            removed_nodes = diff['removed_nodes']
-            for node in removed_nodes:
-                for path in node['paths']:
-                    path_entry = {}
-                    path_entry['diff'] = "Node Removed"
-                    path_entry['node_name'] = node['node_name']
-                    path_entry['old_path'] = \
-                        self.build_field(node['node_name'],
-                                         path['path'],
-                                         path['vol_name'],
-                                         path['vol_id'])
-                    path_entry['new_path'] = "-"
-                    path_entry['id'] = id
-                    id += 1
-                    removed_list.append(path_entry)
-
-        if diff and 'modified_paths' in diff:
-            modified_paths = diff['modified_paths']
-            for modified_path in modified_paths:
-                path_entry = {}
-                path_entry['diff'] = "Path Modified"
-                old_path = modified_path['old_path']
-                if old_path:
-                    path_entry['old_path'] = \
-                        self.build_field(modified_path['node_name'],
-                                         old_path['path'],
-                                         old_path['vol_name'],
-                                         old_path['vol_id'])
-                else:
-                    path_entry['diff'] = "Path Added"
-                    path_entry['old_path'] = "-"
-
-                new_path = modified_path['new_path']
-                if new_path:
-                    path_entry['new_path'] = \
-                        self.build_field(modified_path['node_name'],
-                                         new_path['path'],
-                                         new_path['vol_name'],
-                                         new_path['vol_id'])
-                else:
-                    path_entry['diff'] = "Path Removed"
-                    path_entry['new_path'] = "-"
-
-                path_entry['node_name'] = modified_path['node_name']
-                path_entry['id'] = id
-                id += 1
-                if path_entry['diff'] == "Path Added":
-                    added_list.append(path_entry)
-                elif path_entry['diff'] == "Path Removed":
-                    removed_list.append(path_entry)
-                else:
-                    changed_list.append(path_entry)
-
-        path_list.extend(sorted(added_list, key=lambda k: k['node_name']))
-        path_list.extend(sorted(removed_list, key=lambda k: k['node_name']))
-        path_list.extend(sorted(changed_list, key=lambda k: k['node_name']))
-        return path_list
-
-    def build_field(self, node_name, path, vol_name, vol_id):
-        path_str = \
-            "<b>Node:  </b>" + \
-            node_name + "  " + \
-            "<br>" + \
-            "<b>Vol Path:  </b>" + \
-            path + "  " + \
-            "<br>" + \
-            "<b>Vol Name:  </b>" + \
-            vol_name + "  " + \
-            "<br>" + \
-            "<b>Vol ID:  </b>" + \
-            vol_id + "  "
-        return safestring.mark_safe(path_str)
+        diff_index = self.tab_group.kwargs['diff_index']
+        return self.get_index_page(self._tables['diff_paths'], diff_index)
+
+    def get_context_data(self, request, **kwargs):
+        context = super(DiffDetailTab, self).get_context_data(request,
+                                                              **kwargs)
+        context['export_url'] = 'horizon:admin:hpe_storage:lun_tool:' \
+                                'export_diffs'
+        context['timestamp'] = self.tab_group.kwargs['timestamp']
+        return context
 
 
 class DiffDetailTabs(tabs.TabGroup):
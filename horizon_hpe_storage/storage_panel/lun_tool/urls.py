@@ -40,4 +40,14 @@ urlpatterns = patterns(
     url(r'^(?P<timestamp>[^/]+)/diff_details$',
         views.DiffDetailView.as_view(),
         name='diff_details'),
+    url(r'^(?P<timestamp>[^/]+)/volume/(?P<volume_id>[^/]+)$',
+        views.VolumePathsView.as_view(),
+        name='volume_paths'),
+    url(r'^(?P<timestamp>[^/]+)/export/(?P<export_format>csv|ndjson)$',
+        views.ExportPathsView.as_view(),
+        name='export_paths'),
+    url(r'^(?P<timestamp>[^/]+)/diff_export/'
+        r'(?P<export_format>csv|ndjson)$',
+        views.ExportDiffsView.as_view(),
+        name='export_diffs'),
 )
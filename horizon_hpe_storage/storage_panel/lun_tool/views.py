@@ -12,22 +12,35 @@
 #    See the License for the specific language governing permissions and
 #    limitations under the License.
 
+import itertools
+
 from django.core.urlresolvers import reverse
 from django.core.urlresolvers import reverse_lazy
+from django.http import Http404
+from django.http import StreamingHttpResponse
 from django.utils.translation import ugettext_lazy as _
+from django.views import generic
 
 from horizon import exceptions
 from horizon import views
 from horizon import forms
+from horizon import tables
 from horizon import tabs
 from horizon.utils import memoized
 
 from horizon_hpe_storage.storage_panel.lun_tool \
     import tabs as l_tabs
+from horizon_hpe_storage.storage_panel.lun_tool import diffs as lun_tool_diffs
+from horizon_hpe_storage.storage_panel.lun_tool import export
 from horizon_hpe_storage.storage_panel.lun_tool import forms as lun_tool_forms
+from horizon_hpe_storage.storage_panel.lun_tool import path_index
+from horizon_hpe_storage.storage_panel.lun_tool \
+    import volume_path_tables as v_tables
 
 import horizon_hpe_storage.api.keystone_api as keystone
 import horizon_hpe_storage.api.barbican_api as barbican
+from horizon_hpe_storage.api.common import lazy
+import horizon_hpe_storage.api.result_store as result_store
 
 from openstack_dashboard.api import cinder
 
@@ -65,12 +78,12 @@ class ManageOSVarsView(forms.ModalFormView):
     success_url = reverse_lazy('horizon:admin:hpe_storage:index')
 
 
-class PathDetailView(tabs.TabView):
+class PathDetailView(tabs.TabbedTableView):
     tab_group_class = l_tabs.PathDetailTabs
     template_name = 'horizon/common/_detail.html'
     page_title = "Volume Path Query Results from: {{ timestamp }}"
-    keystone_api = keystone.KeystoneAPI()
-    barbican_api = barbican.BarbicanAPI()
+    keystone_api = lazy.LazyAPI(keystone.KeystoneAPI)
+    barbican_api = lazy.LazyAPI(barbican.BarbicanAPI)
 
     def get_context_data(self, **kwargs):
         context = super(PathDetailView, self).get_context_data(**kwargs)
@@ -80,22 +93,12 @@ class PathDetailView(tabs.TabView):
     def get_data(self):
         timestamp = self.kwargs['timestamp']
 
-        paths = []
+        index = None
         try:
-            # retrieve all lun paths from lun tool results
+            # retrieve the indexed lun paths for this lun tool result
             self.keystone_api.do_setup(self.request)
             self.barbican_api.do_setup(self.keystone_api.get_session())
-
-            results = self.barbican_api.get_lun_tool_results()
-
-            # grab the result that matches the timestamp
-            for result in results:
-                if result['timestamp'] == timestamp:
-                    for node in result['node_list']:
-                        for path in node['paths']:
-                            path['node_name'] = node['node_name']
-                            paths.append(path)
-                    break
+            index = path_index.get_path_index(self.barbican_api, timestamp)
 
         except Exception as ex:
             redirect = self.get_redirect_url()
@@ -103,15 +106,15 @@ class PathDetailView(tabs.TabView):
                               _('Unable to retrieve volume paths.'),
                               redirect=redirect)
 
-        return paths
+        return index
 
     def get_redirect_url(self):
         return reverse('horizon:admin:hpe_storage:index')
 
     def get_tabs(self, request, *args, **kwargs):
-        volume_paths = self.get_data()
+        index = self.get_data()
         return self.tab_group_class(request,
-                                    volume_paths=volume_paths,
+                                    path_index=index,
                                     **kwargs)
 
 
@@ -158,13 +161,13 @@ class ShowDiffView(forms.ModalFormView):
         return {'timestamp': timestamp}
 
 
-class DiffDetailView(tabs.TabView):
+class DiffDetailView(tabs.TabbedTableView):
     tab_group_class = l_tabs.DiffDetailTabs
     template_name = 'horizon/common/_detail.html'
     page_title = "Compare Results from: [{{ base_timestamp }}] to: " \
                  "[{{ compare_timestamp }}]"
-    keystone_api = keystone.KeystoneAPI()
-    barbican_api = barbican.BarbicanAPI()
+    keystone_api = lazy.LazyAPI(keystone.KeystoneAPI)
+    barbican_api = lazy.LazyAPI(barbican.BarbicanAPI)
 
     def get_context_data(self, **kwargs):
         context = super(DiffDetailView, self).get_context_data(**kwargs)
@@ -178,79 +181,23 @@ class DiffDetailView(tabs.TabView):
         timestamps = self.kwargs['timestamp'].split("::")
         base_timestamp = timestamps[0]
         compare_timestamp = timestamps[1]
-        diff_data = {}
+
+        index = path_index.get_cached_index('diffs', self.kwargs['timestamp'])
+        if index is not None:
+            return index
 
         try:
             # retrieve all lun paths from lun tool results
             self.keystone_api.do_setup(self.request)
             self.barbican_api.do_setup(self.keystone_api.get_session())
 
-            results = self.barbican_api.get_lun_tool_results()
-
-            # grab the query results that match the base and compare timestamps
-            found_results = 0
-            for result in results:
-                if result['timestamp'] == base_timestamp:
-                    base_result = result
-                    found_results += 1
-                elif result['timestamp'] == compare_timestamp:
-                    compare_result = result
-                    found_results += 1
-                if found_results > 1:
-                    break
-
-            # compare results
-            # fist check if any nova nodes have been added or removed
-            removed_nodes = self.find_new_nodes(compare_result['node_list'],
-                                                base_result['node_list'])
-
-            added_nodes = self.find_new_nodes(base_result['node_list'],
-                                              compare_result['node_list'])
-
-            # now check for added/removed paths within each nova node
-            modified_paths = []
-            for base_node in base_result['node_list']:
-                found_node = [d for d in compare_result['node_list']
-                              if d['node_name'] == base_node['node_name']]
-
-                if found_node:
-                    added_paths = self.find_new_paths(base_node['paths'],
-                                                      found_node[0]['paths'])
-                    removed_paths = self.find_new_paths(found_node[0]['paths'],
-                                                        base_node['paths'])
-                    if removed_paths:
-                        for removed_path in removed_paths:
-                            entry = {}
-                            entry['node_name'] = base_node['node_name']
-                            entry['old_path'] = removed_path
-                            entry['new_path'] = None
-                            modified_paths.append(entry)
-                    if added_paths:
-                        for added_path in added_paths:
-                            entry = {}
-                            entry['node_name'] = base_node['node_name']
-                            entry['old_path'] = None
-                            entry['new_path'] = added_path
-                            modified_paths.append(entry)
-
-            # check if any paths have been modified
-            for base_node in base_result['node_list']:
-                found_node = [d for d in compare_result['node_list']
-                              if d['node_name'] == base_node['node_name']]
-
-                if found_node:
-                    changed_paths = \
-                        self.find_changed_paths(base_node['node_name'],
-                                                base_node['paths'],
-                                                found_node[0]['paths'])
-
-                    if changed_paths:
-                        for changed_path in changed_paths:
-                            modified_paths.append(changed_path)
-
-            diff_data['removed_nodes'] = removed_nodes
-            diff_data['added_nodes'] = added_nodes
-            diff_data['modified_paths'] = modified_paths
+            diff_data = lun_tool_diffs.get_diff(self.barbican_api,
+                                                base_timestamp,
+                                                compare_timestamp)
+            index = path_index.RowIndex(
+                lun_tool_diffs.get_diff_rows(diff_data))
+            path_index.set_cached_index('diffs', self.kwargs['timestamp'],
+                                        index)
 
         except Exception as ex:
             redirect = self.get_redirect_url()
@@ -258,52 +205,119 @@ class DiffDetailView(tabs.TabView):
                               _('Unable to retrieve volume paths.'),
                               redirect=redirect)
 
-        return diff_data
+        return index
 
-    def find_new_nodes(self, old_node_list, new_node_list):
-        new_nodes = []
-        for node in new_node_list:
-            found_node = [d for d in old_node_list
-                          if d['node_name'] == node['node_name']]
+    def get_redirect_url(self):
+        return reverse('horizon:admin:hpe_storage:index')
 
-            if not found_node:
-                new_nodes.append(node)
+    def get_tabs(self, request, *args, **kwargs):
+        index = self.get_data()
+        return self.tab_group_class(request, diff_index=index, **kwargs)
 
-        return new_nodes
 
-    def find_new_paths(self, old_path_list, new_path_list):
-        new_paths = []
-        for path in new_path_list:
-            found_path = [d for d in old_path_list
-                          if d['path'] == path['path']]
+class VolumePathsView(tables.DataTableView):
+    table_class = v_tables.VolumeLookupTable
+    template_name = 'lun_tool/volume_paths.html'
+    page_title = _("Volume Paths for Volume: {{ volume_id }}")
+    keystone_api = lazy.LazyAPI(keystone.KeystoneAPI)
+    barbican_api = lazy.LazyAPI(barbican.BarbicanAPI)
 
-            if not found_path:
-                new_paths.append(path)
+    def get_context_data(self, **kwargs):
+        context = super(VolumePathsView, self).get_context_data(**kwargs)
+        context['volume_id'] = self.kwargs['volume_id']
+        context['timestamp'] = self.kwargs['timestamp']
+        return context
 
-        return new_paths
+    def get_data(self):
+        rows = []
+        try:
+            self.keystone_api.do_setup(self.request)
+            self.barbican_api.do_setup(self.keystone_api.get_session())
+            volume_index = path_index.get_volume_index(
+                self.barbican_api, self.kwargs['timestamp'])
+            rows = path_index.get_volume_path_rows(volume_index,
+                                                   self.kwargs['volume_id'])
+        except Exception:
+            redirect = reverse('horizon:admin:hpe_storage:index')
+            exceptions.handle(self.request,
+                              _('Unable to retrieve volume paths.'),
+                              redirect=redirect)
+        return rows
 
-    def find_changed_paths(self, node_name, old_path_list, new_path_list):
-        changed_paths = []
-        for path in new_path_list:
-            found_path = [d for d in old_path_list
-                          if d['path'] == path['path']]
 
-            if found_path:
-                found_path_entry = found_path[0]
-                if found_path_entry['path'] != path['path'] or \
-                    found_path_entry['vol_name'] != path['vol_name'] or \
-                        found_path_entry['vol_id'] != path['vol_id']:
-                    changed_path = {}
-                    changed_path['node_name'] = node_name
-                    changed_path['new_path'] = path
-                    changed_path['old_path'] = found_path_entry
-                    changed_paths.append(changed_path)
+class ExportView(generic.View):
+    keystone_api = lazy.LazyAPI(keystone.KeystoneAPI)
+    barbican_api = lazy.LazyAPI(barbican.BarbicanAPI)
 
-        return changed_paths
+    def get_rows(self):
+        raise NotImplementedError
 
-    def get_redirect_url(self):
-        return reverse('horizon:admin:hpe_storage:index')
+    def get_columns(self):
+        raise NotImplementedError
 
-    def get_tabs(self, request, *args, **kwargs):
-        diff_data = self.get_data()
-        return self.tab_group_class(request, diff_data=diff_data, **kwargs)
+    def get_file_name(self):
+        raise NotImplementedError
+
+    def get(self, request, *args, **kwargs):
+        export_format = self.kwargs['export_format']
+        if export_format not in export.FORMATTERS:
+            raise Http404
+        try:
+            self.keystone_api.do_setup(request)
+            self.barbican_api.do_setup(self.keystone_api.get_session())
+            # read the first row here, so a result that can't be read is
+            # reported rather than ending the download early
+            rows = iter(self.get_rows())
+            first_row = next(rows, None)
+            if first_row is not None:
+                rows = itertools.chain([first_row], rows)
+        except Exception as ex:
+            redirect = reverse('horizon:admin:hpe_storage:index')
+            exceptions.handle(request,
+                              _('Unable to export volume paths.'),
+                              redirect=redirect)
+
+        # rows are formatted and sent as they are read, rather than
+        # building the whole file first
+        formatter = export.FORMATTERS[export_format]
+        response = StreamingHttpResponse(
+            formatter(rows, self.get_columns()),
+            content_type=export.CONTENT_TYPES[export_format])
+        file_name = self.get_file_name().replace(' ', '_').replace(':', '-')
+        response['Content-Disposition'] = \
+            'attachment; filename="%s.%s"' % (file_name, export_format)
+        return response
+
+
+class ExportPathsView(ExportView):
+    def get_rows(self):
+        timestamp = self.kwargs['timestamp']
+        store = result_store.get_result_store(self.barbican_api)
+        if timestamp not in [result['timestamp'] for result in
+                             store.get_lun_tool_history()]:
+            raise ValueError('No volume path query result from ' +
+                             timestamp)
+        nodes = store.iter_lun_tool_result_nodes(timestamp)
+        return export.iter_path_rows(nodes)
+
+    def get_columns(self):
+        return export.PATH_COLUMNS
+
+    def get_file_name(self):
+        return 'volume-paths-' + self.kwargs['timestamp']
+
+
+class ExportDiffsView(ExportView):
+    def get_rows(self):
+        timestamps = self.kwargs['timestamp'].split("::")
+        diff_data = lun_tool_diffs.get_diff(self.barbican_api,
+                                            timestamps[0],
+                                            timestamps[1])
+        return export.iter_diff_rows(diff_data)
+
+    def get_columns(self):
+        return export.DIFF_COLUMNS
+
+    def get_file_name(self):
+        return 'volume-path-changes-' + \
+            self.kwargs['timestamp'].replace('::', '--')
@@ -12,22 +12,57 @@
 #    See the License for the specific language governing permissions and
 #    limitations under the License.
 
+from django.core.urlresolvers import reverse
 from django.utils.translation import ugettext_lazy as _
 
 from horizon import forms
 from horizon import tables
 
 
+# fields, and labels, that the server side sorting can be applied to
+SORT_FIELDS = (('node_name', _('Nova Node')),
+               ('vol_name', _('Volume Name')),
+               ('vol_id', _('Volume ID')),
+               ('path', _('Volume Path')))
+
+
 class PathsFilterAction(tables.FilterAction):
+    # filtered server side against the indexed query results, matching
+    # the start of each value
+    filter_type = "server"
+    filter_choices = (('node_name', _("Nova Node"), True),
+                      ('vol_name', _("Volume Name"), True),
+                      ('vol_id', _("Volume ID"), True),
+                      ('path', _("Volume Path"), True))
+
+
+class RowIndexPaginationMixin(object):
+    # rows carry their position in the sorted and filtered results, which
+    # is used as the pagination marker
+    def get_pagination_string(self):
+        return "=".join([self._meta.pagination_param,
+                         str(self.data[-1]['row_index'] + 1)])
 
-    def filter(self, table, paths, filter_string):
-        """Naive case-insensitive search."""
-        q = filter_string.lower()
-        return [path for path in paths
-                if q in path.node_name.lower()]
+    def get_prev_pagination_string(self):
+        return "=".join([self._meta.prev_pagination_param,
+                         str(self.data[0]['row_index'])])
 
 
-class VolumePathsTable(tables.DataTable):
+class VolumeIDColumn(tables.Column):
+    # links to every path seen for the volume in the same query result
+    def __init__(self, *args, **kwargs):
+        kwargs['link'] = "horizon:admin:hpe_storage:lun_tool:volume_paths"
+        super(VolumeIDColumn, self).__init__(*args, **kwargs)
+
+    def get_link_url(self, datum):
+        vol_id = datum.get('vol_id')
+        if not vol_id:
+            return None
+        return reverse(self.link,
+                       args=(self.table.kwargs['timestamp'], vol_id))
+
+
+class VolumePathsTable(RowIndexPaginationMixin, tables.DataTable):
     node = tables.Column(
         'node_name',
         verbose_name=_('Nova Node'),
@@ -40,7 +75,7 @@ class VolumePathsTable(tables.DataTable):
         'vol_name',
         verbose_name=_('Attached Volume Name'),
         form_field=forms.CharField(max_length=64))
-    vol_id = tables.Column(
+    vol_id = VolumeIDColumn(
         'vol_id',
         verbose_name=_('Attached Volume ID'),
         form_field=forms.CharField(max_length=64))
@@ -53,3 +88,44 @@ class VolumePathsTable(tables.DataTable):
 
     def get_object_id(self, datum):
         return datum.get('path', id(datum))
+
+
+class VolumeLookupTable(tables.DataTable):
+    node = tables.Column(
+        'node_name',
+        verbose_name=_('Nova Node'))
+    path = tables.Column(
+        'path',
+        verbose_name=_('Volume Path'))
+    vol_name = tables.Column(
+        'vol_name',
+        verbose_name=_('Attached Volume Name'))
+
+    class Meta(object):
+        name = "volume_paths"
+        verbose_name = _("Nova Nodes and Paths")
+
+    def get_object_id(self, datum):
+        return datum['node_name'] + ':' + datum['path']
+
+
+class StalePathsTable(tables.DataTable):
+    node = tables.Column(
+        'node_name',
+        verbose_name=_('Nova Node'))
+    path = tables.Column(
+        'path',
+        verbose_name=_('Volume Path'))
+    vol_name = tables.Column(
+        'vol_name',
+        verbose_name=_('Deleted Volume Name'))
+    vol_id = VolumeIDColumn(
+        'vol_id',
+        verbose_name=_('Deleted Volume ID'))
+
+    class Meta(object):
+        name = "stale_paths"
+        verbose_name = _("Paths to Deleted Volumes")
+
+    def get_object_id(self, datum):
+        return datum['node_name'] + ':' + datum['path']
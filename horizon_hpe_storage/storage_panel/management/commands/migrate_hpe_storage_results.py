@@ -0,0 +1,95 @@
+# (c) Copyright [2015] Hewlett Packard Enterprise Development LP
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+import horizon_hpe_storage.api.barbican_api as barbican
+import horizon_hpe_storage.api.result_store as result_store
+from horizon_hpe_storage.storage_panel.management import keystone_auth
+
+
+class Command(BaseCommand):
+    help = ("Copies volume path query results, node test statuses and "
+            "software tests between the barbican and sqlite result "
+            "stores. Credentials always stay in barbican.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='source', default='barbican',
+                            choices=('barbican', 'sqlite'),
+                            help="backend to copy results from")
+        parser.add_argument('--to', dest='target', default='sqlite',
+                            choices=('barbican', 'sqlite'),
+                            help="backend to copy results to")
+        parser.add_argument('--db-path',
+                            help="sqlite database to use, instead of "
+                                 "HPE_STORAGE_RESULT_DB_PATH")
+        parser.add_argument('--delete-source', action='store_true',
+                            help="remove each result from the source once "
+                                 "it has been copied")
+        keystone_auth.add_arguments(parser)
+
+    def get_store(self, backend, options):
+        if backend == 'sqlite':
+            return result_store.get_sqlite_store(options['db_path'])
+
+        barbican_api = barbican.BarbicanAPI()
+        barbican_api.do_setup(keystone_auth.get_session(options))
+        return barbican_api
+
+    def handle(self, *args, **options):
+        if options['source'] == options['target']:
+            raise CommandError("--from and --to must be different backends")
+
+        source = self.get_store(options['source'], options)
+        target = self.get_store(options['target'], options)
+
+        for node_type in (barbican.CINDER_NODE_TYPE,
+                          barbican.NOVA_NODE_TYPE):
+            # read without seeding the source with the default tests
+            tests = source.get_software_tests(node_type, seed=False)
+            if tests is None:
+                self.stdout.write("No %s software tests to copy" %
+                                  node_type)
+            else:
+                target.set_software_tests(node_type, tests)
+                self.stdout.write("Copied %d %s software tests" %
+                                  (len(tests), node_type))
+
+            statuses = source.get_node_statuses(node_type)
+            for node_name, status in statuses.items():
+                target.set_node_status(node_type, node_name, status)
+                if options['delete_source']:
+                    source.delete_node_status(node_type, node_name)
+            self.stdout.write("Copied %d %s node statuses" %
+                              (len(statuses), node_type))
+
+        # oldest first, so the target's retention policy keeps the newest
+        stored = set(summary['timestamp']
+                     for summary in target.get_lun_tool_history())
+        for summary in source.get_lun_tool_history():
+            timestamp = summary['timestamp']
+            if timestamp in stored:
+                self.stdout.write("Skipped result %s, already copied" %
+                                  timestamp)
+            else:
+                node_list = list(source.iter_lun_tool_result_nodes(timestamp))
+                target.add_lun_tool_result(
+                    timestamp, node_list,
+                    volume_index=source.get_lun_tool_volume_index(timestamp))
+                self.stdout.write("Copied result %s (%d nodes)" %
+                                  (timestamp, len(node_list)))
+
+            if options['delete_source']:
+                source.delete_lun_tool_result(timestamp)
@@ -0,0 +1,52 @@
+# (c) Copyright [2015] Hewlett Packard Enterprise Development LP
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from horizon_hpe_storage.storage_panel.diags import scheduler
+from horizon_hpe_storage.storage_panel.management import keystone_auth
+
+
+class Command(BaseCommand):
+    help = ("Runs the diagnostic tests on every registered node each "
+            "interval, using the given service credentials. Run it "
+            "alongside Horizon, sharing Horizon's Django cache so the "
+            "panel shows the results of the last run.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=int,
+                            default=scheduler.INTERVAL,
+                            help="seconds between runs, instead of "
+                                 "HPE_STORAGE_DIAG_SCHEDULE_INTERVAL")
+        keystone_auth.add_arguments(parser)
+
+    def handle(self, *args, **options):
+        if not options['interval']:
+            raise CommandError("Set --interval or "
+                               "HPE_STORAGE_DIAG_SCHEDULE_INTERVAL")
+
+        diag_scheduler = scheduler.DiagScheduler(
+            options['interval'], keystone_auth.get_session(options))
+        self.stdout.write("Running node diagnostics every %d seconds" %
+                          options['interval'])
+        diag_scheduler.start()
+        try:
+            # wake up now and then so Ctrl-C is seen
+            while diag_scheduler.is_alive():
+                diag_scheduler.join(scheduler.POLL_INTERVAL)
+        except KeyboardInterrupt:
+            diag_scheduler.stop()
+            diag_scheduler.join()
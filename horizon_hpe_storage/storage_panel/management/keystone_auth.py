@@ -0,0 +1,57 @@
+# (c) Copyright [2015] Hewlett Packard Enterprise Development LP
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+
+"""Keystone credentials for the panel's management commands."""
+
+from django.core.management.base import CommandError
+
+from keystoneauth1.identity import generic
+from keystoneauth1 import session as k_session
+
+import os
+
+
+def add_arguments(parser):
+    parser.add_argument('--os-auth-url',
+                        default=os.environ.get('OS_AUTH_URL'))
+    parser.add_argument('--os-username',
+                        default=os.environ.get('OS_USERNAME'))
+    parser.add_argument('--os-password',
+                        default=os.environ.get('OS_PASSWORD'))
+    parser.add_argument('--os-project-name',
+                        default=os.environ.get('OS_PROJECT_NAME', 'admin'))
+    parser.add_argument('--os-user-domain-name',
+                        default=os.environ.get('OS_USER_DOMAIN_NAME',
+                                               'Default'))
+    parser.add_argument('--os-project-domain-name',
+                        default=os.environ.get('OS_PROJECT_DOMAIN_NAME',
+                                               'Default'))
+
+
+def get_session(options):
+    # the session fetches a new token whenever the current one expires
+    if not (options['os_auth_url'] and options['os_username'] and
+            options['os_password']):
+        raise CommandError("Keystone credentials are needed to reach "
+                           "barbican - set --os-auth-url, --os-username "
+                           "and --os-password (or OS_* variables)")
+    auth = generic.Password(
+        auth_url=options['os_auth_url'],
+        username=options['os_username'],
+        password=options['os_password'],
+        project_name=options['os_project_name'],
+        user_domain_name=options['os_user_domain_name'],
+        project_domain_name=options['os_project_domain_name'])
+    return k_session.Session(auth=auth)
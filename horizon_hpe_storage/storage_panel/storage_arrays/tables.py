@@ -23,6 +23,7 @@ from horizon import tables
 
 import horizon_hpe_storage.api.keystone_api as keystone
 import horizon_hpe_storage.api.barbican_api as barbican
+from horizon_hpe_storage.api.common import lazy
 
 
 class LicenseLink(tables.LinkAction):
@@ -58,8 +59,8 @@ class RunDiscoveryAction(tables.LinkAction):
     verbose_name = _("Discover Storage Arrays")
     url = "horizon:admin:hpe_storage:storage_arrays:discover_arrays"
     classes = ("ajax-modal",)
-    keystone_api = keystone.KeystoneAPI()
-    barbican_api = barbican.BarbicanAPI()
+    keystone_api = lazy.LazyAPI(keystone.KeystoneAPI)
+    barbican_api = lazy.LazyAPI(barbican.BarbicanAPI)
 
     def allowed(self, request, node=None):
         self.keystone_api.do_setup(request)
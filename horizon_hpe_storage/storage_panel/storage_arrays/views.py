@@ -30,6 +30,7 @@ from horizon_hpe_storage.storage_panel.diags import forms as diag_forms
 
 import horizon_hpe_storage.api.keystone_api as keystone
 import horizon_hpe_storage.api.barbican_api as barbican
+from horizon_hpe_storage.api.common import lazy
 import horizon_hpe_storage.api.cinder_api as local_cinder
 
 from openstack_dashboard.api import cinder
@@ -180,8 +181,8 @@ class LicenseDetailView(tabs.TabView):
     tab_group_class = array_tabs.SystemDetailTabs
     template_name = 'horizon/common/_detail.html'
     page_title = "{{ system_name }}"
-    keystone_api = keystone.KeystoneAPI()
-    barbican_api = barbican.BarbicanAPI()
+    keystone_api = lazy.LazyAPI(keystone.KeystoneAPI)
+    barbican_api = lazy.LazyAPI(barbican.BarbicanAPI)
 
     def get_context_data(self, **kwargs):
         context = super(LicenseDetailView, self).get_context_data(**kwargs)
@@ -286,8 +287,8 @@ class SystemDetailView(tabs.TabView):
     tab_group_class = array_tabs.SystemDetailTabs
     template_name = 'horizon/common/_detail.html'
     page_title = "{{ system_info.name }}"
-    keystone_api = keystone.KeystoneAPI()
-    barbican_api = barbican.BarbicanAPI()
+    keystone_api = lazy.LazyAPI(keystone.KeystoneAPI)
+    barbican_api = lazy.LazyAPI(barbican.BarbicanAPI)
 
     def get_context_data(self, **kwargs):
         context = super(SystemDetailView, self).get_context_data(**kwargs)
@@ -24,6 +24,7 @@ from horizon_hpe_storage.storage_panel.config \
     import tables as config_tables
 from horizon_hpe_storage.storage_panel.diags \
     import tables as diags_tables
+from horizon_hpe_storage.storage_panel.diags import scheduler
 from horizon_hpe_storage.storage_panel.storage_arrays \
     import tables as arrays_tables
 from horizon_hpe_storage.storage_panel.lun_tool \
@@ -32,6 +33,8 @@ from horizon_hpe_storage.storage_panel.lun_tool \
 
 import horizon_hpe_storage.api.keystone_api as keystone
 import horizon_hpe_storage.api.barbican_api as barbican
+from horizon_hpe_storage.api.common import lazy
+import horizon_hpe_storage.api.result_store as result_store
 
 
 class ConfigTab(tabs.TableTab):
@@ -41,8 +44,8 @@ class ConfigTab(tabs.TableTab):
     name = _("Configuration")
     slug = "config_tab"
     template_name = "config/config_tables.html"
-    keystone_api = keystone.KeystoneAPI()
-    barbican_api = barbican.BarbicanAPI()
+    keystone_api = lazy.LazyAPI(keystone.KeystoneAPI)
+    barbican_api = lazy.LazyAPI(barbican.BarbicanAPI)
 
     def get_endpoints_data(self):
         endpoints = []
@@ -100,8 +103,8 @@ class DiagsTab(tabs.TableTab):
     name = _("Diagnostic Tests")
     slug = "diags_tab"
     template_name = "diags/diag_tables.html"
-    keystone_api = keystone.KeystoneAPI()
-    barbican_api = barbican.BarbicanAPI()
+    keystone_api = lazy.LazyAPI(keystone.KeystoneAPI)
+    barbican_api = lazy.LazyAPI(barbican.BarbicanAPI)
 
     def get_diag_cinder_nodes_data(self):
         sorted_nodes = []
@@ -133,14 +136,19 @@ class DiagsTab(tabs.TableTab):
             exceptions.handle(self.request, msg)
         return sorted_nodes
 
+    def get_context_data(self, request, **kwargs):
+        context = super(DiagsTab, self).get_context_data(request, **kwargs)
+        context['schedule_stats'] = scheduler.get_stats()
+        return context
+
 
 class ArraysTab(tabs.TableTab):
     table_classes = (arrays_tables.StorageArraysTable,)
     name = _("Storage Arrays")
     slug = "arrays_tab"
     template_name = "horizon/common/_detail_table.html"
-    keystone_api = keystone.KeystoneAPI()
-    barbican_api = barbican.BarbicanAPI()
+    keystone_api = lazy.LazyAPI(keystone.KeystoneAPI)
+    barbican_api = lazy.LazyAPI(barbican.BarbicanAPI)
 
     def get_storage_arrays_data(self):
         storage_arrays = []
@@ -246,8 +254,8 @@ class LunToolTab(tabs.TableTab):
     slug = "lun_tool_tab"
     template_name = "horizon/common/_detail_table.html"
     table_classes = (lun_tool_tables.LunToolTable,)
-    keystone_api = keystone.KeystoneAPI()
-    barbican_api = barbican.BarbicanAPI()
+    keystone_api = lazy.LazyAPI(keystone.KeystoneAPI)
+    barbican_api = lazy.LazyAPI(barbican.BarbicanAPI)
 
     def get_lun_volume_paths_data(self):
         sorted_results = []
@@ -256,9 +264,15 @@ class LunToolTab(tabs.TableTab):
         try:
             self.keystone_api.do_setup(self.request)
             self.barbican_api.do_setup(self.keystone_api.get_session())
-            results = self.barbican_api.get_lun_tool_results()
+            store = result_store.get_result_store(self.barbican_api)
+            results = store.get_lun_tool_history()
             sorted_results = sorted(results, key=itemgetter('timestamp'))
 
+            # link each result to the changes since the one before it
+            for idx in range(1, len(sorted_results)):
+                sorted_results[idx]['prev_timestamp'] = \
+                    sorted_results[idx - 1]['timestamp']
+
         except Exception as ex:
             msg = _('Unable to retrieve Volume Path Tool results.')
             exceptions.handle(self.request, msg)
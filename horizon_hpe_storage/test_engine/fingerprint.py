@@ -0,0 +1,72 @@
+# (c) Copyright [2015] Hewlett Packard Enterprise Development LP
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+import hashlib
+import json
+import pipes
+
+import horizon_hpe_storage.test_engine.node_test as tester
+
+# installed versions of the packages being tested, from whichever
+# package manager the node has, plus anything installed with pip
+PACKAGE_QUERY = "(dpkg-query -W -f='${Package} ${Version}\\n' %(pkgs)s || " \
+                "rpm -q %(pkgs)s) 2>/dev/null; pip freeze 2>/dev/null"
+
+
+def get_config_fingerprint(node, software_tests, node_test):
+    """Returns a hash of a cinder node's configuration.
+
+    This covers the modification time and contents of the cinder config
+    file, the installed package versions, and the software tests being
+    run, and is collected with a single SSH command, under node_test's
+    deadlines. If it matches the fingerprint from the last test run, the
+    node's test results can't have changed.
+    """
+    conf_file = pipes.quote(node['config_path'])
+    packages = sorted([test['package'] for test in software_tests])
+    command = "stat -c %%Y %s; md5sum %s; " % (conf_file, conf_file)
+    if packages:
+        command += PACKAGE_QUERY % {
+            'pkgs': ' '.join([pipes.quote(pkg) for pkg in packages])}
+
+    # only import cinderdiags (and paramiko) once a node is tested
+    from cinderdiags import ssh_client
+
+    clients = []
+
+    def execute():
+        client = ssh_client.Client(node['node_ip'], node['ssh_name'],
+                                   node['ssh_pwd'])
+        clients.append(client)
+        try:
+            return client.execute(command)
+        finally:
+            client.disconnect()
+
+    try:
+        response = node_test.run_call('config-fingerprint', execute)
+    except (tester.NodeTestTimeout, tester.NodeTestCancelled):
+        # closing the connection ends the command left running
+        for client in clients:
+            client.disconnect()
+        raise
+
+    if not response:
+        return None
+
+    fingerprint = hashlib.sha1(response)
+    fingerprint.update(json.dumps(sorted(
+        [(test['package'], test['min_version'])
+         for test in software_tests])))
+    return fingerprint.hexdigest()
@@ -0,0 +1,256 @@
+# (c) Copyright [2015] Hewlett Packard Enterprise Development LP
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+from django.conf import settings
+
+from cinderdiags import pkg_checks
+from cinderdiags import ssh_client
+
+import hashlib
+import json
+import logging
+import tempfile
+import threading
+import time
+
+from horizon_hpe_storage import profiler
+from horizon_hpe_storage.test_engine import node_test
+
+LOG = logging.getLogger(__name__)
+
+# seconds an unused SSH session is kept open in the pool
+SSH_IDLE_TIMEOUT = getattr(settings, 'HPE_STORAGE_SSH_POOL_IDLE_TIMEOUT',
+                           300)
+
+
+class SSHSession(object):
+    def __init__(self, section):
+        self.client = ssh_client.Client(section['host_ip'],
+                                        section['ssh_user'],
+                                        section['ssh_password'])
+        # package check function for the node's OS, looked up once
+        self.check_type = None
+        self.last_used = time.time()
+
+    def is_active(self):
+        try:
+            transport = self.client.client.get_transport()
+        except Exception:
+            # never connected, or already closed
+            return False
+        return transport is not None and transport.is_active()
+
+
+class SSHSessionPool(object):
+    """Open SSH sessions, shared by the tests run on each node."""
+
+    def __init__(self, idle_timeout=SSH_IDLE_TIMEOUT):
+        self.idle_timeout = idle_timeout
+        self.sessions = {}
+        self.lock = threading.Lock()
+
+    def _get_key(self, section):
+        # a change of credentials needs a new session
+        password_hash = hashlib.sha1(section['ssh_password']).hexdigest()
+        return (section['host_ip'], section['ssh_user'], password_hash)
+
+    def _close_idle(self):
+        now = time.time()
+        for key, session in self.sessions.items():
+            if now - session.last_used > self.idle_timeout:
+                self._close(key)
+
+    def _close(self, key):
+        session = self.sessions.pop(key, None)
+        if session:
+            try:
+                session.client.disconnect()
+            except Exception as ex:
+                LOG.info("Unable to close SSH session - %s" % ex)
+
+    def get(self, section):
+        key = self._get_key(section)
+        with self.lock:
+            self._close_idle()
+            session = self.sessions.get(key)
+            if session and not session.is_active():
+                self._close(key)
+                session = None
+        if session is None:
+            # connect outside the lock, so one slow host doesn't hold up
+            # tests on the others
+            session = SSHSession(section)
+            with self.lock:
+                self.sessions[key] = session
+        session.last_used = time.time()
+        return session
+
+    def discard(self, section):
+        with self.lock:
+            self._close(self._get_key(section))
+
+    def close_all(self):
+        with self.lock:
+            for key in self.sessions.keys():
+                self._close(key)
+
+
+_pool = SSHSessionPool()
+
+
+class InProcessNodeTest(node_test.NodeTest):
+    """Runs checks with cinderdiags as a library instead of a process.
+
+    The SSH credential and software checks are run in-process, over SSH
+    sessions kept open between tests. The options and volume path checks
+    still run the cinderdiags command.
+
+    Each connection and package check runs under the test's deadlines,
+    on a thread that is left to finish on its own if the test times out
+    or is cancelled first, as a remote command can't be interrupted part
+    way through.
+    """
+
+    def __init__(self, pool=None, **kwargs):
+        super(InProcessNodeTest, self).__init__(**kwargs)
+        self.pool = pool or _pool
+
+    def _begin(self, command):
+        self.errors_occurred = False
+        self.error_text = ''
+        self.error_lines = []
+        self.timed_out = False
+        self.close_output()
+        self.output = tempfile.SpooledTemporaryFile(
+            max_size=node_test.OUTPUT_MEMORY_LIMIT)
+        if self.cancelled.is_set():
+            raise node_test.NodeTestCancelled(
+                "cinderdiags %s cancelled" % command)
+        self.deadline = min(time.time() + self.phase_timeout,
+                            self.node_deadline)
+
+    def _check_deadline(self, command):
+        if self.cancelled.is_set():
+            raise node_test.NodeTestCancelled(
+                "cinderdiags %s cancelled" % command)
+        if time.time() >= self.deadline:
+            self.timed_out = True
+            raise node_test.NodeTestTimeout(
+                "cinderdiags %s timed out" % command)
+
+    def _iter_records(self, command, records):
+        # records are kept as the JSON output cinderdiags would give
+        timer = profiler.Timer('cinderdiags', command).start()
+        self._begin(command)
+        output = []
+        try:
+            for record in records:
+                output.append(record)
+                yield record
+                self._check_deadline(command)
+        finally:
+            self.output.write(json.dumps(output))
+            self.error_text = ''.join(self.error_lines)
+            timer.stop()
+
+    def _error(self, section, ex):
+        self.errors_occurred = True
+        self.error_lines.append("%s: %s failed - %s\n" %
+                                (section['section'], section['host_ip'], ex))
+
+    def _credentials_records(self, sections):
+        for section in sections:
+            try:
+                self._call('ssh-connect', self.pool.get, section)
+                result = 'pass'
+            except (node_test.NodeTestTimeout, node_test.NodeTestCancelled):
+                raise
+            except Exception as ex:
+                self._error(section, ex)
+                result = 'fail'
+            yield {'Node': section['section'], 'Connect': result}
+
+    def _check_package(self, session, node, pkg_info):
+        # same as cinderdiags pkg_checks.check_one, but with the OS type
+        # looked up only once per session
+        if session.check_type is None:
+            session.check_type = pkg_checks.get_check_type(session.client,
+                                                           node)
+        if session.check_type is None:
+            return {'node': node, 'name': pkg_info[0],
+                    'installed': 'ERROR', 'version': 'ERROR'}
+
+        check = session.check_type(session.client, node, pkg_info)
+        if check['installed'] == 'unknown':
+            check = pkg_checks.pip_check(session.client, node, pkg_info)
+        return check
+
+    def _software_records(self, sections, software_test_data):
+        packages = []
+        for pkg_data in json.loads(software_test_data):
+            packages.extend(pkg_data.items())
+
+        for section in sections:
+            node = section['section']
+            try:
+                session = self._call('ssh-connect', self.pool.get, section)
+            except (node_test.NodeTestTimeout, node_test.NodeTestCancelled):
+                raise
+            except Exception as ex:
+                self._error(section, ex)
+                session = None
+
+            for pkg_info in packages:
+                check = None
+                if session is not None:
+                    try:
+                        check = self._call('package-check',
+                                           self._check_package, session,
+                                           node, pkg_info)
+                    except (node_test.NodeTestTimeout,
+                            node_test.NodeTestCancelled):
+                        # still part way through a command, so the
+                        # session can't be used by another test
+                        self.pool.discard(section)
+                        raise
+                    except Exception as ex:
+                        self._error(section, ex)
+                        if not session.is_active():
+                            # the connection failed, not just the check
+                            self.pool.discard(section)
+                            session = None
+                if check is None:
+                    check = {'node': node, 'name': pkg_info[0],
+                             'installed': 'ERROR', 'version': 'ERROR'}
+                yield {'Node': check['node'],
+                       'Software': check['name'],
+                       'Installed': check['installed'],
+                       'Version': check['version']}
+
+    def run_credentials_check_test(self, conf_data):
+        for record in self._iter_records(
+                'ssh-credentials-check',
+                self._credentials_records(json.loads(conf_data))):
+            pass
+
+    def run_software_check_test(self, conf_data, software_test_data):
+        for record in self.iter_software_check_test(conf_data,
+                                                    software_test_data):
+            pass
+
+    def iter_software_check_test(self, conf_data, software_test_data):
+        return self._iter_records(
+            'software-check',
+            self._software_records(json.loads(conf_data),
+                                   software_test_data))
@@ -0,0 +1,155 @@
+# (c) Copyright [2015] Hewlett Packard Enterprise Development LP
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+from threading import Lock, Thread
+
+import errno
+import logging
+import os
+import select
+
+LOG = logging.getLogger(__name__)
+
+# bytes read from a stream each time it is ready
+READ_SIZE = 65536
+READ_EVENTS = select.POLLIN | select.POLLPRI | select.POLLHUP | \
+    select.POLLERR | select.POLLNVAL
+
+
+class _Reader(object):
+    # splits the data read from one stream into lines for its callback
+    def __init__(self, stream, on_line, on_close):
+        self.stream = stream
+        self.fd = stream.fileno()
+        self.on_line = on_line
+        self.on_close = on_close
+        self.buffer = ''
+
+    def feed(self, data):
+        lines = (self.buffer + data).split('\n')
+        self.buffer = lines.pop()
+        for line in lines:
+            self.on_line(line + '\n')
+
+    def close(self):
+        if self.buffer:
+            # last line had no newline
+            self.on_line(self.buffer)
+            self.buffer = ''
+        self.stream.close()
+        self.on_close()
+
+
+class StreamLoop(Thread):
+    """Reads the output streams of many child processes on one thread.
+
+    Streams are added with add_reader, and their lines are passed to a
+    callback as they arrive. Once a stream reaches EOF it is closed and
+    its on_close callback is called.
+    """
+
+    def __init__(self):
+        Thread.__init__(self, name='node-test-io')
+        self.daemon = True
+        self.pid = os.getpid()
+        self.lock = Lock()
+        self.readers = {}
+        # changes to the set of streams, applied by the loop thread
+        self.pending = []
+        self.poller = select.poll()
+        # written to so a poll() in progress picks up pending changes
+        self.wake_r, self.wake_w = os.pipe()
+        self.poller.register(self.wake_r, select.POLLIN)
+
+    def add_reader(self, stream, on_line, on_close):
+        """Starts reading a stream, and returns its reader."""
+        reader = _Reader(stream, on_line, on_close)
+        self._change(reader, True)
+        return reader
+
+    def remove_reader(self, reader):
+        # stops reading a stream that is not going to reach EOF,
+        # e.g. one held open by a process that was not killed
+        self._change(reader, False)
+
+    def _change(self, reader, add):
+        with self.lock:
+            self.pending.append((reader, add))
+        os.write(self.wake_w, 'x')
+
+    def _apply_pending(self):
+        with self.lock:
+            pending, self.pending = self.pending, []
+        for reader, add in pending:
+            if add:
+                self.readers[reader.fd] = reader
+                self.poller.register(reader.fd, READ_EVENTS)
+            elif self.readers.get(reader.fd) is reader:
+                # the fd may already belong to a newer stream
+                self._close(reader.fd)
+
+    def _close(self, fd):
+        reader = self.readers.pop(fd)
+        self.poller.unregister(fd)
+        try:
+            reader.close()
+        except Exception:
+            LOG.exception("Closing node test stream failed")
+
+    def _read(self, fd):
+        try:
+            data = os.read(fd, READ_SIZE)
+        except OSError as ex:
+            if ex.errno in (errno.EAGAIN, errno.EINTR):
+                return
+            data = ''
+        if not data:
+            self._close(fd)
+            return
+        try:
+            self.readers[fd].feed(data)
+        except Exception:
+            LOG.exception("Handling node test output failed")
+            self._close(fd)
+
+    def run(self):
+        while True:
+            try:
+                events = self.poller.poll()
+            except select.error as ex:
+                if ex.args[0] == errno.EINTR:
+                    continue
+                raise
+            for fd, event in events:
+                if fd == self.wake_r:
+                    os.read(self.wake_r, READ_SIZE)
+                    self._apply_pending()
+                elif fd in self.readers:
+                    self._read(fd)
+
+
+_loop = None
+_loop_lock = Lock()
+
+
+def get_loop():
+    """Returns the running StreamLoop for this process."""
+    global _loop
+    with _loop_lock:
+        # a worker forked from a process that had a loop needs its own
+        if _loop is None or _loop.pid != os.getpid() or \
+                not _loop.is_alive():
+            _loop = StreamLoop()
+            _loop.start()
+        return _loop
@@ -0,0 +1,146 @@
+# (c) Copyright [2015] Hewlett Packard Enterprise Development LP
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+import json
+import re
+
+# bytes read from the file at a time
+READ_SIZE = 65536
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = ' \t\r\n'
+# characters that can start or end an item, inside and outside of strings
+_SPECIAL = re.compile(r'["{}\[\],\s]')
+_STRING_SPECIAL = re.compile(r'["\\]')
+
+
+class _Reader(object):
+    def __init__(self, fileobj, read_size):
+        self.fileobj = fileobj
+        self.read_size = read_size
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        # drop what has been parsed, and append the next block
+        data = self.fileobj.read(self.read_size)
+        if not data:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def skip(self, chars):
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in chars:
+                self.pos += 1
+            if self.pos < len(self.buf) or not self.fill():
+                return
+
+    def scan_item(self):
+        """Reads until the buffer holds the whole item at pos.
+
+        The item is scanned once, keeping track of nesting and strings,
+        and the blocks read are joined once at the end, however many of
+        them the item is spread over.
+        """
+        depth = 0
+        in_string = False
+        escaped = False
+        block = self.buf
+        idx = self.pos
+        blocks = []
+        while True:
+            if escaped and idx < len(block):
+                # skip the escaped character
+                idx += 1
+                escaped = False
+            match = None
+            if idx < len(block):
+                if in_string:
+                    match = _STRING_SPECIAL.search(block, idx)
+                else:
+                    match = _SPECIAL.search(block, idx)
+
+            if match is None:
+                block = self.fileobj.read(self.read_size)
+                if not block:
+                    self.eof = True
+                    break
+                blocks.append(block)
+                idx = 0
+                continue
+
+            char = match.group()
+            idx = match.end()
+            if in_string:
+                if char == '"':
+                    in_string = False
+                    if depth == 0:
+                        break
+                else:
+                    escaped = True
+            elif char == '"':
+                in_string = True
+            elif char in '{[':
+                depth += 1
+            elif char in '}]':
+                depth -= 1
+                if depth <= 0:
+                    break
+            elif depth == 0:
+                # whitespace or a comma, ending a number or literal
+                break
+
+        if blocks:
+            self.buf = self.buf[self.pos:] + ''.join(blocks)
+            self.pos = 0
+
+    def peek(self):
+        self.skip(_WHITESPACE)
+        if self.pos < len(self.buf):
+            return self.buf[self.pos]
+        return None
+
+
+def iter_json_array(fileobj, read_size=READ_SIZE):
+    """Yields the items of a JSON array read from a file.
+
+    Only the item being parsed, plus one block of the file, is held in
+    memory at a time. An empty file yields nothing.
+    """
+    reader = _Reader(fileobj, read_size)
+    first = reader.peek()
+    if first is None:
+        return
+    if first != '[':
+        raise ValueError("Expected a JSON array")
+    reader.pos += 1
+
+    while True:
+        reader.skip(_WHITESPACE + ',')
+        char = reader.peek()
+        if char is None:
+            raise ValueError("Unterminated JSON array")
+        if char == ']':
+            return
+
+        # only decode once the whole item has been read, as decoding
+        # again after every block costs time quadratic in the item size
+        reader.scan_item()
+        item, end = _decoder.raw_decode(reader.buf, reader.pos)
+        reader.pos = end
+        yield item
@@ -12,133 +12,360 @@
 #    See the License for the specific language governing permissions and
 #    limitations under the License.
 
+from django.conf import settings
+
 from subprocess import Popen, PIPE
-from threading import Thread
+from threading import Event, Lock, Thread
 from Queue import Queue, Empty
 
+import os
+import signal
+import tempfile
 import time
 
+from horizon_hpe_storage import profiler
+from horizon_hpe_storage.test_engine import io_loop
+from horizon_hpe_storage.test_engine import json_stream
+
+# the cinderdiags command to run
+CINDERDIAGS_PATH = getattr(settings, 'HPE_STORAGE_CINDERDIAGS_PATH',
+                           'cinderdiags')
+# seconds allowed for each cinderdiags run, and for all the runs
+# against one node
+PHASE_TIMEOUT = getattr(settings, 'HPE_STORAGE_NODE_TEST_PHASE_TIMEOUT', 300)
+NODE_TIMEOUT = getattr(settings, 'HPE_STORAGE_NODE_TEST_TIMEOUT', 900)
+# how tests are run - 'subprocess' runs the cinderdiags command for every
+# check, 'inprocess' runs what it can with cinderdiags as a library
+ENGINE = getattr(settings, 'HPE_STORAGE_NODE_TEST_ENGINE', 'subprocess')
+# bytes of test output kept in memory before it is moved to a temp file
+OUTPUT_MEMORY_LIMIT = getattr(settings,
+                              'HPE_STORAGE_NODE_TEST_OUTPUT_MEMORY_LIMIT',
+                              1024 * 1024)
+# seconds to wait for the process group to exit after SIGTERM
+KILL_GRACE_PERIOD = 5
+# seconds to wait for the output streams to close once the process is done
+JOIN_TIMEOUT = 5
+
+
+class NodeTestTimeout(Exception):
+    pass
 
-class NodeTest():
-    io_q = None
+
+class NodeTestCancelled(Exception):
+    pass
+
+
+class NodeTest(object):
     proc = None
     errors_occurred = False
     error_text = ''
-    test_result_text = ''
-    stream_open = True
+    output = None
+    live_q = None
+    timed_out = False
 
-    def stream_watcher(self, identifier, stream):
-        for line in stream:
-            # block for 1 sec
-            self.io_q.put((identifier, line))
+    def __init__(self, executable=None, phase_timeout=None,
+                 node_timeout=None):
+        self.executable = executable or CINDERDIAGS_PATH
+        self.phase_timeout = phase_timeout or PHASE_TIMEOUT
+        node_timeout = node_timeout or NODE_TIMEOUT
+        self.node_deadline = time.time() + node_timeout
+        self.cancelled = Event()
+        self.proc_lock = Lock()
+        self.error_lines = []
+        self._result_text = None
+        self.streams_lock = Lock()
+        self.streams_done = Event()
+        self.open_streams = 0
 
-        if not stream.closed:
-            self.stream_open = False
-            stream.close()
+    # the stream callbacks are called on the shared io_loop thread, which
+    # reads the output of every running test in the process
 
-    def printer(self):
-        while True:
-            try:
-                item = self.io_q.get(True, 1)
-            except Empty:
-                # no output in either stream for 1 sec so check if we are done
-                if self.proc.poll() is not None:
-                    break
-            else:
-                identifier, line = item
-                if identifier is 'STDERR':
-                    test_line = line.lower()
-                    if 'failed' in test_line or 'error' in test_line:
-                        self.errors_occurred = True
-                        self.error_text += line
-                else:
-                    self.test_result_text += line
+    def stdout_line(self, line):
+        self.output.write(line)
+        if self.live_q is not None:
+            self.live_q.put(line)
 
-    def run_credentials_check_test(self, conf_data):
+    def stderr_line(self, line):
+        test_line = line.lower()
+        if 'failed' in test_line or 'error' in test_line:
+            self.errors_occurred = True
+            self.error_lines.append(line)
+
+    def stream_closed(self):
+        with self.streams_lock:
+            self.open_streams -= 1
+            if self.open_streams:
+                return
+        if self.live_q is not None:
+            self.live_q.put(None)
+        self.streams_done.set()
+
+    @property
+    def test_result_text(self):
+        # the whole of stdout from the last run, read in one go
+        if self._result_text is None:
+            if self.output is None:
+                return ''
+            self.output.seek(0)
+            self._result_text = self.output.read()
+        return self._result_text
+
+    def iter_results(self):
+        """Yields each record of the JSON array output by the last run.
+
+        The output is parsed as it is read back, rather than loading it
+        all as one string first.
+        """
+        if self.output is None:
+            return iter([])
+        self.output.seek(0)
+        return json_stream.iter_json_array(self.output)
+
+    def close_output(self):
+        if self.output is not None:
+            self.output.close()
+            self.output = None
+        self._result_text = None
+
+    def cancel(self):
+        """Stops the current run, and any later runs, of this test.
+
+        Safe to call from another thread, e.g. a job runner shutting down.
+        """
+        self.cancelled.set()
+        with self.proc_lock:
+            if self.proc:
+                self.kill()
+
+    def kill(self):
+        # cinderdiags runs in its own process group, so this also stops
+        # anything it started, such as ssh sessions
+        if self.proc.poll() is not None:
+            return
+        try:
+            os.killpg(self.proc.pid, signal.SIGTERM)
+            deadline = time.time() + KILL_GRACE_PERIOD
+            while self.proc.poll() is None and time.time() < deadline:
+                time.sleep(0.1)
+            if self.proc.poll() is None:
+                os.killpg(self.proc.pid, signal.SIGKILL)
+        except OSError:
+            # already gone
+            pass
+
+    def _start(self, command, args, verbose=True, live=False):
         self.errors_occurred = False
         self.error_text = ''
-        self.test_result_text = ''
-        self.io_q = Queue()
-        self.proc = Popen(['cinderdiags', 'ssh-credentials-check', '-f',
-                           'json', '-conf-data', conf_data],
-                          stdout=PIPE,
-                          stderr=PIPE)
-        Thread(target=self.stream_watcher, name='stdout-watcher',
-               args=('STDOUT', self.proc.stdout)).start()
-        Thread(target=self.stream_watcher, name='stderr-watcher',
-               args=('STDERR', self.proc.stderr)).start()
-        Thread(target=self.printer, name='printer').start()
-
-        done = False
-        while not done:
-            time.sleep(2)
-            if self.proc.stdout.closed and self.proc.stderr.closed:
-                done = True
+        self.error_lines = []
+        self.timed_out = False
+        # stdout lines are also passed on here as they arrive, if wanted
+        self.live_q = Queue() if live else None
+        # stdout is kept in memory up to the limit, then spills to disk
+        self.close_output()
+        self.output = tempfile.SpooledTemporaryFile(
+            max_size=OUTPUT_MEMORY_LIMIT)
+
+        if self.cancelled.is_set():
+            raise NodeTestCancelled("cinderdiags %s cancelled" % command)
+
+        self.deadline = min(time.time() + self.phase_timeout,
+                            self.node_deadline)
+        cmd = [self.executable]
+        if verbose:
+            cmd.append('-v')
+        cmd.append(command)
+        with self.proc_lock:
+            self.proc = Popen(cmd + args,
+                              stdout=PIPE,
+                              stderr=PIPE,
+                              preexec_fn=os.setsid)
+        self.streams_done.clear()
+        self.open_streams = 2
+        self.loop = io_loop.get_loop()
+        self.readers = [
+            self.loop.add_reader(self.proc.stdout, self.stdout_line,
+                                 self.stream_closed),
+            self.loop.add_reader(self.proc.stderr, self.stderr_line,
+                                 self.stream_closed)]
+
+    def _stop_if_due(self):
+        # kill the run if it has been cancelled or is past its deadline
+        if self.cancelled.is_set() or time.time() >= self.deadline:
+            self.timed_out = not self.cancelled.is_set()
+            with self.proc_lock:
+                self.kill()
+            return True
+        return False
+
+    def _finish(self, command):
+        self.proc.wait()
+        if not self.streams_done.wait(JOIN_TIMEOUT):
+            # something outside the process group still has the pipes
+            for reader in self.readers:
+                self.loop.remove_reader(reader)
+            self.streams_done.wait(JOIN_TIMEOUT)
+        self.error_text = ''.join(self.error_lines)
+
+        if self.cancelled.is_set():
+            raise NodeTestCancelled("cinderdiags %s cancelled" % command)
+        if self.timed_out:
+            raise NodeTestTimeout("cinderdiags %s timed out" % command)
+
+    def _wait(self):
+        # wait for the process to exit, unless it is stopped first
+        while self.proc.poll() is None:
+            if self._stop_if_due():
+                break
+            self.cancelled.wait(
+                min(0.1, max(self.deadline - time.time(), 0)))
+
+    def _run(self, command, args, verbose=True):
+        with profiler.Timer('cinderdiags', command):
+            self._start(command, args, verbose)
+            self._wait()
+            self._finish(command)
+
+    def _iter_run(self, command, args, verbose=True):
+        # parse records out of stdout while cinderdiags is still running
+        timer = profiler.Timer('cinderdiags', command).start()
+        self._start(command, args, verbose, live=True)
+        try:
+            for record in json_stream.iter_json_array(_LiveOutput(self)):
+                yield record
+            self._wait()
+        finally:
+            # only left running if the caller gave up early, or reading
+            # the output failed
+            with self.proc_lock:
+                if self.proc.poll() is None:
+                    self.kill()
+            try:
+                self._finish(command)
+            finally:
+                timer.stop()
+
+    def run_call(self, name, func, *args):
+        """Returns func(*args), run under this test's deadlines.
+
+        Used for checks made outside cinderdiags. func runs on its own
+        thread, which is left to finish on its own if the test is
+        cancelled or runs out of time first.
+        """
+        if self.cancelled.is_set():
+            raise NodeTestCancelled("%s cancelled" % name)
+        self.timed_out = False
+        self.deadline = min(time.time() + self.phase_timeout,
+                            self.node_deadline)
+        return self._call(name, func, *args)
+
+    def _call(self, name, func, *args):
+        # run_call, under the deadline already set for the current run
+        if self.cancelled.is_set():
+            raise NodeTestCancelled("%s cancelled" % name)
+        result = {}
+        done = Event()
+
+        def call():
+            try:
+                result['value'] = func(*args)
+            except Exception as ex:
+                result['error'] = ex
+            finally:
+                done.set()
+
+        with profiler.Timer('node_test', name):
+            thread = Thread(target=call, name='hpe-storage-' + name)
+            thread.daemon = True
+            thread.start()
+            while not done.wait(
+                    min(0.1, max(self.deadline - time.time(), 0))):
+                if self.cancelled.is_set():
+                    raise NodeTestCancelled("%s cancelled" % name)
+                if time.time() >= self.deadline:
+                    self.timed_out = True
+                    raise NodeTestTimeout("%s timed out" % name)
+
+        if 'error' in result:
+            raise result['error']
+        return result['value']
+
+    def run_credentials_check_test(self, conf_data):
+        self._run('ssh-credentials-check',
+                  ['-f', 'json', '-conf-data', conf_data],
+                  verbose=False)
 
     def run_options_check_test(self, conf_data):
-        self.errors_occurred = False
-        self.error_text = ''
-        self.test_result_text = ''
-        self.io_q = Queue()
-        self.proc = Popen(['cinderdiags', '-v', 'options-check', '-f',
-                           'json', '-conf-data', conf_data,
-                           '-incl-system-info',
-                           '-incl-replication-checks'],
-                          stdout=PIPE,
-                          stderr=PIPE)
-        Thread(target=self.stream_watcher, name='stdout-watcher',
-               args=('STDOUT', self.proc.stdout)).start()
-        Thread(target=self.stream_watcher, name='stderr-watcher',
-               args=('STDERR', self.proc.stderr)).start()
-        Thread(target=self.printer, name='printer').start()
-
-        done = False
-        while not done:
-            time.sleep(2)
-            if self.proc.stdout.closed and self.proc.stderr.closed:
-                done = True
+        self._run('options-check', self._options_args(conf_data))
+
+    def iter_options_check_test(self, conf_data):
+        return self._iter_run('options-check', self._options_args(conf_data))
+
+    def _options_args(self, conf_data):
+        return ['-f', 'json', '-conf-data', conf_data,
+                '-incl-system-info',
+                '-incl-replication-checks']
 
     def run_software_check_test(self, conf_data, software_test_data):
-        self.errors_occurred = False
-        self.error_text = ''
-        self.test_result_text = ''
-        self.io_q = Queue()
-        self.proc = Popen(['cinderdiags', '-v', 'software-check', '-f', 'json',
-                           '-conf-data', conf_data,
-                           '-software-pkgs', software_test_data],
-                          stdout=PIPE,
-                          stderr=PIPE)
-        Thread(target=self.stream_watcher, name='stdout-watcher',
-               args=('STDOUT', self.proc.stdout)).start()
-        Thread(target=self.stream_watcher, name='stderr-watcher',
-               args=('STDERR', self.proc.stderr)).start()
-        Thread(target=self.printer, name='printer').start()
-
-        done = False
-        while not done:
-            time.sleep(2)
-            if self.proc.stdout.closed and self.proc.stderr.closed:
-                done = True
+        self._run('software-check',
+                  self._software_args(conf_data, software_test_data))
+
+    def iter_software_check_test(self, conf_data, software_test_data):
+        return self._iter_run(
+            'software-check',
+            self._software_args(conf_data, software_test_data))
+
+    def _software_args(self, conf_data, software_test_data):
+        return ['-f', 'json', '-conf-data', conf_data,
+                '-software-pkgs', software_test_data]
 
     def run_volume_paths_test(self, conf_data, os_vars, attached_volumes):
-        self.errors_occurred = False
-        self.error_text = ''
-        self.test_result_text = ''
-        self.io_q = Queue()
-        self.proc = Popen(['cinderdiags', '-v', 'volume-paths-check', '-f',
-                           'json', '-conf-data', conf_data,
-                           '-os-vars', os_vars,
-                           '-attached-volumes', attached_volumes],
-                          stdout=PIPE,
-                          stderr=PIPE)
-        Thread(target=self.stream_watcher, name='stdout-watcher',
-               args=('STDOUT', self.proc.stdout)).start()
-        Thread(target=self.stream_watcher, name='stderr-watcher',
-               args=('STDERR', self.proc.stderr)).start()
-        Thread(target=self.printer, name='printer').start()
-
-        done = False
-        while not done:
-            time.sleep(2)
-            if self.proc.stdout.closed and self.proc.stderr.closed:
-                done = True
+        self._run('volume-paths-check',
+                  self._volume_paths_args(conf_data, os_vars,
+                                          attached_volumes))
+
+    def iter_volume_paths_test(self, conf_data, os_vars, attached_volumes):
+        return self._iter_run(
+            'volume-paths-check',
+            self._volume_paths_args(conf_data, os_vars, attached_volumes))
+
+    def _volume_paths_args(self, conf_data, os_vars, attached_volumes):
+        return ['-f', 'json', '-conf-data', conf_data,
+                '-os-vars', os_vars,
+                '-attached-volumes', attached_volumes]
+
+
+class _LiveOutput(object):
+    # file-like view of a running test's stdout, for the JSON parser,
+    # that enforces the test's deadline while waiting for more output
+    def __init__(self, node_test):
+        self.node_test = node_test
+        self.done = False
+
+    def read(self, size=-1):
+        while not self.done:
+            # checked before every line, as a run that keeps printing
+            # never leaves the queue empty for long
+            if self.node_test._stop_if_due():
+                self.done = True
+                break
+            try:
+                line = self.node_test.live_q.get(
+                    True, min(1, max(self.node_test.deadline - time.time(),
+                                     0.01)))
+            except Empty:
+                pass
+            else:
+                if line is None:
+                    self.done = True
+                else:
+                    return line
+        return ''
+
+
+def get_node_test(**kwargs):
+    """Returns a NodeTest that uses the configured engine."""
+    if ENGINE == 'inprocess':
+        # only import cinderdiags if it is being used
+        from horizon_hpe_storage.test_engine import inprocess
+        return inprocess.InProcessNodeTest(**kwargs)
+    return NodeTest(**kwargs)
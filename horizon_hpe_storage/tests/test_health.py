@@ -0,0 +1,64 @@
+# (c) Copyright [2015] Hewlett Packard Enterprise Development LP
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+import unittest
+
+from horizon_hpe_storage.storage_panel.lun_tool import health
+
+
+def _row(node_name, vol_name, vol_id, path):
+    row = {}
+    row['node_name'] = node_name
+    row['vol_name'] = vol_name
+    row['vol_id'] = vol_id
+    row['path'] = path
+    return row
+
+
+class AnalyzeTest(unittest.TestCase):
+
+    def test_healthy(self):
+        rows = [_row('nova-1', 'vol-a', 'id-a', '/dev/sdb'),
+                _row('nova-1', 'vol-a', 'id-a', '/dev/sdc')]
+        attached_volumes = {'nova-1': [('vol-a', 'id-a')]}
+        self.assertEqual([], health.analyze(rows, attached_volumes,
+                                            expected_paths=2))
+
+    def test_attached_volume_without_paths(self):
+        rows = [_row('nova-1', 'vol-a', 'id-a', '/dev/sdb'),
+                _row('nova-1', 'vol-a', 'id-a', '/dev/sdc')]
+        # vol-b was asked about on both nodes, since its host is unknown,
+        # and no node reported a path for it
+        attached_volumes = {
+            'nova-1': [('vol-a', 'id-a'), ('vol-b', 'id-b')],
+            'nova-2': [('vol-b', 'id-b')]}
+        issues = health.analyze(rows, attached_volumes, expected_paths=2)
+        self.assertEqual(1, len(issues))
+        self.assertEqual(health.NO_PATHS, issues[0]['issue'])
+        self.assertEqual('nova-1, nova-2', issues[0]['node_name'])
+        self.assertEqual('vol-b', issues[0]['vol_name'])
+        self.assertEqual('id-b', issues[0]['vol_id'])
+        self.assertEqual('0 of 2 paths', issues[0]['detail'])
+
+    def test_without_attached_volumes(self):
+        # results stored before attached volumes were kept
+        rows = [_row('nova-1', 'vol-a', 'id-a', '/dev/sdb'),
+                _row('nova-1', None, None, '/dev/sdd')]
+        issues = health.analyze(rows, expected_paths=2)
+        self.assertEqual([health.FEWER_PATHS, health.ORPHANED_PATH],
+                         [issue['issue'] for issue in issues])
+
+
+if __name__ == '__main__':
+    unittest.main()
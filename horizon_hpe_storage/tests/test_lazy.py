@@ -0,0 +1,52 @@
+# (c) Copyright [2015] Hewlett Packard Enterprise Development LP
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+import unittest
+
+from horizon_hpe_storage.api.common import lazy
+
+
+class CountingAPI(object):
+    created = 0
+
+    def __init__(self):
+        CountingAPI.created += 1
+
+
+class LazyAPITest(unittest.TestCase):
+
+    def setUp(self):
+        CountingAPI.created = 0
+
+    def test_built_on_first_use(self):
+        class Form(object):
+            api = lazy.LazyAPI(CountingAPI)
+
+        self.assertEqual(CountingAPI.created, 0)
+        first = Form().api
+        self.assertIsInstance(first, CountingAPI)
+        self.assertIs(Form().api, first)
+        self.assertIs(Form.api, first)
+        self.assertEqual(CountingAPI.created, 1)
+
+    def test_one_object_per_class(self):
+        class Form(object):
+            api = lazy.LazyAPI(CountingAPI)
+
+        class OtherForm(object):
+            api = lazy.LazyAPI(CountingAPI)
+
+        self.assertIsNot(Form().api, OtherForm().api)
+        self.assertEqual(CountingAPI.created, 2)
+
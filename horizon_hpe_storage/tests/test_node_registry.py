@@ -0,0 +1,201 @@
+# (c) Copyright [2015] Hewlett Packard Enterprise Development LP
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+import os
+import sys
+import unittest
+
+# the in-memory Barbican used by the benchmarks
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..',
+                                'tools'))
+
+import fake_services  # noqa
+
+import horizon_hpe_storage.api.barbican_api as barbican  # noqa
+
+
+class NodeRegistryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.services = fake_services.FakeServices()
+        self.services.install('http://keystone.test:5000')
+        self.barbican_api = self.get_barbican_api()
+        self.forget_nodes()
+
+    def tearDown(self):
+        self.services.uninstall()
+        self.forget_nodes()
+
+    def forget_nodes(self):
+        # as a newly started worker would
+        barbican._node_registry_cache.clear()
+        barbican._node_data_refs.clear()
+
+    def get_barbican_api(self):
+        barbican_api = barbican.BarbicanAPI()
+        barbican_api.do_setup(object())
+        return barbican_api
+
+    def add_node(self, barbican_api, idx):
+        return barbican_api.add_node('node-%d' % idx,
+                                     barbican.CINDER_NODE_TYPE,
+                                     '10.0.0.%d' % (idx % 250),
+                                     'node-%d.test' % idx, 'stack', 'pwd')
+
+    def get_node(self, idx):
+        return self.barbican_api.get_node('node-%d' % idx,
+                                          barbican.CINDER_NODE_TYPE)
+
+    def get_node_names(self):
+        return set(node['node_name'] for node in
+                   self.barbican_api.get_all_nodes(
+                       barbican.CINDER_NODE_TYPE))
+
+    def count_calls(self, func, *args):
+        self.services.reset_calls()
+        result = func(*args)
+        calls = self.services.get_call_counts(fake_services.BARBICAN)
+        return result, sum(calls.values())
+
+    def test_many_nodes(self):
+        # well past what fits in a single page of secrets or containers,
+        # and in a single registry secret
+        self.barbican_api.lun_tool_part_size = 1000
+        for idx in range(150):
+            self.add_node(self.barbican_api, idx)
+        self.assertLess(1, len(list(self.barbican_api._iter_secrets(
+            name=barbican.NODE_REGISTRY))))
+        self.forget_nodes()
+
+        self.assertEqual(set('node-%d' % idx for idx in range(150)),
+                         self.get_node_names())
+        self.assertEqual('node-149.test', self.get_node(149)['host_name'])
+
+        self.barbican_api.delete_node('node-0', barbican.CINDER_NODE_TYPE)
+        self.assertNotIn('node-0', self.get_node_names())
+        self.assertIsNone(self.get_node(0))
+
+    def test_lookup_calls(self):
+        for idx in range(20):
+            self.add_node(self.barbican_api, idx)
+        self.forget_nodes()
+
+        # a worker that hasn't read the registry finds a node by name
+        node, calls = self.count_calls(self.get_node, 3)
+        self.assertEqual('node-3', node['node_name'])
+        self.assertEqual(3, calls)
+
+        self.get_node_names()
+        exist, calls = self.count_calls(self.barbican_api.nodes_exist,
+                                        barbican.CINDER_NODE_TYPE)
+        self.assertTrue(exist)
+        self.assertEqual(1, calls)
+        nodes, calls = self.count_calls(self.barbican_api.get_all_nodes,
+                                        barbican.CINDER_NODE_TYPE)
+        self.assertEqual(20, len(nodes))
+        self.assertEqual(41, calls)
+        node, calls = self.count_calls(self.get_node, 3)
+        self.assertEqual('node-3', node['node_name'])
+        self.assertEqual(2, calls)
+
+    def test_interleaved_writers(self):
+        writer = self.get_barbican_api()
+        for idx in range(110):
+            self.add_node(self.barbican_api, idx)
+
+        # the second writer reads the registry, then the first writer
+        # updates it before the second one stores its copy
+        store_registry = writer._store_node_registry
+
+        def interleaved_store(*args, **kwargs):
+            writer._store_node_registry = store_registry
+            self.add_node(self.barbican_api, 200)
+            self.barbican_api.delete_node('node-1',
+                                          barbican.CINDER_NODE_TYPE)
+            return store_registry(*args, **kwargs)
+
+        writer._store_node_registry = interleaved_store
+        self.add_node(writer, 201)
+
+        self.assertEqual(1, len(list(self.barbican_api._iter_secrets(
+            name=barbican.NODE_REGISTRY))))
+        self.forget_nodes()
+        node_names = self.get_node_names()
+        self.assertIn('node-200', node_names)
+        self.assertIn('node-201', node_names)
+        self.assertNotIn('node-1', node_names)
+        self.assertEqual(111, len(node_names))
+
+    def test_rebuilt_when_lost(self):
+        for idx in range(5):
+            self.add_node(self.barbican_api, idx)
+        for secret in list(self.barbican_api._iter_secrets(
+                name=barbican.NODE_REGISTRY)):
+            self.barbican_api.client.secrets.delete(secret.secret_ref)
+
+        self.assertEqual(set('node-%d' % idx for idx in range(5)),
+                         self.get_node_names())
+        self.assertEqual(1, len(list(self.barbican_api._iter_secrets(
+            name=barbican.NODE_REGISTRY))))
+
+    def test_stale_registry(self):
+        for idx in range(5):
+            self.add_node(self.barbican_api, idx)
+        self.get_node_names()
+
+        # node-3 is replaced by a container the registry doesn't know of
+        client = self.barbican_api.client
+        old = self.barbican_api._find_node_container(
+            barbican.CINDER_NODE_TYPE + barbican.NODE_NAME_SEPARATOR +
+            'node-3')
+        self.barbican_api._delete_container(old)
+        secret = client.secrets.create(
+            name=barbican.NODE_DATA,
+            payload=self.barbican_api._get_node_data_payload(
+                'node-3', barbican.CINDER_NODE_TYPE, '10.0.0.103',
+                'node-3.test', 'stack', 'pwd'))
+        client.containers.create(old.name,
+                                 secrets={secret.name: secret}).store()
+
+        self.assertEqual('10.0.0.103', self.get_node(3)['node_ip'])
+        nodes = self.barbican_api.get_all_nodes(barbican.CINDER_NODE_TYPE)
+        self.assertEqual(5, len(nodes))
+        self.assertIn('10.0.0.103', [node['node_ip'] for node in nodes])
+
+        # and the registry now points at the new container
+        node, calls = self.count_calls(self.get_node, 3)
+        self.assertEqual('10.0.0.103', node['node_ip'])
+        self.assertEqual(2, calls)
+
+    def test_upsert_replaces_node_data(self):
+        node = self.add_node(self.barbican_api, 0)
+        self.services.reset_calls()
+        self.barbican_api.upsert_node('node-0', barbican.CINDER_NODE_TYPE,
+                                      '10.0.0.100', 'node-0.test', 'stack',
+                                      'pwd')
+        calls = self.services.get_call_counts(fake_services.BARBICAN)
+
+        # the node keeps its container, and only its data secret is
+        # replaced
+        self.assertEqual(1, calls['secrets.store'])
+        self.assertEqual(1, calls['containers.secrets.add'])
+        self.assertEqual(1, calls['containers.secrets.remove'])
+        self.assertEqual(1, calls['secrets.delete'])
+        self.assertNotIn('containers.store', calls)
+        self.assertNotIn('containers.delete', calls)
+
+        self.assertEqual('10.0.0.100', self.get_node(0)['node_ip'])
+        container = self.barbican_api.client.containers.get(
+            node.container_ref)
+        self.assertEqual(1, len(container.secret_refs))
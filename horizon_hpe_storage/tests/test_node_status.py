@@ -0,0 +1,131 @@
+# (c) Copyright [2015] Hewlett Packard Enterprise Development LP
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+# the in-memory Barbican used by the benchmarks
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..',
+                                'tools'))
+
+import fake_services  # noqa
+
+import horizon_hpe_storage.api.barbican_api as barbican  # noqa
+import horizon_hpe_storage.api.result_store as result_store  # noqa
+
+STATUS = {'diag_test_status': 'Backend Section:3par::cpg:pass',
+          'software_test_status': 'Software Test:package:sysfsutils',
+          'diag_run_time': '2016-01-01 00:00:00',
+          'validation_time': '2016-01-01 00:00:00',
+          'config_fingerprint': 'abc123'}
+
+
+class NodeStatusTest(unittest.TestCase):
+    backend = 'barbican'
+
+    def setUp(self):
+        self.services = fake_services.FakeServices()
+        self.services.install('http://keystone.test:5000')
+        barbican._node_registry_cache.clear()
+        barbican._node_data_refs.clear()
+        self.barbican_api = barbican.BarbicanAPI()
+        self.barbican_api.do_setup(object())
+
+        self.tmp_dir = tempfile.mkdtemp()
+        self.sqlite_store = result_store.SQLiteResultStore(
+            os.path.join(self.tmp_dir, 'results.sqlite3'))
+        self.backend, result_store.BACKEND = \
+            result_store.BACKEND, self.backend
+        self.sqlite_store, result_store._sqlite_store = \
+            result_store._sqlite_store, self.sqlite_store
+        self.store = result_store.get_result_store(self.barbican_api)
+
+        self.barbican_api.add_node('node-0', barbican.CINDER_NODE_TYPE,
+                                   '10.0.0.1', 'node-0.test', 'stack', 'pwd',
+                                   config_path='/etc/cinder/cinder.conf')
+
+    def tearDown(self):
+        result_store.BACKEND = self.backend
+        result_store._sqlite_store = self.sqlite_store
+        shutil.rmtree(self.tmp_dir)
+        self.services.uninstall()
+
+    def get_node(self):
+        return self.barbican_api.get_node('node-0', barbican.CINDER_NODE_TYPE)
+
+    def get_node_data_ref(self):
+        container = self.barbican_api._find_node_container(
+            barbican.CINDER_NODE_TYPE + barbican.NODE_NAME_SEPARATOR +
+            'node-0')
+        return self.barbican_api._get_node_secret_refs(container)[0]
+
+    def test_status_kept_apart_from_credentials(self):
+        data_ref = self.get_node_data_ref()
+        self.store.set_node_status(barbican.CINDER_NODE_TYPE, 'node-0',
+                                   STATUS)
+
+        # the secret holding the node's credentials isn't rewritten
+        self.assertEqual(data_ref, self.get_node_data_ref())
+        node = self.get_node()
+        self.assertEqual('pwd', node['ssh_pwd'])
+        for key, value in STATUS.items():
+            self.assertEqual(value, node[key])
+        self.assertEqual(STATUS, self.store.get_node_status(
+            barbican.CINDER_NODE_TYPE, 'node-0'))
+        self.assertEqual({'node-0': STATUS}, self.store.get_node_statuses(
+            barbican.CINDER_NODE_TYPE))
+
+    def test_status_kept_when_node_updated(self):
+        self.store.set_node_status(barbican.CINDER_NODE_TYPE, 'node-0',
+                                   STATUS)
+        self.barbican_api.upsert_node('node-0', barbican.CINDER_NODE_TYPE,
+                                      '10.0.0.2', 'node-0.test', 'stack',
+                                      'pwd')
+
+        nodes = self.barbican_api.get_all_nodes(barbican.CINDER_NODE_TYPE)
+        self.assertEqual('10.0.0.2', nodes[0]['node_ip'])
+        self.assertEqual(STATUS['diag_test_status'],
+                         nodes[0]['diag_test_status'])
+
+    def test_status_deleted_with_node(self):
+        self.store.set_node_status(barbican.CINDER_NODE_TYPE, 'node-0',
+                                   STATUS)
+        self.barbican_api.delete_node('node-0', barbican.CINDER_NODE_TYPE)
+        self.assertEqual({}, self.store.get_node_status(
+            barbican.CINDER_NODE_TYPE, 'node-0'))
+
+    def test_software_tests_read_without_seeding(self):
+        self.assertIsNone(self.store.get_software_tests(
+            barbican.NOVA_NODE_TYPE, seed=False))
+        self.assertIsNone(self.store.get_software_tests(
+            barbican.NOVA_NODE_TYPE, seed=False))
+        self.assertEqual(
+            result_store.get_default_software_tests(barbican.NOVA_NODE_TYPE),
+            self.store.get_software_tests(barbican.NOVA_NODE_TYPE))
+
+
+class SQLiteNodeStatusTest(NodeStatusTest):
+    backend = 'sqlite'
+
+    def test_status_not_stored_in_barbican(self):
+        self.services.reset_calls()
+        self.store.set_node_status(barbican.CINDER_NODE_TYPE, 'node-0',
+                                   STATUS)
+        self.assertEqual({}, self.services.get_call_counts(
+            fake_services.BARBICAN))
+        self.assertEqual(STATUS['config_fingerprint'],
+                         self.get_node()['config_fingerprint'])
@@ -0,0 +1,140 @@
+# (c) Copyright [2015] Hewlett Packard Enterprise Development LP
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import horizon_hpe_storage.test_engine.node_test as tester
+
+# stands in for cinderdiags, set up through the environment
+FAKE_CINDERDIAGS = os.path.join(os.path.dirname(__file__), '..', '..',
+                                'tools', 'fake_cinderdiags.py')
+CONF_DATA = json.dumps([{'section': 'node-0-cinder',
+                         'service': 'cinder',
+                         'host_ip': '10.0.0.1'}])
+
+
+def is_running(pid):
+    try:
+        with open('/proc/%d/stat' % pid) as stat:
+            # exited, but not yet reaped
+            return stat.read().rsplit(')', 1)[1].split()[0] != 'Z'
+    except IOError:
+        return False
+
+
+class NodeTestTest(unittest.TestCase):
+
+    def setUp(self):
+        self.environ = dict(os.environ)
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self.environ)
+        shutil.rmtree(self.tmp_dir)
+
+    def get_node_test(self, phase_timeout=30, node_timeout=60, **environ):
+        for name, value in environ.items():
+            os.environ['FAKE_CINDERDIAGS_' + name] = str(value)
+        return tester.NodeTest(executable=FAKE_CINDERDIAGS,
+                               phase_timeout=phase_timeout,
+                               node_timeout=node_timeout)
+
+    def test_records(self):
+        node_test = self.get_node_test(RECORDS=3)
+        kills = []
+        node_test.kill = lambda: kills.append(True)
+
+        records = list(node_test.iter_options_check_test(CONF_DATA))
+        self.assertEqual(3, len(records))
+        self.assertEqual('pass', records[0]['CPG'])
+        # a run that finished on its own isn't killed
+        self.assertEqual([], kills)
+        self.assertFalse(node_test.errors_occurred)
+
+    def test_crash(self):
+        node_test = self.get_node_test(CRASH='all')
+        node_test.run_credentials_check_test(CONF_DATA)
+        self.assertTrue(node_test.errors_occurred)
+        self.assertIn('unexpected error', node_test.error_text)
+        self.assertEqual([], list(node_test.iter_results()))
+
+    def test_phase_timeout(self):
+        node_test = self.get_node_test(phase_timeout=1, HANG='all')
+        start = time.time()
+        records = []
+        with self.assertRaises(tester.NodeTestTimeout):
+            for record in node_test.iter_options_check_test(CONF_DATA):
+                records.append(record)
+        # the records read before it stopped responding are still seen
+        self.assertEqual(1, len(records))
+        self.assertLess(time.time() - start,
+                        1 + tester.KILL_GRACE_PERIOD)
+        self.assertIsNotNone(node_test.proc.poll())
+
+        with self.assertRaises(tester.NodeTestTimeout):
+            node_test.run_credentials_check_test(CONF_DATA)
+
+    def test_node_deadline(self):
+        # each run fits its phase timeout, but not all of them together
+        node_test = self.get_node_test(phase_timeout=30, node_timeout=1,
+                                       LATENCY=0.6)
+        node_test.run_credentials_check_test(CONF_DATA)
+        start = time.time()
+        with self.assertRaises(tester.NodeTestTimeout):
+            node_test.run_credentials_check_test(CONF_DATA)
+        self.assertLess(time.time() - start, 1)
+
+    def test_cancel(self):
+        node_test = self.get_node_test(HANG='all')
+        timer = threading.Timer(0.5, node_test.cancel)
+        timer.start()
+        start = time.time()
+        try:
+            with self.assertRaises(tester.NodeTestCancelled):
+                list(node_test.iter_options_check_test(CONF_DATA))
+        finally:
+            timer.cancel()
+        self.assertLess(time.time() - start,
+                        0.5 + tester.KILL_GRACE_PERIOD)
+        self.assertIsNotNone(node_test.proc.poll())
+
+        # and later runs don't start
+        with self.assertRaises(tester.NodeTestCancelled):
+            node_test.run_credentials_check_test(CONF_DATA)
+
+    def test_child_processes_killed(self):
+        pid_file = os.path.join(self.tmp_dir, 'child.pid')
+        node_test = self.get_node_test(phase_timeout=1, HANG='all',
+                                       CHILD=pid_file)
+        start = time.time()
+        with self.assertRaises(tester.NodeTestTimeout):
+            node_test.run_options_check_test(CONF_DATA)
+        # the child held the output open, so the run would only have
+        # finished after JOIN_TIMEOUT had it been left running
+        self.assertLess(time.time() - start,
+                        1 + tester.KILL_GRACE_PERIOD)
+        with open(pid_file) as pids:
+            child_pid = int(pids.read())
+        for attempt in range(50):
+            if not is_running(child_pid):
+                break
+            time.sleep(0.1)
+        self.assertFalse(is_running(child_pid))
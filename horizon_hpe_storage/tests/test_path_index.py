@@ -0,0 +1,75 @@
+# (c) Copyright [2015] Hewlett Packard Enterprise Development LP
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+import unittest
+
+from horizon_hpe_storage.storage_panel.lun_tool import path_index
+
+ROWS = [{'node_name': 'nova-2', 'vol_name': 'data-1', 'vol_id': 'ab12',
+         'path': '/dev/sdb'},
+        {'node_name': 'nova-1', 'vol_name': 'Data-2', 'vol_id': 'ab34',
+         'path': '/dev/sdc'},
+        {'node_name': 'nova-10', 'vol_name': 'logs', 'vol_id': 'cd56',
+         'path': '/dev/sdd'},
+        {'node_name': 'compute-1', 'vol_name': None, 'vol_id': None,
+         'path': '/dev/sde'}]
+
+
+class RowIndexTest(unittest.TestCase):
+
+    def get_names(self, index, **kwargs):
+        rows = index.get_page(10, **kwargs)[0]
+        return [row['node_name'] for row in rows]
+
+    def test_prefix_filter(self):
+        index = path_index.RowIndex(ROWS)
+        self.assertEqual(['nova-1', 'nova-10'],
+                         self.get_names(index, filter_field='node_name',
+                                        filter_string='nova-1'))
+        # matched without case, in the requested sort order
+        self.assertEqual(['nova-1', 'nova-2'],
+                         self.get_names(index, filter_field='vol_name',
+                                        filter_string=' DATA',
+                                        sort_key='node_name'))
+        self.assertEqual(['nova-2', 'nova-1'],
+                         self.get_names(index, filter_field='vol_name',
+                                        filter_string='data',
+                                        sort_key='vol_name'))
+        self.assertEqual(['nova-1', 'nova-2'],
+                         self.get_names(index, filter_field='vol_id',
+                                        filter_string='ab',
+                                        sort_key='vol_id',
+                                        sort_dir='desc'))
+        self.assertEqual([], self.get_names(index, filter_field='path',
+                                            filter_string='/dev/sdz'))
+
+    def test_exact_filter(self):
+        index = path_index.RowIndex(ROWS, exact_fields=('node_name',))
+        self.assertEqual(['nova-1'],
+                         self.get_names(index, filter_field='node_name',
+                                        filter_string='NOVA-1'))
+        self.assertEqual(['nova-1', 'nova-10'],
+                         self.get_names(index, filter_field='vol_id',
+                                        filter_string='ab3') +
+                         self.get_names(index, filter_field='path',
+                                        filter_string='/dev/sdd'))
+
+    def test_filtered_pages(self):
+        index = path_index.RowIndex(ROWS)
+        rows, has_prev, has_more = index.get_page(
+            1, marker=1, filter_field='node_name', filter_string='nova')
+        self.assertEqual(['nova-10'], [row['node_name'] for row in rows])
+        self.assertEqual(1, rows[0]['row_index'])
+        self.assertTrue(has_prev)
+        self.assertTrue(has_more)
@@ -0,0 +1,78 @@
+# (c) Copyright [2015] Hewlett Packard Enterprise Development LP
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+import time
+import types
+import unittest
+
+from horizon_hpe_storage import profiler
+
+
+class Store(object):
+
+    def get_item(self, idx):
+        time.sleep(0.01)
+        return idx
+
+    def get_items(self, count):
+        # one call per item, the pattern the counts should show
+        return [self.get_item(idx) for idx in range(count)]
+
+
+profiler.profile_methods(Store, 'store')
+
+
+class ProfilerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.profile = profiler.start()
+
+    def tearDown(self):
+        profiler.stop()
+
+    def test_nested_calls_counted(self):
+        Store().get_items(5)
+        count, seconds = self.profile.get_totals()['store']
+        self.assertEqual(6, count)
+        self.assertEqual([1, 5], [self.profile.calls[('store', op)][0]
+                                  for op in ('get_items', 'get_item')])
+        # the nested calls' time is part of the outer call's
+        outer = self.profile.calls[('store', 'get_items')][1]
+        self.assertEqual(outer, seconds)
+        self.assertIn('store;dur=', self.profile.get_server_timing())
+        self.assertIn('desc="6 calls"', self.profile.get_server_timing())
+
+    def test_nested_timer(self):
+        with profiler.Timer('http', 'GET /outer'):
+            with profiler.Timer('http', 'GET /inner'):
+                pass
+        self.assertEqual(2, self.profile.get_totals()['http'][0])
+        self.assertEqual(self.profile.calls[('http', 'GET /outer')][1],
+                         self.profile.get_totals()['http'][1])
+
+    def test_profile_functions(self):
+        module = types.ModuleType('fake_api')
+        exec('def volume_list(request):\n'
+             '    return [volume_get(request, 1), volume_get(request, 2)]\n'
+             'def volume_get(request, volume_id):\n'
+             '    return volume_id\n', module.__dict__)
+        module.imported = profiler.get_rest_op
+        profiler.profile_functions(module, 'cinder')
+        self.assertEqual([1, 2], module.volume_list(None))
+        self.assertEqual(3, self.profile.get_totals()['cinder'][0])
+        self.assertIs(profiler.get_rest_op, module.imported)
+
+    def test_not_profiling(self):
+        profiler.stop()
+        self.assertEqual([0, 1], Store().get_items(2))
@@ -0,0 +1,204 @@
+# (c) Copyright [2015] Hewlett Packard Enterprise Development LP
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+"""Measures how long the storage panel adds to Horizon worker startup.
+
+Each run starts a fresh interpreter, sets up Django and imports the
+Horizon modules the panel builds on, then times importing what Horizon
+loads for the panel at startup: the panel, the customization module and
+the panel's URLs with their views, forms and tables. It prints the mean
+import time, the slowest modules and whether any of the heavy client
+libraries were imported.
+
+It needs a Horizon install with this panel enabled:
+
+    python tools/bench_import.py --runs 10
+
+On Python 3.7 and later, --importtime times the imports with
+python -X importtime instead of wrapping __import__. To see the change
+a patch makes, run it before and after applying the patch.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+# imported by Horizon whether or not the panel is enabled
+BASE_MODULES = (
+    'horizon',
+    'horizon.forms',
+    'horizon.tables',
+    'horizon.tabs',
+    'horizon.views',
+    'openstack_dashboard.api.cinder',
+    'openstack_dashboard.api.keystone',
+    'openstack_dashboard.api.nova',
+    'openstack_dashboard.dashboards.admin.dashboard',
+    'openstack_dashboard.dashboards.admin.volumes.tabs',
+    'openstack_dashboard.dashboards.admin.volumes.volumes.tables',
+    'openstack_dashboard.dashboards.admin.volumes.snapshots.tables',
+)
+# loaded for the panel at startup
+PANEL_MODULES = (
+    'horizon_hpe_storage.storage_panel.panel',
+    'horizon_hpe_storage.overrides',
+    'horizon_hpe_storage.storage_panel.urls',
+)
+# only needed once a request talks to a backend or tests a node
+HEAVY_MODULES = ('barbicanclient', 'keystoneclient', 'keystoneauth1',
+                 'httplib2', 'paramiko', 'cinderdiags')
+
+
+def import_base():
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE',
+                          'openstack_dashboard.settings')
+    import django
+    django.setup()
+    for name in BASE_MODULES:
+        __import__(name)
+
+
+def import_panel():
+    start = time.time()
+    for name in PANEL_MODULES:
+        __import__(name)
+    return time.time() - start
+
+
+def child_hook():
+    # times each import that loads new modules, including the modules
+    # it imports in turn
+    import __builtin__
+
+    import_base()
+    real_import = __builtin__.__import__
+    modules = {}
+
+    def timed_import(name, *args, **kwargs):
+        loaded = len(sys.modules)
+        start = time.time()
+        try:
+            return real_import(name, *args, **kwargs)
+        finally:
+            if len(sys.modules) > loaded:
+                elapsed = time.time() - start
+                modules[name] = max(modules.get(name, 0), elapsed)
+
+    __builtin__.__import__ = timed_import
+    try:
+        total = import_panel()
+    finally:
+        __builtin__.__import__ = real_import
+    return total, modules
+
+
+def child_importtime():
+    # python -X importtime writes the time of each import to stderr;
+    # mark where the panel's imports start
+    import_base()
+    sys.stderr.write('bench-import: start\n')
+    sys.stderr.flush()
+    return import_panel(), {}
+
+
+def parse_importtime(stderr):
+    # lines are "import time: self [us] | cumulative | imported package"
+    modules = {}
+    started = False
+    for line in stderr.splitlines():
+        if line == 'bench-import: start':
+            started = True
+        elif started and line.startswith('import time:'):
+            fields = line[len('import time:'):].split('|')
+            try:
+                cumulative = int(fields[1]) / 1000000.0
+            except ValueError:
+                continue
+            modules[fields[2].strip()] = cumulative
+    return modules
+
+
+def run_child(importtime):
+    cmd = [sys.executable]
+    if importtime:
+        cmd += ['-X', 'importtime']
+    cmd += [os.path.abspath(__file__), '--child']
+    if importtime:
+        cmd.append('--importtime')
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE,
+                            universal_newlines=True)
+    stdout, stderr = proc.communicate()
+    if proc.returncode:
+        sys.stderr.write(stderr)
+        raise SystemExit("import benchmark run failed")
+    result = json.loads(stdout.strip().splitlines()[-1])
+    if importtime:
+        result['modules'] = parse_importtime(stderr)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15,
+                        help='number of slowest imports to list')
+    parser.add_argument('--importtime', action='store_true',
+                        help='use python -X importtime (Python 3.7+)')
+    parser.add_argument('--child', action='store_true',
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        if args.importtime:
+            total, modules = child_importtime()
+        else:
+            total, modules = child_hook()
+        heavy = [name for name in HEAVY_MODULES if name in sys.modules]
+        print(json.dumps({'total': total, 'modules': modules,
+                          'heavy': heavy}))
+        return
+
+    results = [run_child(args.importtime) for idx in range(args.runs)]
+    totals = sorted(result['total'] for result in results)
+    print("panel import time over %d runs: mean %.1fms, min %.1fms, "
+          "max %.1fms" % (len(totals), sum(totals) * 1000 / len(totals),
+                          totals[0] * 1000, totals[-1] * 1000))
+
+    modules = {}
+    for result in results:
+        for name, elapsed in result['modules'].items():
+            modules.setdefault(name, []).append(elapsed)
+    slowest = sorted(modules.items(),
+                     key=lambda item: -sum(item[1]) / len(item[1]))
+    print("")
+    print("%-60s %10s" % ('slowest imports (cumulative)', 'mean(ms)'))
+    for name, times in slowest[:args.top]:
+        print("%-60s %10.1f" % (name, sum(times) * 1000 / len(times)))
+
+    print("")
+    heavy = sorted(set(name for result in results
+                       for name in result['heavy']))
+    if heavy:
+        print("heavy modules imported at startup: " + ', '.join(heavy))
+    else:
+        print("no heavy modules imported at startup")
+
+
+if __name__ == '__main__':
+    main()
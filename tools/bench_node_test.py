@@ -0,0 +1,123 @@
+# (c) Copyright [2015] Hewlett Packard Enterprise Development LP
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+"""Compares the subprocess and in-process NodeTest engines.
+
+Runs the SSH credential and software checks against one node a number of
+times with each engine, and prints how long each took. Run it against a
+local sshd:
+
+    python tools/bench_node_test.py --host 127.0.0.1 --user stack \
+        --password secret
+
+or, without SSH, against a fake transport that only simulates connection
+and command latency (in-process engine only):
+
+    python tools/bench_node_test.py --fake-transport
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from django.conf import settings  # noqa
+
+if not settings.configured:
+    settings.configure()
+
+from horizon_hpe_storage.test_engine import inprocess  # noqa
+from horizon_hpe_storage.test_engine import node_test  # noqa
+
+
+class FakeTransport(object):
+    def is_active(self):
+        return True
+
+
+class FakeSSHClient(object):
+    # stands in for cinderdiags' ssh_client.Client
+    connect_latency = 0.2
+    command_latency = 0.01
+
+    def __init__(self, host_name, ssh_user, ssh_password):
+        time.sleep(self.connect_latency)
+        self.client = self
+
+    def get_transport(self):
+        return FakeTransport()
+
+    def execute(self, command):
+        time.sleep(self.command_latency)
+        if 'release' in command:
+            return 'ID_LIKE=debian\n'
+        return 'install ok installed1.2.3'
+
+    def disconnect(self):
+        pass
+
+
+def time_runs(name, node_test_factory, conf_data, sw_data, runs):
+    start = time.time()
+    for idx in range(runs):
+        test = node_test_factory()
+        test.run_credentials_check_test(conf_data)
+        test.run_software_check_test(conf_data, sw_data)
+    elapsed = time.time() - start
+    print("%-12s %d runs in %.2fs (%.3fs per run)" %
+          (name, runs, elapsed, elapsed / runs))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--user', default=os.environ.get('USER'))
+    parser.add_argument('--password', default='')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--packages', default='python-3parclient,sysfsutils',
+                        help='comma separated packages to check')
+    parser.add_argument('--cinderdiags', default='cinderdiags',
+                        help='cinderdiags command for the subprocess engine')
+    parser.add_argument('--fake-transport', action='store_true',
+                        help='simulate SSH instead of connecting')
+    args = parser.parse_args()
+
+    conf_data = json.dumps([{'section': 'bench-nova',
+                             'service': 'nova',
+                             'host_ip': args.host,
+                             'host_name': args.host,
+                             'ssh_user': args.user,
+                             'ssh_password': args.password}])
+    sw_data = json.dumps([dict((pkg, '0.1')
+                               for pkg in args.packages.split(','))])
+
+    if args.fake_transport:
+        inprocess.ssh_client.Client = FakeSSHClient
+    else:
+        time_runs('subprocess',
+                  lambda: node_test.NodeTest(executable=args.cinderdiags),
+                  conf_data, sw_data, args.runs)
+
+    pool = inprocess.SSHSessionPool()
+    time_runs('inprocess',
+              lambda: inprocess.InProcessNodeTest(pool=pool),
+              conf_data, sw_data, args.runs)
+    pool.close_all()
+
+
+if __name__ == '__main__':
+    main()
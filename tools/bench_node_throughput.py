@@ -0,0 +1,278 @@
+# (c) Copyright [2015] Hewlett Packard Enterprise Development LP
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+"""Measures node test throughput against the fake cinderdiags command.
+
+Runs each cinderdiags check through NodeTest on its own, then runs the
+node tests of the diags and config forms (cinder and nova diagnostics,
+and SSH validation) across a fleet of fake nodes, one node at a time as
+the forms do and with more nodes in parallel. Node data is stored in the
+in-memory Barbican from fake_services.py.
+
+It needs a Horizon install with this panel enabled:
+
+    python tools/bench_node_throughput.py
+    python tools/bench_node_throughput.py --nodes 200 --concurrency 1,8 \
+        --latency 0.5 --fail-rate 0.05
+
+The --latency, --record-latency, --records, --padding, --hang, --fail,
+--fail-rate and --crash options are passed on to fake_cinderdiags.py.
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+FAKE_CINDERDIAGS = os.path.join(TOOLS_DIR, 'fake_cinderdiags.py')
+
+sys.path.insert(0, os.path.join(TOOLS_DIR, '..'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE',
+                      'openstack_dashboard.settings')
+
+import django  # noqa
+
+django.setup()
+
+from Queue import Queue  # noqa
+
+import fake_services  # noqa
+
+from horizon_hpe_storage.storage_panel.config \
+    import forms as config_forms  # noqa
+from horizon_hpe_storage.storage_panel.diags \
+    import forms as diag_forms  # noqa
+
+import horizon_hpe_storage.api.barbican_api as barbican  # noqa
+import horizon_hpe_storage.api.result_store as result_store  # noqa
+import horizon_hpe_storage.test_engine.node_test as tester  # noqa
+
+FAKE_OPTIONS = ('latency', 'record_latency', 'records', 'padding', 'hang',
+                'fail', 'fail_rate', 'crash')
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    idx = int(round(pct / 100.0 * (len(values) - 1)))
+    return values[idx]
+
+
+def make_node(node_type, idx):
+    name = 'bench-%s-%d' % (node_type, idx)
+    subnet = 0
+    if node_type == barbican.NOVA_NODE_TYPE:
+        subnet = 1
+    node = {'node_name': name,
+            'node_ip': '10.%d.%d.%d' % (subnet, idx / 250, idx % 250 + 1),
+            'host_name': name + '.bench',
+            'ssh_name': 'stack',
+            'ssh_pwd': 'secret'}
+    if node_type == barbican.CINDER_NODE_TYPE:
+        node['config_path'] = '/etc/cinder/cinder.conf'
+    return node
+
+
+def get_conf_data(node, node_type):
+    return json.dumps([{'section': node['node_name'] + '-' + node_type,
+                        'service': node_type,
+                        'host_ip': node['node_ip'],
+                        'host_name': node['host_name'],
+                        'ssh_user': node['ssh_name'],
+                        'ssh_password': node['ssh_pwd']}])
+
+
+def get_checks(software_tests, volumes):
+    # each cinderdiags command, as the panel runs it
+    cinder_node = make_node(barbican.CINDER_NODE_TYPE, 0)
+    nova_node = make_node(barbican.NOVA_NODE_TYPE, 0)
+    cinder_conf = get_conf_data(cinder_node, barbican.CINDER_NODE_TYPE)
+    nova_conf = get_conf_data(nova_node, barbican.NOVA_NODE_TYPE)
+    sw_data = json.dumps([dict((test['package'], test['min_version'])
+                               for test in software_tests)])
+    volume_names = json.dumps(['bench-volume-%d' % idx
+                               for idx in range(volumes)])
+    return (
+        ('ssh-credentials-check',
+         lambda test: test.run_credentials_check_test(cinder_conf)),
+        ('options-check',
+         lambda test: list(test.iter_options_check_test(cinder_conf))),
+        ('software-check',
+         lambda test: list(test.iter_software_check_test(cinder_conf,
+                                                         sw_data))),
+        ('volume-paths-check',
+         lambda test: list(test.iter_volume_paths_test(nova_conf, '{}',
+                                                       volume_names))),
+    )
+
+
+def get_flows(barbican_api, software_tests):
+    # the per node tests run by the diags and config forms
+    cinder_tests = software_tests[barbican.CINDER_NODE_TYPE]
+    nova_tests = software_tests[barbican.NOVA_NODE_TYPE]
+    return (
+        ('cinder diags', barbican.CINDER_NODE_TYPE,
+         lambda node: diag_forms.run_cinder_node_test(
+             node, cinder_tests, barbican_api, force=True)),
+        ('nova diags', barbican.NOVA_NODE_TYPE,
+         lambda node: diag_forms.run_nova_node_test(
+             node, nova_tests, barbican_api)),
+        ('ssh validation', barbican.CINDER_NODE_TYPE,
+         lambda node: config_forms.run_ssh_validation_test(
+             node, barbican.CINDER_NODE_TYPE, barbican_api)),
+    )
+
+
+def run_fleet(flow, nodes, concurrency, setup):
+    """Runs flow on every node with concurrency threads.
+
+    Each thread calls setup before testing any nodes.
+
+    Returns the total time, the time taken for each node, and the number
+    of nodes whose test raised an error.
+    """
+    queue = Queue()
+    for node in nodes:
+        queue.put(node)
+    times = []
+    errors = []
+    lock = threading.Lock()
+
+    def worker():
+        setup()
+        while True:
+            try:
+                node = queue.get_nowait()
+            except Exception:
+                return
+            start = time.time()
+            try:
+                flow(node)
+            except Exception as ex:
+                with lock:
+                    errors.append(ex)
+            with lock:
+                times.append(time.time() - start)
+
+    start = time.time()
+    workers = [threading.Thread(target=worker)
+               for idx in range(min(concurrency, len(nodes)))]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return time.time() - start, times, len(errors)
+
+
+def count_failed_nodes(barbican_api, node_type, nodes):
+    names = set(node['node_name'] for node in nodes)
+    return len([node for node in barbican_api.get_all_nodes(node_type)
+                if node['node_name'] in names and
+                node.get('validation_time') == 'Failed'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--nodes', type=int, default=50,
+                        help='nodes in the fleet')
+    parser.add_argument('--concurrency', default='1,4,16',
+                        help='comma separated numbers of nodes tested at '
+                             'once; the forms test one at a time')
+    parser.add_argument('--runs', type=int, default=10,
+                        help='runs of each check on its own')
+    parser.add_argument('--volumes', type=int, default=20,
+                        help='volumes asked about by volume-paths-check')
+    parser.add_argument('--phase-timeout', type=int, default=30,
+                        help='seconds allowed for each cinderdiags run')
+    parser.add_argument('--latency', type=float)
+    parser.add_argument('--record-latency', type=float)
+    parser.add_argument('--records', type=int)
+    parser.add_argument('--padding', type=int)
+    parser.add_argument('--hang', help='comma separated commands')
+    parser.add_argument('--fail', help='comma separated commands')
+    parser.add_argument('--fail-rate', type=float)
+    parser.add_argument('--crash', help='comma separated commands')
+    args = parser.parse_args()
+
+    # the fake cinderdiags reads its settings from the environment
+    for option in FAKE_OPTIONS:
+        value = getattr(args, option)
+        if value is not None:
+            os.environ['FAKE_CINDERDIAGS_' + option.upper()] = str(value)
+
+    tester.ENGINE = 'subprocess'
+    tester.CINDERDIAGS_PATH = FAKE_CINDERDIAGS
+    tester.PHASE_TIMEOUT = args.phase_timeout
+    # the fake nodes can't be reached to fingerprint their config
+    diag_forms.get_config_fingerprint = \
+        lambda node, software_tests, node_test: None
+
+    services = fake_services.FakeServices()
+    services.install('http://keystone.bench:5000')
+    try:
+        # the barbican client is kept per thread, so each thread that
+        # tests nodes sets it up from the same session
+        keystone_session = object()
+        barbican_api = barbican.BarbicanAPI()
+        barbican_api.do_setup(keystone_session)
+        store = result_store.get_result_store(barbican_api)
+        software_tests = dict(
+            (node_type, store.get_software_tests(node_type))
+            for node_type in (barbican.CINDER_NODE_TYPE,
+                              barbican.NOVA_NODE_TYPE))
+
+        print("%-22s %6s %10s %10s %8s" %
+              ('check', 'runs', 'mean(s)', 'p95(s)', 'errors'))
+        for name, check in get_checks(
+                software_tests[barbican.CINDER_NODE_TYPE], args.volumes):
+            times = []
+            errors = 0
+            for idx in range(args.runs):
+                start = time.time()
+                try:
+                    check(tester.NodeTest())
+                except Exception:
+                    errors += 1
+                times.append(time.time() - start)
+            print("%-22s %6d %10.3f %10.3f %8d" %
+                  (name, args.runs, sum(times) / len(times),
+                   percentile(times, 95), errors))
+
+        print('')
+        print("%-22s %6s %6s %10s %10s %10s %10s %8s" %
+              ('flow', 'nodes', 'conc', 'total(s)', 'nodes/s',
+               'node(s)', 'p95(s)', 'failed'))
+        for name, node_type, flow in get_flows(barbican_api,
+                                               software_tests):
+            nodes = [make_node(node_type, idx)
+                     for idx in range(args.nodes)]
+            for concurrency in [int(count) for count in
+                                args.concurrency.split(',')]:
+                total, times, errors = run_fleet(
+                    flow, nodes, concurrency,
+                    lambda: barbican_api.do_setup(keystone_session))
+                failed = errors + count_failed_nodes(barbican_api,
+                                                     node_type, nodes)
+                print("%-22s %6d %6d %10.2f %10.2f %10.3f %10.3f %8d" %
+                      (name, len(nodes), concurrency, total,
+                       len(nodes) / total, sum(times) / len(times),
+                       percentile(times, 95), failed))
+    finally:
+        services.uninstall()
+
+
+if __name__ == '__main__':
+    main()
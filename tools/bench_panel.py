@@ -0,0 +1,321 @@
+# (c) Copyright [2015] Hewlett Packard Enterprise Development LP
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+"""Measures how the storage panel pages scale with the number of nodes.
+
+Renders the storage panel tabs, the cinder node test details, the lun
+tool diff details and the deep link actions added to the volumes table,
+against the in-memory services in fake_services.py. Each page is rendered
+with 10, 100 and 1000 cinder and nova nodes, and the mean and 95th
+percentile render times are printed along with the calls each render
+made to Barbican, Keystone and SSMC.
+
+It needs a Horizon install with this panel enabled:
+
+    python tools/bench_panel.py
+    python tools/bench_panel.py --nodes 10,100 --latency 0.005 \
+        --repeat 20 --target storage_tabs
+
+DJANGO_SETTINGS_MODULE defaults to openstack_dashboard.settings.
+"""
+
+import argparse
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE',
+                      'openstack_dashboard.settings')
+
+import django  # noqa
+
+django.setup()
+
+from django.conf import settings  # noqa
+from django.contrib.messages.storage import cookie  # noqa
+from django.contrib.sessions.backends import signed_cookies  # noqa
+from django.test import RequestFactory  # noqa
+
+from openstack_auth import user as auth_user  # noqa
+
+import fake_services  # noqa
+
+from horizon_hpe_storage import overrides  # noqa
+from horizon_hpe_storage.storage_panel import tabs as storage_tabs  # noqa
+from horizon_hpe_storage.storage_panel.diags \
+    import views as diags_views  # noqa
+from horizon_hpe_storage.storage_panel.lun_tool \
+    import diffs as lun_tool_diffs  # noqa
+from horizon_hpe_storage.storage_panel.lun_tool import path_index  # noqa
+from horizon_hpe_storage.storage_panel.lun_tool \
+    import views as lun_tool_views  # noqa
+
+import horizon_hpe_storage.api.barbican_api as barbican  # noqa
+import horizon_hpe_storage.api.keystone_api as keystone  # noqa
+import horizon_hpe_storage.api.result_store as result_store  # noqa
+
+BACKENDS = ('3par-fc', '3par-iscsi')
+PATHS_PER_NODE = 4
+TARGETS = ('storage_tabs', 'cinder_test_detail', 'diff_detail',
+           'volumes_overrides')
+
+
+class BenchToken(object):
+    # the parts of an openstack_auth token the panel reads
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.project = {'id': 'bench-project', 'name': 'admin'}
+        self.expires = None
+
+
+class BenchVolume(object):
+
+    def __init__(self, idx, backend):
+        self.id = str(uuid.UUID(int=idx + 1))
+        self.name = 'bench-volume-%d' % idx
+        self.consistencygroup_id = None
+        setattr(self, 'os-vol-host-attr:host',
+                'cinder@%s#pool' % backend)
+
+
+def make_request(token):
+    request = RequestFactory().get('/admin/hpe_storage/')
+    request.session = signed_cookies.SessionStore()
+    request.session['unscoped_token'] = token.id
+    request.session['token'] = token
+    request.user = auth_user.User(id='bench-user',
+                                  token=token,
+                                  user='admin',
+                                  project_id=token.project['id'],
+                                  project_name=token.project['name'],
+                                  roles=[{'name': 'admin'}],
+                                  enabled=True,
+                                  service_catalog=[],
+                                  services_region='RegionOne')
+    request._messages = cookie.CookieStorage(request)
+    request.horizon = {'dashboard': None, 'panel': None,
+                       'async_messages': []}
+    return request
+
+
+def get_diag_status(idx):
+    status = ''
+    for backend in BACKENDS:
+        status += \
+            "Backend Section:" + backend + "::" + \
+            "cpg:pass::credentials: pass::driver:pass::wsapi:pass::" + \
+            "iscsi:pass::replication:N/A::" + \
+            "system_info:serial_number:%d;;model:HPE 3PAR 8200;;" \
+            "licenses:Thin Provisioning;Remote Copy::" % (idx % 8) + \
+            "config_items:volume_driver==hpe_3par;;" \
+            "hpe3par_password==secret"
+    return status
+
+
+def get_software_status():
+    status = ''
+    for package in ('sysfsutils', 'python-3parclient'):
+        status += \
+            "Software Test:package:" + package + "::" + \
+            "installed:pass::version:pass (9.9.9)::"
+    return status
+
+
+def get_lun_tool_result(node_count, changed):
+    result = []
+    for idx in range(node_count):
+        paths = []
+        for path_idx in range(PATHS_PER_NODE):
+            vol_idx = idx * PATHS_PER_NODE + path_idx
+            if changed and vol_idx % 10 == 0:
+                vol_idx += 1
+            paths.append({'path': '/dev/disk/by-path/bench-%d' % path_idx,
+                          'vol_name': 'bench-volume-%d' % vol_idx,
+                          'vol_id': str(uuid.UUID(int=vol_idx + 1))})
+        result.append({'node_name': 'bench-nova-%d' % idx,
+                       'paths': paths,
+                       'attached_volumes': []})
+    return result
+
+
+def seed(services, request, node_count):
+    """Stores node_count cinder and nova nodes, and two lun tool runs."""
+    keystone_api = keystone.KeystoneAPI()
+    barbican_api = barbican.BarbicanAPI()
+    keystone_api.do_setup(request)
+    barbican_api.do_setup(keystone_api.get_session())
+
+    for backend in BACKENDS:
+        ssmc = services.add_ssmc('https://ssmc-%s.bench:8443/' % backend)
+        services.keystone.add_ssmc_endpoint(backend, ssmc.endpoint)
+        barbican_api.add_ssmc_credentials(backend, 'ssmc', 'secret')
+
+    store = result_store.get_result_store(barbican_api)
+    for idx in range(node_count):
+        name = 'bench-cinder-%d' % idx
+        barbican_api.add_node(
+            name, barbican.CINDER_NODE_TYPE, '10.0.0.%d' % (idx % 250),
+            name + '.bench', 'stack', 'secret',
+            config_path='/etc/cinder/cinder.conf')
+        store.set_node_status(barbican.CINDER_NODE_TYPE, name, {
+            'diag_test_status': get_diag_status(idx),
+            'software_test_status': get_software_status(),
+            'diag_run_time': '2016-01-01 00:00:00',
+            'validation_time': '2016-01-01 00:00:00'})
+
+        name = 'bench-nova-%d' % idx
+        barbican_api.add_node(
+            name, barbican.NOVA_NODE_TYPE, '10.1.0.%d' % (idx % 250),
+            name + '.bench', 'stack', 'secret')
+        store.set_node_status(barbican.NOVA_NODE_TYPE, name, {
+            'software_test_status': get_software_status(),
+            'diag_run_time': '2016-01-01 00:00:00',
+            'validation_time': '2016-01-01 00:00:00'})
+
+    timestamps = ('2016-01-01 00:00:00', '2016-01-02 00:00:00')
+    results = []
+    for idx, timestamp in enumerate(timestamps):
+        result = get_lun_tool_result(node_count, idx > 0)
+        store.add_lun_tool_result(
+            timestamp, result,
+            volume_index=path_index.build_volume_index(result))
+        results.append(result)
+    store.add_lun_tool_diffs(timestamps[0], timestamps[1],
+                             lun_tool_diffs.compute_diff(*results))
+    return timestamps
+
+
+def render_view(view_class, request, **kwargs):
+    # renders the tabs of a detail view, which is all of its page that
+    # the panel itself builds
+    view = view_class()
+    view.request = request
+    view.args = ()
+    view.kwargs = kwargs
+    context = view.get_context_data(**kwargs)
+    return context['tab_group'].render()
+
+
+def render_storage_tabs(request, timestamps, volumes):
+    tab_group = storage_tabs.StorageTabs(request)
+    tab_group.load_tab_data()
+    return tab_group.render()
+
+
+def render_cinder_test_detail(request, timestamps, volumes):
+    return render_view(diags_views.CinderTestDetailView, request,
+                       node_name='bench-cinder-0::' +
+                       barbican.CINDER_NODE_TYPE)
+
+
+def render_diff_detail(request, timestamps, volumes):
+    return render_view(lun_tool_views.DiffDetailView, request,
+                       timestamp='::'.join(timestamps))
+
+
+def render_volumes_overrides(request, timestamps, volumes):
+    # the deep link actions are what the overrides add to each row of
+    # the volumes table, which are added on the first request
+    overrides.install_tables()
+    overrides.keystone_api = None
+    actions = [action_class()
+               for action_class in overrides.VolumesTableWithLaunch.
+               _meta.row_actions
+               if action_class.__module__ == overrides.__name__]
+    allowed = 0
+    for volume in volumes:
+        for action in actions:
+            if action.allowed(request, volume):
+                allowed += 1
+    return allowed
+
+
+RENDERERS = {
+    'storage_tabs': render_storage_tabs,
+    'cinder_test_detail': render_cinder_test_detail,
+    'diff_detail': render_diff_detail,
+    'volumes_overrides': render_volumes_overrides,
+}
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    idx = int(round(pct / 100.0 * (len(values) - 1)))
+    return values[idx]
+
+
+def bench(target, request, timestamps, volumes, services, repeat, warm):
+    times = []
+    services.reset_calls()
+    for idx in range(repeat):
+        if not warm:
+            # drop the path indexes cached by earlier renders
+            path_index.clear_cached_indexes()
+        start = time.time()
+        RENDERERS[target](request, timestamps, volumes)
+        times.append(time.time() - start)
+    calls = services.get_call_counts()
+    return (sum(times) / len(times), percentile(times, 95),
+            dict((service, float(count) / repeat)
+                 for service, count in calls.items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--nodes', default='10,100,1000',
+                        help='comma separated node counts')
+    parser.add_argument('--latency', type=float, default=0.002,
+                        help='seconds each backend call takes')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--target', action='append', choices=TARGETS,
+                        help='page to render, may be repeated '
+                             '(default all)')
+    parser.add_argument('--warm', action='store_true',
+                        help='keep cached path indexes between renders')
+    args = parser.parse_args()
+
+    settings.POLICY_CHECK_FUNCTION = None
+    keystone_url = 'http://' + settings.OPENSTACK_HOST + ':5000'
+
+    print("%-20s %6s %10s %10s %10s %10s %10s" %
+          ('target', 'nodes', 'mean(s)', 'p95(s)', 'barbican',
+           'keystone', 'ssmc'))
+    for node_count in [int(count) for count in args.nodes.split(',')]:
+        services = fake_services.FakeServices()
+        services.install(keystone_url)
+        try:
+            request = make_request(BenchToken())
+            timestamps = seed(services, request, node_count)
+            # one volume in the table for each node
+            volumes = [BenchVolume(idx, BACKENDS[idx % len(BACKENDS)])
+                       for idx in range(node_count)]
+            services.set_latency(args.latency)
+            for target in args.target or TARGETS:
+                mean, p95, calls = bench(target, request, timestamps,
+                                         volumes, services, args.repeat,
+                                         args.warm)
+                print("%-20s %6d %10.4f %10.4f %10.1f %10.1f %10.1f" %
+                      (target, node_count, mean, p95,
+                       calls.get(fake_services.BARBICAN, 0),
+                       calls.get(fake_services.KEYSTONE, 0),
+                       calls.get(fake_services.SSMC, 0)))
+        finally:
+            services.uninstall()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+# (c) Copyright [2015] Hewlett Packard Enterprise Development LP
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+"""Local stand-in for the cinderdiags command.
+
+Takes the same arguments NodeTest passes to cinderdiags, and writes the
+same kind of JSON for the ssh-credentials-check, options-check,
+software-check and volume-paths-check commands, without connecting to
+any node. Point the panel at it with HPE_STORAGE_CINDERDIAGS_PATH, or
+pass it as the executable of a NodeTest.
+
+Its behaviour is set with environment variables, so it can be changed
+without changing the command line NodeTest builds:
+
+  FAKE_CINDERDIAGS_LATENCY         seconds before any output (default 0)
+  FAKE_CINDERDIAGS_RECORD_LATENCY  seconds before each record (default 0)
+  FAKE_CINDERDIAGS_RECORDS         backends per node for options-check,
+                                   and paths per volume for
+                                   volume-paths-check (default 2)
+  FAKE_CINDERDIAGS_PADDING         extra bytes of config items in each
+                                   options-check record (default 0)
+  FAKE_CINDERDIAGS_HANG            commands that stop responding after
+                                   their first record
+  FAKE_CINDERDIAGS_FAIL            commands whose checks all fail
+  FAKE_CINDERDIAGS_FAIL_RATE       chance of each check failing (0 - 1)
+  FAKE_CINDERDIAGS_CRASH           commands that exit with an error and
+                                   no output
+  FAKE_CINDERDIAGS_CHILD           file to write the pid of a child
+                                   process to, which sleeps holding the
+                                   output open, like an ssh session
+                                   cinderdiags leaves behind
+
+Commands are comma separated, and 'all' matches every command.
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+COMMANDS = ('ssh-credentials-check', 'options-check', 'software-check',
+            'volume-paths-check')
+
+
+def get_float(name, default=0.0):
+    return float(os.environ.get('FAKE_CINDERDIAGS_' + name, default))
+
+
+def get_int(name, default=0):
+    return int(os.environ.get('FAKE_CINDERDIAGS_' + name, default))
+
+
+def matches(name, command):
+    commands = os.environ.get('FAKE_CINDERDIAGS_' + name, '').split(',')
+    return 'all' in commands or command in commands
+
+
+class FakeDiags(object):
+
+    def __init__(self, command, verbose):
+        self.command = command
+        self.verbose = verbose
+        self.record_latency = get_float('RECORD_LATENCY')
+        self.records = get_int('RECORDS', 2)
+        self.padding = get_int('PADDING')
+        self.hang = matches('HANG', command)
+        self.fail = matches('FAIL', command)
+        self.fail_rate = get_float('FAIL_RATE')
+        self.written = 0
+
+    def log(self, message):
+        if self.verbose:
+            sys.stderr.write(message + '\n')
+            sys.stderr.flush()
+
+    def result(self):
+        # pass or fail for one check
+        if self.fail or random.random() < self.fail_rate:
+            sys.stderr.write('ERROR: %s check failed\n' % self.command)
+            return 'fail'
+        return 'pass'
+
+    def write_records(self, records):
+        # one record per line, as cinderdiags does, so readers see each
+        # record as soon as it is ready
+        sys.stdout.write('[\n')
+        for record in records:
+            if self.record_latency:
+                time.sleep(self.record_latency)
+            if self.written:
+                sys.stdout.write(',')
+            sys.stdout.write(json.dumps(record) + '\n')
+            sys.stdout.flush()
+            self.written += 1
+            if self.hang:
+                while True:
+                    time.sleep(3600)
+        sys.stdout.write(']\n')
+        sys.stdout.flush()
+
+    def credentials_check(self, sections):
+        for section in sections:
+            self.log('checking SSH credentials for %s' % section['section'])
+            yield {'Node': section['section'],
+                   'Host IP': section.get('host_ip', ''),
+                   'SSH Credentials': self.result()}
+
+    def options_check(self, sections):
+        for section in sections:
+            for idx in range(self.records):
+                backend = '%s-3par-%d' % (section['section'], idx)
+                self.log('checking cinder options for %s' % backend)
+                conf_items = ['volume_backend_name==' + backend,
+                              'volume_driver==cinder.volume.drivers.hpe.'
+                              'hpe_3par_fc.HPE3PARFCDriver',
+                              'hpe3par_username==3paradm',
+                              'hpe3par_password==3pardata']
+                if self.padding:
+                    conf_items.append('padding==' + 'x' * self.padding)
+                yield {'Backend Section': backend,
+                       'CPG': self.result(),
+                       'Credentials': self.result(),
+                       'Driver': self.result(),
+                       'WS API': self.result(),
+                       'iSCSI IP(s)': 'N/A',
+                       'Replication Device': 'N/A',
+                       'System Info': 'serial_number:%d;;'
+                                      'model:HPE 3PAR 8200;;'
+                                      'licenses:Thin Provisioning;'
+                                      'Remote Copy' % (1600000 + idx),
+                       'Conf Items': ';;'.join(conf_items)}
+
+    def software_check(self, sections, packages):
+        for section in sections:
+            for package_list in packages:
+                for package, min_version in sorted(package_list.items()):
+                    self.log('checking %s on %s' %
+                             (package, section['section']))
+                    result = self.result()
+                    yield {'Node': section['section'],
+                           'Software': package,
+                           'Installed': result,
+                           'Version': '%s (%s)' % (result, min_version)}
+
+    def volume_paths_check(self, sections, volume_names):
+        for section in sections:
+            lun = 0
+            for name in volume_names:
+                for idx in range(self.records):
+                    lun += 1
+                    self.log('found path to %s on %s' %
+                             (name, section['section']))
+                    yield {'Path': '/dev/disk/by-path/pci-0000:00:1f.0-'
+                                   'fc-0x2%015x-lun-%d' % (idx, lun),
+                           'Attached Volume': name}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-v', action='store_true', dest='verbose')
+    parser.add_argument('command', choices=COMMANDS)
+    parser.add_argument('-f', dest='format', default='json')
+    parser.add_argument('-conf-data', default='[]')
+    parser.add_argument('-software-pkgs', default='[]')
+    parser.add_argument('-os-vars', default='{}')
+    parser.add_argument('-attached-volumes', default='[]')
+    parser.add_argument('-incl-system-info', action='store_true')
+    parser.add_argument('-incl-replication-checks', action='store_true')
+    args = parser.parse_args()
+
+    child_pid_file = os.environ.get('FAKE_CINDERDIAGS_CHILD')
+    if child_pid_file:
+        child = subprocess.Popen([sys.executable, '-c',
+                                  'import time; time.sleep(3600)'])
+        with open(child_pid_file, 'w') as pid_file:
+            pid_file.write(str(child.pid))
+
+    time.sleep(get_float('LATENCY'))
+    if matches('CRASH', args.command):
+        sys.stderr.write('ERROR: %s failed with an unexpected error\n' %
+                         args.command)
+        return 1
+
+    diags = FakeDiags(args.command, args.verbose)
+    sections = json.loads(args.conf_data)
+    if args.command == 'ssh-credentials-check':
+        records = diags.credentials_check(sections)
+    elif args.command == 'options-check':
+        records = diags.options_check(sections)
+    elif args.command == 'software-check':
+        records = diags.software_check(sections,
+                                       json.loads(args.software_pkgs))
+    else:
+        records = diags.volume_paths_check(
+            sections, json.loads(args.attached_volumes))
+    diags.write_records(records)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,576 @@
+# (c) Copyright [2015] Hewlett Packard Enterprise Development LP
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+"""In-memory stand-ins for the services the storage panel talks to.
+
+Covers the parts of each service the panel uses:
+
+  * Barbican, through the barbicanclient Client used by BarbicanAPI,
+    including its limit on the size of a secret
+  * the Keystone token, service and endpoint calls made by
+    api/keystoneClient/http.py
+  * the SSMC session and volume lookups made by api/hpSSMCclient/http.py
+
+Every backend call sleeps for the configured latency of its service and
+is counted, so benchmarks can report both time and call counts:
+
+    services = fake_services.FakeServices(latency=0.005)
+    services.install('http://keystone.bench:5000')
+    ...
+    print(services.get_call_counts())
+    services.uninstall()
+"""
+
+from collections import Counter
+from collections import OrderedDict
+from threading import Lock
+
+import datetime
+import itertools
+import json
+import re
+import time
+import urlparse
+import uuid
+
+import httplib2
+
+BARBICAN = 'barbican'
+KEYSTONE = 'keystone'
+SSMC = 'ssmc'
+
+
+# bytes allowed in a secret payload, as limited by Barbican's default
+# max_allowed_secret_in_bytes
+MAX_PAYLOAD = 10000
+
+
+class FakeNotFound(Exception):
+    pass
+
+
+class FakePayloadTooLarge(Exception):
+    pass
+
+
+class FakeServices(object):
+    """Holds the fake services, and the latency and call counts of each."""
+
+    def __init__(self, latency=0.0):
+        self.latency = {BARBICAN: latency, KEYSTONE: latency, SSMC: latency}
+        self.lock = Lock()
+        self.calls = Counter()
+        self.barbican = FakeBarbican(self)
+        self.keystone = FakeKeystone(self)
+        # netloc -> FakeSSMC
+        self.ssmc = {}
+        self.keystone_netloc = None
+        self.saved = None
+
+    def call(self, service, op):
+        # count the call, then wait as long as the real service would
+        with self.lock:
+            self.calls[(service, op)] += 1
+        delay = self.latency.get(service)
+        if delay:
+            time.sleep(delay)
+
+    def set_latency(self, latency, service=None):
+        if service is None:
+            for name in self.latency:
+                self.latency[name] = latency
+        else:
+            self.latency[service] = latency
+
+    def reset_calls(self):
+        with self.lock:
+            self.calls.clear()
+
+    def get_call_counts(self, service=None):
+        """Returns {op: count} for a service, or {service: count}."""
+        counts = Counter()
+        with self.lock:
+            for (call_service, op), count in self.calls.items():
+                if service is None:
+                    counts[call_service] += count
+                elif call_service == service:
+                    counts[op] += count
+        return dict(counts)
+
+    def add_ssmc(self, endpoint):
+        """Adds an SSMC instance that answers requests to endpoint."""
+        netloc = urlparse.urlsplit(endpoint).netloc
+        ssmc = FakeSSMC(self, endpoint)
+        self.ssmc[netloc] = ssmc
+        return ssmc
+
+    def handle_request(self, uri, method, body, headers):
+        """Returns the (response, body) a fake service gives for a request.
+
+        Returns None if no fake service is at the uri's address.
+        """
+        parts = urlparse.urlsplit(uri)
+        if parts.netloc == self.keystone_netloc:
+            service = self.keystone
+        else:
+            service = self.ssmc.get(parts.netloc)
+            if service is None:
+                return None
+
+        if body:
+            body = json.loads(body)
+        status, resp_body = service.handle(method, parts.path,
+                                           urlparse.parse_qs(parts.query),
+                                           body, headers or {})
+        resp = httplib2.Response({'status': str(status),
+                                  'content-type': 'application/json'})
+        if resp_body is None:
+            return resp, ''
+        return resp, json.dumps(resp_body)
+
+    def install(self, keystone_url):
+        """Points the panel's Barbican, Keystone and SSMC clients here."""
+        from barbicanclient import client as b_client
+
+        self.keystone_netloc = urlparse.urlsplit(keystone_url).netloc
+        self.saved = (b_client.Client, httplib2.Http.request)
+        services = self
+        http_request = httplib2.Http.request
+
+        def client(session=None, endpoint=None, **kwargs):
+            return FakeBarbicanClient(services.barbican)
+
+        def request(http, uri, method='GET', body=None, headers=None,
+                    *args, **kwargs):
+            result = services.handle_request(uri, method, body, headers)
+            if result is None:
+                return http_request(http, uri, method, body, headers,
+                                    *args, **kwargs)
+            return result
+
+        b_client.Client = client
+        httplib2.Http.request = request
+        return self
+
+    def uninstall(self):
+        from barbicanclient import client as b_client
+
+        if self.saved:
+            b_client.Client, httplib2.Http.request = self.saved
+            self.saved = None
+
+
+# Barbican
+
+class FakeBarbican(object):
+    """Secrets and containers shared by every FakeBarbicanClient."""
+
+    def __init__(self, services):
+        self.services = services
+        self.lock = Lock()
+        self.ids = itertools.count(1)
+        # ref -> (name, payload, created), oldest first
+        self.secrets = OrderedDict()
+        # ref -> (name, {secret name: secret ref}, created), oldest first
+        self.containers = OrderedDict()
+
+    def call(self, op):
+        self.services.call(BARBICAN, op)
+
+    def get_ref(self, kind, id):
+        return 'http://barbican.bench:9311/v1/%s/%s' % (kind, id)
+
+    def _new_ref(self, kind):
+        return self.get_ref(kind, next(self.ids))
+
+    def store_secret(self, name, payload):
+        self.call('secrets.store')
+        if payload is not None and len(payload) > MAX_PAYLOAD:
+            raise FakePayloadTooLarge('%s is %d bytes' % (name, len(payload)))
+        ref = self._new_ref('secrets')
+        created = datetime.datetime.utcnow()
+        with self.lock:
+            self.secrets[ref] = (name, payload, created)
+        return ref, created
+
+    def get_secret(self, ref):
+        with self.lock:
+            if ref not in self.secrets:
+                raise FakeNotFound(ref)
+            return self.secrets[ref]
+
+    def store_container(self, name, secret_refs):
+        self.call('containers.store')
+        ref = self._new_ref('containers')
+        created = datetime.datetime.utcnow()
+        with self.lock:
+            self.containers[ref] = (name, dict(secret_refs), created)
+        return ref, created
+
+    def get_container(self, ref):
+        with self.lock:
+            if ref not in self.containers:
+                raise FakeNotFound(ref)
+            return self.containers[ref]
+
+    def add_container_secret(self, ref, name, secret_ref):
+        self.call('containers.secrets.add')
+        with self.lock:
+            if ref not in self.containers:
+                raise FakeNotFound(ref)
+            if secret_ref not in self.secrets:
+                raise FakeNotFound(secret_ref)
+            self.containers[ref][1][name] = secret_ref
+
+    def remove_container_secret(self, ref, name, secret_ref):
+        self.call('containers.secrets.remove')
+        with self.lock:
+            if ref not in self.containers or \
+                    self.containers[ref][1].get(name) != secret_ref:
+                raise FakeNotFound(secret_ref)
+            del self.containers[ref][1][name]
+
+
+class FakeSecret(object):
+    # the payload of a stored secret is only fetched when it is read,
+    # as it is by barbicanclient
+
+    def __init__(self, barbican, name=None, payload=None, secret_ref=None,
+                 created=None):
+        self._barbican = barbican
+        self.name = name
+        self._payload = payload
+        self.secret_ref = secret_ref
+        self.created = created
+
+    @property
+    def payload(self):
+        if self._payload is None and self.secret_ref:
+            self._barbican.call('secrets.payload')
+            self._payload = self._barbican.get_secret(self.secret_ref)[1]
+        return self._payload
+
+    def store(self):
+        if not self.secret_ref:
+            self.secret_ref, self.created = self._barbican.store_secret(
+                self.name, self._payload)
+        return self.secret_ref
+
+
+class FakeContainer(object):
+
+    def __init__(self, barbican, name=None, secrets=None,
+                 container_ref=None, created=None):
+        self._barbican = barbican
+        self.name = name
+        self.secrets = secrets or {}
+        self.container_ref = container_ref
+        self.created = created
+
+    @property
+    def secret_refs(self):
+        return dict((name, secret.secret_ref)
+                    for name, secret in self.secrets.items())
+
+    def store(self):
+        if not self.container_ref:
+            for secret in self.secrets.values():
+                secret.store()
+            self.container_ref, self.created = \
+                self._barbican.store_container(self.name, self.secret_refs)
+        return self.container_ref
+
+
+class FakeSecretManager(object):
+
+    def __init__(self, barbican):
+        self._barbican = barbican
+
+    def _secret(self, ref, entry):
+        name, payload, created = entry
+        return FakeSecret(self._barbican, name, secret_ref=ref,
+                          created=created)
+
+    def create(self, name=None, payload=None, **kwargs):
+        return FakeSecret(self._barbican, name, payload)
+
+    def get(self, secret_ref):
+        self._barbican.call('secrets.get')
+        return self._secret(secret_ref,
+                            self._barbican.get_secret(secret_ref))
+
+    def list(self, limit=10, offset=0, name=None, **kwargs):
+        self._barbican.call('secrets.list')
+        with self._barbican.lock:
+            found = [(ref, entry)
+                     for ref, entry in self._barbican.secrets.items()
+                     if name is None or entry[0] == name]
+        return [self._secret(ref, entry)
+                for ref, entry in found[offset:offset + limit]]
+
+    def delete(self, secret_ref):
+        self._barbican.call('secrets.delete')
+        with self._barbican.lock:
+            if self._barbican.secrets.pop(secret_ref, None) is None:
+                raise FakeNotFound(secret_ref)
+
+
+class FakeHTTPClient(object):
+    # the requests BarbicanAPI makes through barbicanclient's HTTP client,
+    # for the container secrets resource it has no manager methods for
+
+    def __init__(self, barbican):
+        self._barbican = barbican
+
+    def _get_container_secrets(self, path):
+        match = re.match(r'containers/([^/]+)/secrets/?$', path)
+        if not match:
+            raise FakeNotFound(path)
+        return self._barbican.get_ref('containers', match.group(1))
+
+    def post(self, path, json=None, **kwargs):
+        self._barbican.add_container_secret(
+            self._get_container_secrets(path), json['name'],
+            json['secret_ref'])
+        return {}
+
+    def delete(self, path, json=None, **kwargs):
+        self._barbican.remove_container_secret(
+            self._get_container_secrets(path), json['name'],
+            json['secret_ref'])
+
+
+class FakeContainerManager(object):
+
+    def __init__(self, barbican):
+        self._barbican = barbican
+        self._api = FakeHTTPClient(barbican)
+
+    def _container(self, ref, entry):
+        name, secret_refs, created = entry
+        secrets = {}
+        for secret_name, secret_ref in secret_refs.items():
+            secrets[secret_name] = FakeSecret(self._barbican, secret_name,
+                                              secret_ref=secret_ref)
+        return FakeContainer(self._barbican, name, secrets,
+                             container_ref=ref, created=created)
+
+    def create(self, name=None, secrets=None, **kwargs):
+        return FakeContainer(self._barbican, name, dict(secrets or {}))
+
+    def get(self, container_ref):
+        self._barbican.call('containers.get')
+        return self._container(container_ref,
+                               self._barbican.get_container(container_ref))
+
+    def list(self, limit=10, offset=0, name=None, **kwargs):
+        self._barbican.call('containers.list')
+        with self._barbican.lock:
+            found = [(ref, entry)
+                     for ref, entry in self._barbican.containers.items()
+                     if name is None or entry[0] == name]
+        return [self._container(ref, entry)
+                for ref, entry in found[offset:offset + limit]]
+
+    def delete(self, container_ref):
+        self._barbican.call('containers.delete')
+        with self._barbican.lock:
+            if self._barbican.containers.pop(container_ref, None) is None:
+                raise FakeNotFound(container_ref)
+
+
+class FakeBarbicanClient(object):
+    # stands in for barbicanclient.client.Client
+
+    def __init__(self, barbican):
+        self.secrets = FakeSecretManager(barbican)
+        self.containers = FakeContainerManager(barbican)
+
+
+# REST services
+
+class FakeRESTService(object):
+    # routes are (method, path regex, handler name); handlers are called
+    # with the regex groups, the query and the body, and return
+    # (status, body)
+    service = None
+    routes = ()
+
+    def __init__(self, services):
+        self.services = services
+        self.lock = Lock()
+
+    def handle(self, method, path, query, body, headers):
+        for route_method, pattern, handler in self.routes:
+            if route_method != method:
+                continue
+            match = re.match(pattern + '$', path)
+            if match:
+                self.services.call(self.service, handler)
+                with self.lock:
+                    return getattr(self, handler)(query, body,
+                                                  *match.groups())
+        self.services.call(self.service, 'not_found')
+        return 404, {'error': {'message': path + ' not found'}}
+
+
+class FakeKeystone(FakeRESTService):
+    """Tokens, and the services and endpoints SSMC links are kept in."""
+    service = KEYSTONE
+    routes = (
+        ('POST', r'/v2.0/tokens', 'create_token'),
+        ('GET', r'/v3/services', 'list_services'),
+        ('POST', r'/v3/services', 'create_service'),
+        ('GET', r'/v3/services/([^/]+)', 'get_service'),
+        ('DELETE', r'/v3/services/([^/]+)', 'delete_service'),
+        ('GET', r'/v3/endpoints', 'list_endpoints'),
+        ('POST', r'/v3/endpoints', 'create_endpoint'),
+        ('PATCH', r'/v3/endpoints/([^/]+)', 'update_endpoint'),
+        ('DELETE', r'/v3/endpoints/([^/]+)', 'delete_endpoint'),
+    )
+
+    def __init__(self, services):
+        super(FakeKeystone, self).__init__(services)
+        self.services_by_id = OrderedDict()
+        self.endpoints_by_id = OrderedDict()
+
+    def add_ssmc_endpoint(self, backend, url):
+        """Registers an SSMC link the way addSSMCEndpoint does."""
+        with self.lock:
+            status, body = self.create_service(
+                None, {'service': {'type': '3par-link',
+                                   'name': 'ssmc-' + backend}})
+            service_id = body['service']['id']
+            self.create_endpoint(
+                None, {'endpoint': {'interface': 'admin',
+                                    'region': 'RegionOne',
+                                    'url': url,
+                                    'service_id': service_id}})
+        return service_id
+
+    def create_token(self, query, body):
+        return 200, {'access': {'token': {'id': uuid.uuid4().hex}}}
+
+    def list_services(self, query, body):
+        services = self.services_by_id.values()
+        for key in ('name', 'type'):
+            if key in query:
+                services = [service for service in services
+                            if service.get(key) == query[key][0]]
+        return 200, {'services': services}
+
+    def create_service(self, query, body):
+        service = dict(body['service'])
+        service['id'] = uuid.uuid4().hex
+        self.services_by_id[service['id']] = service
+        return 201, {'service': service}
+
+    def get_service(self, query, body, service_id):
+        if service_id not in self.services_by_id:
+            return 404, None
+        return 200, {'service': self.services_by_id[service_id]}
+
+    def delete_service(self, query, body, service_id):
+        if self.services_by_id.pop(service_id, None) is None:
+            return 404, None
+        return 204, None
+
+    def list_endpoints(self, query, body):
+        endpoints = self.endpoints_by_id.values()
+        if 'service_id' in query:
+            endpoints = [endpoint for endpoint in endpoints
+                         if endpoint['service_id'] == query['service_id'][0]]
+        return 200, {'endpoints': endpoints}
+
+    def create_endpoint(self, query, body):
+        endpoint = dict(body['endpoint'])
+        endpoint['id'] = uuid.uuid4().hex
+        self.endpoints_by_id[endpoint['id']] = endpoint
+        return 201, {'endpoint': endpoint}
+
+    def update_endpoint(self, query, body, endpoint_id):
+        if endpoint_id not in self.endpoints_by_id:
+            return 404, None
+        self.endpoints_by_id[endpoint_id].update(body['endpoint'])
+        return 200, {'endpoint': self.endpoints_by_id[endpoint_id]}
+
+    def delete_endpoint(self, query, body, endpoint_id):
+        if self.endpoints_by_id.pop(endpoint_id, None) is None:
+            return 404, None
+        return 204, None
+
+
+class FakeSSMC(FakeRESTService):
+    """An SSMC instance in which every volume and volume set exists."""
+    service = SSMC
+    routes = (
+        ('POST', r'/foundation/REST/sessionservice/sessions',
+         'create_session'),
+        ('GET', r'/foundation/REST/sessionservice/sessions/([^/]+)/context',
+         'get_session_context'),
+        ('DELETE', r'/foundation/REST/sessionservice/sessions/([^/]+)',
+         'delete_session'),
+        ('GET', r'/provisioning/REST/volumeviewservice/volumes',
+         'find_volumes'),
+        ('GET', r'/provisioning/REST/volumesetviewservice/sets',
+         'find_volume_sets'),
+    )
+    system_wwn = '2FF70002AC000001'
+
+    def __init__(self, services, endpoint):
+        super(FakeSSMC, self).__init__(services)
+        self.endpoint = endpoint.rstrip('/')
+        self.sessions = set()
+
+    def _query_name(self, query):
+        # query=name eq 'osv-...'
+        found = re.search("name eq '([^']*)'", query.get('query', [''])[0])
+        if found:
+            return found.group(1)
+        return None
+
+    def create_session(self, query, body):
+        token = uuid.uuid4().hex
+        self.sessions.add(token)
+        return 201, {'object': {'Authorization': token}}
+
+    def get_session_context(self, query, body, token):
+        if token not in self.sessions:
+            return 403, None
+        return 200, {'object': {'user': 'bench'}}
+
+    def delete_session(self, query, body, token):
+        self.sessions.discard(token)
+        return 204, None
+
+    def find_volumes(self, query, body):
+        name = self._query_name(query)
+        href = self.endpoint + \
+            '/provisioning/REST/volumeviewservice/systems/' + \
+            self.system_wwn + '/volumes/' + str(name)
+        member = {'name': name,
+                  'links': [{'href': href, 'rel': 'self'}],
+                  'systemWWN': self.system_wwn,
+                  'userCpgUid': 'cpg-1',
+                  'domainUID': 'domain-1'}
+        return 200, {'count': 1, 'members': [member]}
+
+    def find_volume_sets(self, query, body):
+        name = self._query_name(query)
+        href = self.endpoint + \
+            '/provisioning/REST/volumesetviewservice/systems/' + \
+            self.system_wwn + '/sets/' + str(name)
+        member = {'name': name,
+                  'links': [{'href': href, 'rel': 'self'}]}
+        return 200, {'count': 1, 'members': [member]}